@@ -1,21 +1,36 @@
 from django.contrib import admin
-from .models import Rider, Location, Product, Order, OrderItem, OrderTracking
+from .models import Rider, Location, Product, Order, OrderItem, OrderTracking, DailySalesRollup
+from .routers import use_replica
+
+class ReplicaChangeListMixin:
+    """List pages (counts, filters, rows) read from the replica; actions and edits use the primary."""
+    def changelist_view(self, request, extra_context=None):
+        if request.method != 'GET':
+            return super().changelist_view(request, extra_context)
+        # Resolve the lazy session and user on the primary; a fresh login may not have replicated yet.
+        request.user.is_authenticated
+        with use_replica():
+            response = super().changelist_view(request, extra_context)
+            # The rows are fetched while the template renders.
+            if hasattr(response, 'render'):
+                response.render()
+        return response
 
 @admin.register(Rider)
-class RiderAdmin(admin.ModelAdmin):
+class RiderAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
     list_display = ('name', 'phone', 'status', 'vehicle_type', 'rating', 'total_deliveries', 'is_active')
     list_filter = ('status', 'vehicle_type', 'is_active', 'created_at')
     search_fields = ('name', 'phone', 'email')
     readonly_fields = ('created_at', 'updated_at')
 
 @admin.register(Location)
-class LocationAdmin(admin.ModelAdmin):
+class LocationAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
     list_display = ('name', 'area', 'delivery_fee', 'delivery_time', 'available')
     list_filter = ('available', 'created_at')
     search_fields = ('name', 'area', 'address')
 
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
+class ProductAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
     list_display = ('name', 'category', 'price', 'discounted_price', 'is_available', 'rating')
     list_filter = ('category', 'is_available', 'created_at')
     search_fields = ('name', 'description', 'category')
@@ -30,9 +45,16 @@ class OrderTrackingInline(admin.TabularInline):
     readonly_fields = ('timestamp',)
 
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
     list_display = ('id', 'customer_name', 'status', 'total', 'rider', 'created_at')
     list_filter = ('status', 'payment_method', 'delivery_type', 'created_at')
     search_fields = ('customer_name', 'customer_phone', 'customer_email')
     readonly_fields = ('created_at', 'updated_at')
-    inlines = [OrderItemInline, OrderTrackingInline]
\ No newline at end of file
+    inlines = [OrderItemInline, OrderTrackingInline]
+
+@admin.register(DailySalesRollup)
+class DailySalesRollupAdmin(ReplicaChangeListMixin, admin.ModelAdmin):
+    list_display = ('date', 'location', 'order_count', 'revenue', 'items_sold')
+    list_filter = ('location',)
+    date_hierarchy = 'date'
+    readonly_fields = ('updated_at',)
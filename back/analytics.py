@@ -0,0 +1,237 @@
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .caching import get_cache
+from .models import DailySalesRollup, Location, Order, OrderItem, Product, Rider
+from .routers import replica_configured
+
+DELIVERED = 'delivered'
+
+# Safety net for changes that bypass model signals (raw SQL, other processes).
+DASHBOARD_STATS_TIMEOUT = 300
+# With a replica the snapshot may be rebuilt before the replica has the write
+# that dropped it; this bounds how long such a snapshot is served.
+DASHBOARD_STATS_REPLICA_TIMEOUT = 15
+
+
+def order_sales_date(order):
+    """The day an order's sales are booked against (same as created_at__date)."""
+    return timezone.localtime(order.created_at).date()
+
+
+def apply_order_to_rollup(order, sign):
+    """Add (sign=1) or remove (sign=-1) a delivered order from its daily rollup row."""
+    items_sold = order.items.aggregate(total=Sum('quantity'))['total'] or 0
+
+    with transaction.atomic():
+        rollup, _ = DailySalesRollup.objects.get_or_create(
+            date=order_sales_date(order),
+            location_id=order.selected_location_id,
+        )
+        DailySalesRollup.objects.filter(pk=rollup.pk).update(
+            order_count=F('order_count') + sign,
+            revenue=F('revenue') + sign * order.total,
+            items_sold=F('items_sold') + sign * items_sold,
+            updated_at=timezone.now(),
+        )
+
+
+def fold_location_rollups(location_id):
+    """
+    Move a branch's rollup rows into the no-location rows of the same days.
+
+    Called before the branch is deleted: its orders keep their sales but lose
+    the branch (SET_NULL, without signals), so their totals must follow them.
+    """
+    with transaction.atomic():
+        rows = DailySalesRollup.objects.filter(location_id=location_id)
+        for row in rows:
+            target, _ = DailySalesRollup.objects.get_or_create(date=row.date, location_id=None)
+            DailySalesRollup.objects.filter(pk=target.pk).update(
+                order_count=F('order_count') + row.order_count,
+                revenue=F('revenue') + row.revenue,
+                items_sold=F('items_sold') + row.items_sold,
+                updated_at=timezone.now(),
+            )
+        rows.delete()
+
+
+def rebuild_rollups(start_date, end_date):
+    """
+    Recompute rollup rows for start_date..end_date (inclusive) from orders.
+
+    Runs two grouped queries over the range and replaces the existing rows in
+    one transaction. Returns the number of rows written.
+    """
+    start, end = day_bounds(start_date, end_date)
+    delivered = Order.objects.filter(status=DELIVERED, created_at__gte=start, created_at__lt=end)
+
+    rows = {}
+    order_totals = delivered.annotate(day=TruncDate('created_at')).values(
+        'day', 'selected_location'
+    ).annotate(order_count=Count('id'), revenue=Sum('total')).order_by()
+    for row in order_totals:
+        rows[(row['day'], row['selected_location'])] = DailySalesRollup(
+            date=row['day'],
+            location_id=row['selected_location'],
+            order_count=row['order_count'],
+            revenue=row['revenue'] or Decimal('0.00'),
+        )
+
+    item_totals = OrderItem.objects.filter(order__in=delivered).annotate(
+        day=TruncDate('order__created_at')
+    ).values('day', 'order__selected_location').annotate(items_sold=Sum('quantity')).order_by()
+    for row in item_totals:
+        rollup = rows.get((row['day'], row['order__selected_location']))
+        if rollup is not None:
+            rollup.items_sold = row['items_sold'] or 0
+
+    with transaction.atomic():
+        DailySalesRollup.objects.filter(date__gte=start_date, date__lte=end_date).delete()
+        DailySalesRollup.objects.bulk_create(rows.values())
+    return len(rows)
+
+
+def day_bounds(start_date, end_date):
+    """Half-open [start, end) datetimes covering start_date..end_date in the current timezone."""
+    tz = timezone.get_current_timezone()
+    start = timezone.make_aware(datetime.combine(start_date, time.min), tz)
+    end = timezone.make_aware(datetime.combine(end_date + timedelta(days=1), time.min), tz)
+    return start, end
+
+
+def daily_sales(start_date, end_date, location=None):
+    """Revenue and delivered-order count per day, zero-filled, from the rollup table."""
+    rollups = DailySalesRollup.objects.filter(date__gte=start_date, date__lte=end_date)
+    if location is not None:
+        rollups = rollups.filter(location=location)
+
+    totals = {
+        row['date']: row
+        for row in rollups.values('date').annotate(
+            revenue=Sum('revenue'), orders=Sum('order_count')
+        ).order_by()
+    }
+
+    data = []
+    current_date = start_date
+    while current_date <= end_date:
+        row = totals.get(current_date, {})
+        data.append({
+            'date': current_date.strftime('%Y-%m-%d'),
+            'revenue': float(row.get('revenue') or 0),
+            'orders': row.get('orders') or 0,
+        })
+        current_date += timedelta(days=1)
+    return data
+
+
+def delivered_items(location=None, start_date=None, end_date=None):
+    """OrderItems of delivered orders, optionally narrowed to a branch and date window."""
+    items = OrderItem.objects.filter(order__status=DELIVERED)
+    if location is not None:
+        items = items.filter(order__selected_location=location)
+    if start_date is not None:
+        items = items.filter(order__created_at__gte=day_bounds(start_date, start_date)[0])
+    if end_date is not None:
+        items = items.filter(order__created_at__lt=day_bounds(end_date, end_date)[1])
+    return items
+
+
+def top_products(items, limit=5):
+    """Best sellers by delivered order count, with quantity and revenue, in one grouped query."""
+    rows = items.values('product', 'product__name').annotate(
+        quantity=Sum('quantity'),
+        order_count=Count('order', distinct=True),
+        revenue=Sum('total_price'),
+    ).order_by('-order_count', '-revenue', 'product')[:limit]
+
+    return [{
+        'id': row['product'],
+        'name': row['product__name'],
+        'orders': row['order_count'],
+        'quantity': row['quantity'] or 0,
+        'revenue': float(row['revenue'] or 0),
+    } for row in rows]
+
+
+def category_breakdown(items):
+    """Quantity, order count and revenue for every category in one grouped query."""
+    totals = {
+        row['product__category']: row
+        for row in items.values('product__category').annotate(
+            quantity=Sum('quantity'),
+            order_count=Count('order', distinct=True),
+            revenue=Sum('total_price'),
+        ).order_by()
+    }
+
+    breakdown = []
+    for value, label in Product.CATEGORY_CHOICES:
+        row = totals.get(value, {})
+        breakdown.append({
+            'value': value,
+            'label': label,
+            'orders': row.get('order_count') or 0,
+            'quantity': row.get('quantity') or 0,
+            'revenue': float(row.get('revenue') or 0),
+        })
+    return breakdown
+
+
+def dashboard_stats_key(today=None):
+    return f"dashboard:stats:{today or timezone.localdate()}"
+
+
+def compute_dashboard_stats():
+    """Dashboard counters in four queries: one conditional aggregate per table."""
+    today_start, today_end = day_bounds(timezone.localdate(), timezone.localdate())
+    today = Q(created_at__gte=today_start, created_at__lt=today_end)
+    delivered = Q(status=DELIVERED)
+
+    order_stats = Order.objects.aggregate(
+        total_orders=Count('id'),
+        pending_orders=Count('id', filter=Q(status='pending')),
+        delivering_orders=Count('id', filter=Q(status='delivering')),
+        completed_orders=Count('id', filter=delivered),
+        cancelled_orders=Count('id', filter=Q(status='cancelled')),
+        orders_today=Count('id', filter=today),
+        total_revenue=Sum('total', filter=delivered),
+        revenue_today=Sum('total', filter=delivered & today),
+    )
+    rider_stats = Rider.objects.filter(is_active=True).aggregate(
+        total_riders=Count('id'),
+        available_riders=Count('id', filter=Q(status='available')),
+    )
+
+    return {
+        **order_stats,
+        'total_revenue': order_stats['total_revenue'] or 0,
+        'revenue_today': order_stats['revenue_today'] or 0,
+        **rider_stats,
+        'total_products': Product.objects.count(),
+        'total_locations': Location.objects.count(),
+    }
+
+
+def get_dashboard_stats(build):
+    """
+    Return the cached dashboard payload, calling build(stats) to produce it on a miss.
+
+    The snapshot lives in the two-tier cache (back.caching) and is dropped by
+    back.signals whenever an Order, Rider, Product or Location changes, on
+    every worker, so steady-state polling is served without touching the DB.
+    When a replica is configured the snapshot expires after
+    DASHBOARD_STATS_REPLICA_TIMEOUT instead, so replica lag is bounded.
+    """
+    timeout = DASHBOARD_STATS_REPLICA_TIMEOUT if replica_configured() else DASHBOARD_STATS_TIMEOUT
+    return get_cache().get_or_set(dashboard_stats_key(), lambda: build(compute_dashboard_stats()), timeout)
+
+
+def invalidate_dashboard_stats():
+    get_cache().delete(dashboard_stats_key())
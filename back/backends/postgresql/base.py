@@ -0,0 +1,57 @@
+"""
+django.db.backends.postgresql with connections borrowed from back.dbpool.
+
+Select it with ENGINE 'back.backends.postgresql' and size the pool with a
+POOL entry in the database settings (max_size, timeout, max_idle). Keep
+CONN_MAX_AGE at 0 so every request hands its connection back when Django
+closes it at the end of the request; with CONN_HEALTH_CHECKS, an idle
+connection is pinged before it is reused.
+"""
+import threading
+
+from django.db import OperationalError
+from django.db.backends.postgresql import base
+from django.db.backends.postgresql.psycopg_any import IsolationLevel
+
+from back.dbpool import ConnectionPool, PoolTimeout
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _ping(connection):
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+    if not connection.autocommit:
+        connection.rollback()
+    return True
+
+
+def get_pool(alias, settings_dict):
+    with _pools_lock:
+        if alias not in _pools:
+            check = _ping if settings_dict.get('CONN_HEALTH_CHECKS') else None
+            _pools[alias] = ConnectionPool(check=check, **(settings_dict.get('POOL') or {}))
+        return _pools[alias]
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    @property
+    def pool(self):
+        return get_pool(self.alias, self.settings_dict)
+
+    def get_new_connection(self, conn_params):
+        # The parent sets this while opening a connection; pooled ones are
+        # reused, so set it here for every wrapper.
+        options = self.settings_dict['OPTIONS']
+        self.isolation_level = IsolationLevel(options.get('isolation_level', IsolationLevel.READ_COMMITTED))
+        try:
+            return self.pool.acquire(lambda: super(DatabaseWrapper, self).get_new_connection(conn_params))
+        except PoolTimeout as e:
+            raise OperationalError(str(e)) from e
+
+    def _close(self):
+        if self.connection is not None:
+            # Closed inside atomic(): Django still expects to roll it back, so
+            # it cannot be shared; drop it.
+            self.pool.release(self.connection, reusable=not self.in_atomic_block)
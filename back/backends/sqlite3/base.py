@@ -0,0 +1,17 @@
+"""
+django.db.backends.sqlite3 tuned for several concurrent writers.
+
+Selected by DB_SQLITE_CONCURRENT. atomic() blocks start with BEGIN IMMEDIATE,
+taking the write lock up front: a deferred BEGIN that reads first and then
+tries to write cannot wait for the lock and fails with "database is locked"
+at once, whatever the busy timeout. The pragmas that go with it (WAL and
+friends) are applied by back.signals on connection_created.
+"""
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    concurrent_writes = True
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute('BEGIN IMMEDIATE')
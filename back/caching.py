@@ -0,0 +1,248 @@
+"""
+Two-tier cache: a bounded per-process L1 in front of a shared Redis L2.
+
+Every worker keeps hot entries in a small in-memory LRU (LocalCache), so
+repeated reads cost no network round trip. Misses fall through to Redis,
+which is shared by every worker and replica. Writes and deletes go to Redis
+and then PUBLISH the key on an invalidation channel. Each process runs one
+listener thread on that channel and drops the key from its L1, so other
+workers stop serving the old value within milliseconds.
+
+L1 entries also expire after a short timeout (CACHE_L1_TIMEOUT). That bounds
+staleness if an invalidation is missed while the listener reconnects; L1 is
+cleared on every reconnect for the same reason. If Redis is unreachable the
+cache degrades to L1 only and counts the errors. Without REDIS_URL there is
+no L2, which suits a single-process dev server.
+"""
+import logging
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import redis
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+RECONNECT_DELAY = 1
+_MISSING = object()
+
+
+class LocalCache:
+    """Thread-safe LRU with per-entry expiry and hit/miss/eviction counters."""
+
+    def __init__(self, max_entries=1024, timeout=30):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._counters = dict.fromkeys(('hits', 'misses', 'evictions', 'expirations'), 0)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self._counters['hits'] += 1
+                    return value
+                del self._entries[key]
+                self._counters['expirations'] += 1
+            self._counters['misses'] += 1
+            return default
+
+    def set(self, key, value, timeout=None):
+        timeout = self.timeout if timeout is None else min(timeout, self.timeout)
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + timeout)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters['evictions'] += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, entries=len(self._entries), max_entries=self.max_entries)
+
+
+class TieredCache:
+    """
+    LocalCache (L1) backed by Redis (L2), with pub/sub invalidation.
+
+    `client` defaults to a connection built from `url`; tests pass a
+    fakeredis client. With neither, the cache is L1 only.
+    """
+
+    def __init__(self, url=None, client=None, prefix='sooicy:cache:', max_entries=1024, l1_timeout=30):
+        self.url = url
+        self.prefix = prefix
+        self.channel = prefix + 'invalidate'
+        self.local = LocalCache(max_entries, l1_timeout)
+        self._client = client if client is not None else (redis.Redis.from_url(url) if url else None)
+        # Lets a process skip its own invalidations: it has already applied them.
+        self._origin = uuid.uuid4().hex
+        self._lock = threading.Lock()
+        self._counters = dict.fromkeys(
+            ('l2_hits', 'l2_misses', 'l2_errors', 'invalidations_sent', 'invalidations_received'), 0
+        )
+        self._listener = None
+        self._listening = threading.Event()
+        self._stopping = threading.Event()
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    @property
+    def client(self):
+        """The L2 Redis client, or None in L1-only mode."""
+        return self._client
+
+    @property
+    def shared(self):
+        return self._client is not None
+
+    def get(self, key, default=None):
+        value = self.local.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        if not self.shared:
+            return default
+        self.start_listener()
+        try:
+            with self._client.pipeline() as pipe:
+                raw, ttl = pipe.get(self.prefix + key).pttl(self.prefix + key).execute()
+        except redis.RedisError:
+            logger.warning('Cache L2 read failed for %s', key, exc_info=True)
+            self._count('l2_errors')
+            return default
+        if raw is None:
+            self._count('l2_misses')
+            return default
+        self._count('l2_hits')
+        value = pickle.loads(raw)
+        self.local.set(key, value, ttl / 1000 if ttl and ttl > 0 else None)
+        return value
+
+    def set(self, key, value, timeout):
+        self.local.set(key, value, timeout)
+        if self.shared:
+            # A worker that only ever writes still holds L1 entries to invalidate.
+            self.start_listener()
+            self._write(key, lambda pipe: pipe.set(self.prefix + key, pickle.dumps(value), px=int(timeout * 1000)))
+
+    def delete(self, key):
+        self.local.delete(key)
+        if self.shared:
+            self._write(key, lambda pipe: pipe.delete(self.prefix + key))
+
+    def get_or_set(self, key, build, timeout):
+        """Cached value for `key`, calling build() and storing its result on a miss."""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = build()
+            self.set(key, value, timeout)
+        return value
+
+    def clear(self):
+        """Drop this process's L1 and every L2 key under the prefix (tests, deploys)."""
+        self.local.clear()
+        if self.shared:
+            keys = list(self._client.scan_iter(match=self.prefix + '*'))
+            if keys:
+                self._client.delete(*keys)
+            self._client.publish(self.channel, f'{self._origin}|*')
+
+    def _write(self, key, command):
+        try:
+            with self._client.pipeline() as pipe:
+                command(pipe)
+                pipe.publish(self.channel, f'{self._origin}|{key}')
+                pipe.execute()
+        except redis.RedisError:
+            logger.warning('Cache L2 write failed for %s', key, exc_info=True)
+            self._count('l2_errors')
+            return
+        self._count('invalidations_sent')
+
+    def _invalidate(self, message):
+        if isinstance(message, bytes):
+            message = message.decode()
+        origin, _, key = message.partition('|')
+        if origin == self._origin:
+            return
+        self._count('invalidations_received')
+        if key == '*':
+            self.local.clear()
+        else:
+            self.local.delete(key)
+
+    def start_listener(self, wait=None):
+        """Start the invalidation thread once per process; `wait` seconds for it to subscribe."""
+        if self._listener is None and self.shared:
+            with self._lock:
+                if self._listener is None:
+                    self._listener = threading.Thread(target=self._listen, name='cache-invalidation', daemon=True)
+                    self._listener.start()
+        if wait:
+            self._listening.wait(wait)
+
+    def _listen(self):
+        while not self._stopping.is_set():
+            pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(self.channel)
+                # Anything published while disconnected was missed.
+                self.local.clear()
+                self._listening.set()
+                while not self._stopping.is_set():
+                    message = pubsub.get_message(timeout=1)
+                    if message is not None:
+                        self._invalidate(message['data'])
+            except (redis.RedisError, OSError):
+                logger.warning('Cache invalidation channel lost, reconnecting', exc_info=True)
+                self._listening.clear()
+                self._stopping.wait(RECONNECT_DELAY)
+            finally:
+                pubsub.close()
+
+    def stop_listener(self):
+        self._stopping.set()
+        if self._listener is not None:
+            self._listener.join()
+            self._listener = None
+        self._listening.clear()
+        self._stopping.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        return {'l1': self.local.stats(), **stats, 'shared': self.shared, 'listening': self._listening.is_set()}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = TieredCache(
+                    url=settings.REDIS_URL or None,
+                    max_entries=settings.CACHE_L1_MAX_ENTRIES,
+                    l1_timeout=settings.CACHE_L1_TIMEOUT,
+                )
+    return _cache
@@ -0,0 +1,59 @@
+import hashlib
+
+from django.db.models import F
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from .models import Addon, CatalogVersion, Location, Product
+
+CATALOG_NAMES = {
+    Product: 'product',
+    Addon: 'addon',
+    Location: 'location',
+}
+
+
+def bump_catalog_version(name):
+    updated = CatalogVersion.objects.filter(name=name).update(
+        version=F('version') + 1, updated_at=timezone.now()
+    )
+    if not updated:
+        CatalogVersion.objects.get_or_create(name=name, defaults={'version': 1})
+
+
+def catalog_validators(request, names, static=''):
+    """
+    Return (etag, last_modified) for a catalog response built from `names`.
+
+    One query over the CatalogVersion rows; `static` lets code-defined data
+    (e.g. CATEGORY_CHOICES) take part in the ETag without a table.
+    """
+    rows = {
+        row.name: row for row in CatalogVersion.objects.filter(name__in=names)
+    } if names else {}
+    versions = ','.join(f"{name}:{rows[name].version if name in rows else 0}" for name in sorted(names))
+    seed = f"{request.get_full_path()}|{versions}|{static}"
+    etag = f'"{hashlib.sha1(seed.encode()).hexdigest()}"'
+    last_modified = max((row.updated_at for row in rows.values()), default=None)
+    return etag, last_modified
+
+
+def conditional_catalog_response(request, names, build, static=''):
+    """
+    Answer with 304 when the client's validators match, otherwise call build().
+
+    build() is only invoked on a miss, so matching requests skip the
+    queryset and the serializer entirely.
+    """
+    etag, last_modified = catalog_validators(request, names, static)
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is None:
+        response = build()
+    response['ETag'] = etag
+    if timestamp is not None:
+        response['Last-Modified'] = http_date(timestamp)
+    patch_cache_control(response, no_cache=True)
+    return response
@@ -0,0 +1,85 @@
+"""
+Which branches deliver to a coordinate.
+
+Available locations with coordinates are held in a per-process SpatialGrid.
+The grid is rebuilt lazily: every lookup compares the 'location' catalog
+version (bumped by back.signals on any Location save/delete, including
+LocationToggleAvailabilityView) with the version the grid was built from.
+"""
+import re
+import threading
+
+from .geo import SpatialGrid
+from .models import CatalogVersion, Location
+
+GRID_CELL_KM = 2.0
+DEFAULT_PREP_MINUTES = 15
+TRAVEL_MINUTES_PER_KM = 3
+
+MINUTES_RE = re.compile(r'\d+')
+
+
+def _prep_minutes(delivery_time):
+    """Lower bound of a "15-25 min" style string."""
+    match = MINUTES_RE.search(delivery_time or '')
+    return int(match.group()) if match else DEFAULT_PREP_MINUTES
+
+
+class CoverageIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._grid = SpatialGrid(cell_km=GRID_CELL_KM)
+        self._max_radius_km = 0
+
+    def _current_version(self):
+        return CatalogVersion.objects.filter(name='location').values_list('version', flat=True).first() or 0
+
+    def _build(self):
+        grid = SpatialGrid(cell_km=GRID_CELL_KM)
+        max_radius_km = 0
+        locations = Location.objects.filter(
+            available=True, latitude__isnull=False, longitude__isnull=False
+        ).values(
+            'id', 'name', 'area', 'latitude', 'longitude', 'coverage_radius',
+            'delivery_fee', 'delivery_time', 'min_order_amount',
+        )
+        for location in locations:
+            grid.insert(location, location['latitude'], location['longitude'])
+            max_radius_km = max(max_radius_km, location['coverage_radius'])
+        return grid, max_radius_km
+
+    def refresh(self):
+        version = self._current_version()
+        if version == self._version:
+            return
+        with self._lock:
+            if version != self._version:
+                self._grid, self._max_radius_km = self._build()
+                self._version = version
+
+    def serving(self, lat, lng):
+        """Locations whose coverage radius includes (lat, lng), nearest first."""
+        self.refresh()
+        grid, max_radius_km = self._grid, self._max_radius_km
+
+        results = []
+        for distance_km, location in grid.nearest(lat, lng, max_radius_km):
+            if distance_km > location['coverage_radius']:
+                continue
+            results.append({
+                'id': location['id'],
+                'name': location['name'],
+                'area': location['area'],
+                'distance_km': round(distance_km, 2),
+                'coverage_radius': location['coverage_radius'],
+                # Strings, as LocationSerializer renders them.
+                'delivery_fee': str(location['delivery_fee']),
+                'delivery_time': location['delivery_time'],
+                'min_order_amount': str(location['min_order_amount']),
+                'eta_minutes': _prep_minutes(location['delivery_time']) + round(distance_km * TRAVEL_MINUTES_PER_KM),
+            })
+        return results
+
+
+coverage_index = CoverageIndex()
@@ -0,0 +1,127 @@
+"""
+Process-wide pool of PostgreSQL connections, used by back.backends.postgresql.
+
+Django's own persistent connections (CONN_MAX_AGE) keep one connection per
+thread. With DB_POOL enabled, a request's connection is instead returned
+here when Django closes it and handed to the next thread that needs one, so
+the number of server connections is bounded by max_size however many
+threads a worker runs.
+"""
+import threading
+import time
+from collections import deque
+
+from psycopg2 import extensions
+
+REUSABLE_STATUSES = (
+    extensions.TRANSACTION_STATUS_IDLE,
+    extensions.TRANSACTION_STATUS_INTRANS,
+    extensions.TRANSACTION_STATUS_INERROR,
+)
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    def __init__(self, max_size=10, timeout=5.0, max_idle=300.0, check=None):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.check = check
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self._idle = deque()
+        self._counters = dict.fromkeys(
+            ('in_use', 'requests', 'waits', 'timeouts', 'created', 'reused', 'discarded'), 0
+        )
+
+    def _count(self, name, delta=1):
+        with self._lock:
+            self._counters[name] += delta
+
+    def acquire(self, connect):
+        """
+        Return an idle connection, or a new one from connect().
+
+        Waits up to `timeout` for a free slot, then raises PoolTimeout. Idle
+        connections older than `max_idle`, closed, or failing `check` are
+        dropped on the way out.
+        """
+        self._count('requests')
+        if not self._slots.acquire(blocking=False):
+            self._count('waits')
+            if not self._slots.acquire(timeout=self.timeout):
+                self._count('timeouts')
+                raise PoolTimeout(f"No database connection free after {self.timeout}s (max {self.max_size})")
+        try:
+            connection = self._take_idle()
+            if connection is None:
+                connection = connect()
+                self._count('created')
+            else:
+                self._count('reused')
+        except BaseException:
+            self._slots.release()
+            raise
+        self._count('in_use')
+        return connection
+
+    def _take_idle(self):
+        while True:
+            with self._lock:
+                if not self._idle:
+                    return None
+                connection, returned_at = self._idle.pop()
+            if not connection.closed and time.monotonic() - returned_at < self.max_idle:
+                if self.check is None or self._passes_check(connection):
+                    return connection
+            self._discard(connection)
+
+    def _passes_check(self, connection):
+        try:
+            return self.check(connection)
+        except Exception:
+            return False
+
+    def release(self, connection, reusable=True):
+        """Give `connection` back; broken or mid-query connections are closed instead."""
+        try:
+            if reusable and self._reset(connection):
+                with self._lock:
+                    self._idle.append((connection, time.monotonic()))
+            else:
+                self._discard(connection)
+        finally:
+            self._count('in_use', -1)
+            self._slots.release()
+
+    def _reset(self, connection):
+        if connection.closed or connection.get_transaction_status() not in REUSABLE_STATUSES:
+            return False
+        if connection.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                connection.rollback()
+            except Exception:
+                return False
+        return True
+
+    def _discard(self, connection):
+        self._count('discarded')
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def close_idle(self):
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for connection, _ in idle:
+            self._discard(connection)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters, idle=len(self._idle))
+        stats.update(max_size=self.max_size, open=stats['in_use'] + stats['idle'])
+        return stats
@@ -0,0 +1,151 @@
+"""
+Batch matching of pending delivery orders to available riders.
+
+Riders with a known position are loaded once into a SpatialGrid; each order
+(oldest first) looks for candidates in growing rings around its branch's
+coordinates and takes the one with the lowest score:
+
+    score = distance_km * DISTANCE_WEIGHT
+          + (current_orders / cap) * LOAD_WEIGHT
+          - rating * RATING_WEIGHT
+
+Riders without a position, or orders whose branch has no coordinates, are
+scored as if UNKNOWN_DISTANCE_KM away so located riders win when available.
+Rider load is tracked in memory across the batch, and each booking is an
+atomic capacity claim, so no rider is ever pushed past
+Rider.MAX_CONCURRENT_ORDERS.
+"""
+from dataclasses import dataclass
+
+from .geo import SpatialGrid
+from .models import Order, Rider
+from .services import AssignmentError, assign_rider
+
+DISTANCE_WEIGHT = 1.0
+LOAD_WEIGHT = 3.0
+RATING_WEIGHT = 0.5
+
+SEARCH_RADII_KM = (3, 6, 12)
+UNKNOWN_DISTANCE_KM = SEARCH_RADII_KM[-1]
+GRID_CELL_KM = 2.0
+
+DEFAULT_BATCH_SIZE = 100
+
+
+@dataclass
+class Assignment:
+    order: Order
+    rider: Rider
+    distance_km: float
+    score: float
+
+    def as_dict(self):
+        return {
+            'order': self.order.id,
+            'rider': self.rider.id,
+            'rider_name': self.rider.name,
+            'distance_km': round(self.distance_km, 2),
+            'score': round(self.score, 3),
+        }
+
+
+def _has_position(obj):
+    return obj is not None and obj.latitude is not None and obj.longitude is not None
+
+
+def score(rider, distance_km, load):
+    return (
+        distance_km * DISTANCE_WEIGHT
+        + load / Rider.MAX_CONCURRENT_ORDERS * LOAD_WEIGHT
+        - float(rider.rating) * RATING_WEIGHT
+    )
+
+
+def pending_orders(limit=DEFAULT_BATCH_SIZE):
+    return list(
+        Order.objects.filter(status='pending', delivery_type='delivery', rider__isnull=True)
+        .select_related('selected_location')
+        .order_by('created_at', 'id')[:limit]
+    )
+
+
+def available_riders():
+    return list(
+        Rider.objects.filter(
+            is_active=True, status='available', current_orders__lt=Rider.MAX_CONCURRENT_ORDERS
+        )
+    )
+
+
+class Dispatcher:
+    def __init__(self, riders):
+        self.riders = list(riders)
+        self.grid = SpatialGrid(cell_km=GRID_CELL_KM)
+        self.unlocated = []
+        for rider in self.riders:
+            if _has_position(rider):
+                self.grid.insert(rider, rider.latitude, rider.longitude)
+            else:
+                self.unlocated.append(rider)
+        self.load = {rider.id: rider.current_orders for rider in self.riders}
+
+    def _has_capacity(self, rider):
+        return self.load[rider.id] < Rider.MAX_CONCURRENT_ORDERS
+
+    def _candidates(self, location):
+        if _has_position(location):
+            for radius in SEARCH_RADII_KM:
+                nearby = [
+                    (distance, rider)
+                    for distance, rider in self.grid.within(location.latitude, location.longitude, radius)
+                    if self._has_capacity(rider)
+                ]
+                if nearby:
+                    return nearby
+            fallback = self.unlocated
+        else:
+            fallback = self.riders
+        return [(UNKNOWN_DISTANCE_KM, rider) for rider in fallback if self._has_capacity(rider)]
+
+    def best_rider(self, order):
+        """Pick and book the best rider for `order`, or return None if nobody has capacity."""
+        best = None
+        for distance, rider in self._candidates(order.selected_location):
+            candidate = (score(rider, distance, self.load[rider.id]), distance, rider.id, rider)
+            if best is None or candidate[:3] < best[:3]:
+                best = candidate
+        if best is None:
+            return None
+        rider_score, distance, _, rider = best
+        self.load[rider.id] += 1
+        return Assignment(order=order, rider=rider, distance_km=distance, score=rider_score)
+
+    def match(self, orders):
+        """Greedy, oldest order first. Returns (assignments, unassigned_orders)."""
+        assignments, unassigned = [], []
+        for order in orders:
+            assignment = self.best_rider(order)
+            if assignment is None:
+                unassigned.append(order)
+            else:
+                assignments.append(assignment)
+        return assignments, unassigned
+
+
+def dispatch_pending_orders(limit=DEFAULT_BATCH_SIZE, dry_run=False, updated_by='Dispatch'):
+    """Match up to `limit` pending delivery orders and, unless dry_run, assign them."""
+    assignments, unassigned = Dispatcher(available_riders()).match(pending_orders(limit))
+    if dry_run:
+        return assignments, unassigned
+
+    # Another dispatcher may have taken the order or the rider's last slot
+    # since we loaded them; the conditional claims in assign_rider() decide.
+    committed = []
+    for assignment in assignments:
+        try:
+            assign_rider(assignment.order, assignment.rider, updated_by=updated_by)
+        except AssignmentError:
+            unassigned.append(assignment.order)
+        else:
+            committed.append(assignment)
+    return committed, unassigned
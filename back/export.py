@@ -0,0 +1,145 @@
+"""
+Order history export as CSV (one row per line item) or NDJSON (one order per line).
+
+Orders are read with QuerySet.iterator(chunk_size=...), which also runs the
+item/addon prefetches one chunk at a time, and output is produced as a
+generator of text blocks, so memory stays flat however long the range is.
+"""
+import csv
+import io
+import json
+
+from asgiref.sync import sync_to_async
+from django.db.models import Prefetch
+
+from .models import Order, OrderItem
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+DEFAULT_CHUNK_SIZE = 500
+
+ORDER_COLUMNS = [
+    'order_id', 'created_at', 'status', 'customer_name', 'customer_phone', 'delivery_type',
+    'payment_method', 'location_id', 'location_name', 'rider_id', 'rider_name',
+    'subtotal', 'delivery_fee', 'tax', 'total',
+]
+ITEM_COLUMNS = [
+    'item_id', 'product_id', 'product_name', 'quantity', 'unit_price',
+    'addons', 'addons_price', 'item_total',
+]
+CSV_COLUMNS = ORDER_COLUMNS + ITEM_COLUMNS
+
+# Cells starting with these are run as formulas by spreadsheet apps (OWASP CSV injection).
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def export_queryset(queryset=None):
+    """Orders oldest first with everything the export reads, loaded per chunk."""
+    queryset = Order.objects.all() if queryset is None else queryset
+    return queryset.select_related('rider', 'selected_location').prefetch_related(
+        Prefetch('items', queryset=OrderItem.objects.select_related('product').prefetch_related('addons'))
+    ).order_by('created_at', 'id')
+
+
+def _text(value):
+    value = value or ''
+    return "'" + value if value.startswith(FORMULA_PREFIXES) else value
+
+
+def _order_fields(order):
+    return {
+        'order_id': order.id,
+        'created_at': order.created_at.isoformat(),
+        'status': order.status,
+        'customer_name': order.customer_name,
+        'customer_phone': order.customer_phone,
+        'delivery_type': order.delivery_type,
+        'payment_method': order.payment_method,
+        'location_id': order.selected_location_id,
+        'location_name': order.selected_location.name if order.selected_location else None,
+        'rider_id': order.rider_id,
+        'rider_name': order.rider.name if order.rider else None,
+        'subtotal': str(order.subtotal),
+        'delivery_fee': str(order.delivery_fee),
+        'tax': str(order.tax),
+        'total': str(order.total),
+    }
+
+
+def _item_fields(item):
+    return {
+        'item_id': item.id,
+        'product_id': item.product_id,
+        'product_name': item.product.name,
+        'quantity': item.quantity,
+        'unit_price': str(item.unit_price),
+        'addons': [
+            {'id': addon.id, 'name': addon.name, 'price': str(addon.price)} for addon in item.addons.all()
+        ],
+        'addons_price': str(item.addons_price),
+        'item_total': str(item.total_price),
+    }
+
+
+def _csv_rows(order):
+    fields = _order_fields(order)
+    fields['customer_name'] = _text(fields['customer_name'])
+    fields['customer_phone'] = _text(fields['customer_phone'])
+    fields['location_name'] = _text(fields['location_name'])
+    fields['rider_name'] = _text(fields['rider_name'])
+    items = [_item_fields(item) for item in order.items.all()]
+    if not items:
+        yield [fields[column] for column in ORDER_COLUMNS] + [''] * len(ITEM_COLUMNS)
+    for item in items:
+        item['product_name'] = _text(item['product_name'])
+        item['addons'] = '; '.join(_text(f"{addon['name']} ({addon['price']})") for addon in item['addons'])
+        row = {**fields, **item}
+        yield [row[column] for column in CSV_COLUMNS]
+
+
+def iter_csv(queryset, chunk_size=DEFAULT_CHUNK_SIZE):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    for count, order in enumerate(queryset.iterator(chunk_size=chunk_size), 1):
+        writer.writerows(_csv_rows(order))
+        if count % chunk_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def iter_ndjson(queryset, chunk_size=DEFAULT_CHUNK_SIZE):
+    lines = []
+    for order in queryset.iterator(chunk_size=chunk_size):
+        record = _order_fields(order)
+        record['items'] = [_item_fields(item) for item in order.items.all()]
+        lines.append(json.dumps(record) + '\n')
+        if len(lines) >= chunk_size:
+            yield ''.join(lines)
+            lines = []
+    if lines:
+        yield ''.join(lines)
+
+
+def export_orders(queryset, output='csv', chunk_size=DEFAULT_CHUNK_SIZE):
+    """Generator of text blocks for `queryset` (see export_queryset) in `output` format."""
+    if output not in FORMATS:
+        raise ValueError(f"output must be one of {', '.join(FORMATS)}")
+    return (iter_csv if output == 'csv' else iter_ndjson)(queryset, chunk_size)
+
+
+async def async_chunks(chunks):
+    """
+    Feed a sync generator to an ASGI response one block at a time.
+
+    Django 4.2 collects a sync streaming iterator into a list before serving
+    it over ASGI; stepping it through sync_to_async keeps memory flat there
+    too, with every step on the same thread as its database cursor.
+    """
+    done = object()
+    while (chunk := await sync_to_async(next)(chunks, done)) is not done:
+        yield chunk
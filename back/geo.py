@@ -0,0 +1,56 @@
+import math
+from collections import defaultdict
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = 111.32
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance in kilometres between two (lat, lng) points."""
+    lat1, lng1, lat2, lng2 = map(math.radians, (float(lat1), float(lng1), float(lat2), float(lng2)))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+class SpatialGrid:
+    """
+    Fixed-size lat/lng buckets for "what is near this point" lookups.
+
+    Items are hashed into cells of `cell_km` on a side; a radius query only
+    visits the cells overlapping the search box and then filters by exact
+    haversine distance. Good enough for city-scale data held in memory.
+    """
+
+    def __init__(self, cell_km=2.0):
+        self.cell_deg = cell_km / KM_PER_DEGREE_LAT
+        self.cells = defaultdict(list)
+        self.size = 0
+
+    def _cell(self, lat, lng):
+        return (math.floor(float(lat) / self.cell_deg), math.floor(float(lng) / self.cell_deg))
+
+    def insert(self, item, lat, lng):
+        self.cells[self._cell(lat, lng)].append((float(lat), float(lng), item))
+        self.size += 1
+
+    def within(self, lat, lng, radius_km):
+        """Yield (distance_km, item) for every item within radius_km of (lat, lng)."""
+        lat, lng = float(lat), float(lng)
+        lat_cells = math.ceil(radius_km / KM_PER_DEGREE_LAT / self.cell_deg)
+        cos_lat = max(math.cos(math.radians(lat)), 0.01)
+        lng_cells = math.ceil(radius_km / (KM_PER_DEGREE_LAT * cos_lat) / self.cell_deg)
+
+        row, col = self._cell(lat, lng)
+        for d_row in range(-lat_cells, lat_cells + 1):
+            for d_col in range(-lng_cells, lng_cells + 1):
+                for item_lat, item_lng, item in self.cells.get((row + d_row, col + d_col), ()):
+                    distance = haversine_km(lat, lng, item_lat, item_lng)
+                    if distance <= radius_km:
+                        yield distance, item
+
+    def nearest(self, lat, lng, radius_km):
+        """Items within radius_km as a list of (distance_km, item), closest first."""
+        return sorted(self.within(lat, lng, radius_km), key=lambda pair: pair[0])
@@ -0,0 +1,172 @@
+"""
+Request-scoped identity map for catalog rows (Product, Addon, Rider, Location).
+
+IdentityMapMiddleware gives every request an empty map. Services and
+serializers look rows up through in_bulk()/get()/resolve() here: rows the
+request has already loaded come from memory, only the missing ones are
+queried, and each row is one Python instance for the rest of the request.
+Serializers that use IdentityRepresentationMixin also render a row once per
+request (keyed on its updated_at, so a row saved mid-request is rendered
+again) however many orders nest it.
+
+Outside a request (management commands, Celery tasks, background threads)
+there is no map and every call is a plain query.
+
+Each response carries an X-Identity-Map header with the request's counts;
+process totals are served by the cache stats endpoint.
+"""
+import contextvars
+import threading
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+_current = contextvars.ContextVar('identity_map', default=None)
+
+_totals_lock = threading.Lock()
+_totals = dict.fromkeys(('requests', 'hits', 'fetched', 'queries', 'queries_saved', 'representations_reused'), 0)
+
+
+class IdentityMap:
+    def __init__(self):
+        self._instances = {}
+        self._representations = {}
+        self.counters = dict.fromkeys(('hits', 'fetched', 'queries', 'queries_saved', 'representations_reused'), 0)
+
+    @staticmethod
+    def _key(model, pk):
+        return model._meta.label, pk
+
+    def add(self, instance):
+        """Register `instance`, or return the one already registered for its row."""
+        return self._instances.setdefault(self._key(type(instance), instance.pk), instance)
+
+    def in_bulk(self, model, ids):
+        """{pk: instance} for `ids`, querying only the rows not seen yet in this request."""
+        found, missing = {}, set()
+        for pk in ids:
+            instance = self._instances.get(self._key(model, pk))
+            if instance is None:
+                missing.add(pk)
+            else:
+                found[pk] = instance
+        self.counters['hits'] += len(found)
+        if missing:
+            self.counters['queries'] += 1
+            fetched = model._default_manager.in_bulk(missing)
+            self.counters['fetched'] += len(fetched)
+            found.update({pk: self.add(instance) for pk, instance in fetched.items()})
+        elif found:
+            self.counters['queries_saved'] += 1
+        return found
+
+    def representation(self, serializer, instance, render):
+        key = (type(serializer), *self._key(type(instance), instance.pk), getattr(instance, 'updated_at', None))
+        if key in self._representations:
+            self.counters['representations_reused'] += 1
+        else:
+            self._representations[key] = render(instance)
+        return self._representations[key]
+
+
+def current():
+    return _current.get()
+
+
+@contextmanager
+def identity_scope():
+    identity = IdentityMap()
+    token = _current.set(identity)
+    try:
+        yield identity
+    finally:
+        _current.reset(token)
+        with _totals_lock:
+            _totals['requests'] += 1
+            for name, value in identity.counters.items():
+                _totals[name] += value
+
+
+def in_bulk(model, ids):
+    identity = current()
+    if identity is None:
+        return model._default_manager.in_bulk(set(ids))
+    return identity.in_bulk(model, ids)
+
+
+def get(model, pk):
+    """The row with primary key `pk`; raises model.DoesNotExist like Manager.get()."""
+    try:
+        return in_bulk(model, [pk])[pk]
+    except KeyError:
+        raise model.DoesNotExist(f"{model._meta.object_name} matching pk={pk} does not exist.")
+
+
+def resolve(instances, field_name):
+    """
+    Fill the `field_name` foreign key of every instance from the map.
+
+    Like prefetch_related_objects() for one forward FK, but rows this
+    request already holds cost nothing and every instance shares one object
+    per row. Instances whose relation is already loaded are left alone.
+    """
+    instances = list(instances)
+    if not instances:
+        return
+    field = instances[0]._meta.get_field(field_name)
+    pending = [
+        instance for instance in instances
+        if not field.is_cached(instance) and getattr(instance, field.attname) is not None
+    ]
+    rows = in_bulk(field.related_model, {getattr(instance, field.attname) for instance in pending})
+    for instance in pending:
+        related = rows.get(getattr(instance, field.attname))
+        if related is not None:
+            field.set_cached_value(instance, related)
+
+
+class IdentityRepresentationMixin:
+    """Serializer mixin: render each row once per request, however often it is nested."""
+
+    def to_representation(self, instance):
+        identity = current()
+        if identity is None or instance.pk is None:
+            return super().to_representation(instance)
+        return identity.representation(self, instance, super().to_representation)
+
+
+def totals():
+    with _totals_lock:
+        return dict(_totals)
+
+
+class IdentityMapMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        with identity_scope() as identity:
+            response = self.get_response(request)
+        return self.instrument(response, identity)
+
+    async def __acall__(self, request):
+        with identity_scope() as identity:
+            response = await self.get_response(request)
+        return self.instrument(response, identity)
+
+    @staticmethod
+    def instrument(response, identity):
+        counters = identity.counters
+        response['X-Identity-Map'] = (
+            f"hits={counters['hits']}; queries={counters['queries']}; "
+            f"queries-saved={counters['queries_saved']}; reused={counters['representations_reused']}"
+        )
+        return response
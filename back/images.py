@@ -0,0 +1,139 @@
+"""
+Resized, re-encoded product images.
+
+An upload is stored under the SHA-256 of its bytes:
+
+    products/<hash>/original.<ext>
+    products/<hash>/<width>.webp
+    products/<hash>/<width>.jpg
+
+for each width in VARIANT_WIDTHS that does not upscale the original. The
+same file uploaded twice maps to the same names, so the second upload only
+checks that they exist. Variants are encoded in a thread pool; Pillow drops
+the GIL while resizing and encoding.
+"""
+import hashlib
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+VARIANT_WIDTHS = (200, 400, 800)
+MAX_PIXELS = 40_000_000
+
+# (extension, Pillow format, save options)
+FORMATS = (
+    ('webp', 'WEBP', {'quality': 80, 'method': 4}),
+    ('jpg', 'JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+)
+ORIGINAL_EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+
+_executor = ThreadPoolExecutor(max_workers=min(4, os.cpu_count() or 1), thread_name_prefix='images')
+
+
+class ImageProcessingError(Exception):
+    pass
+
+
+def _open(data):
+    try:
+        image = Image.open(io.BytesIO(data))
+        if image.width * image.height > MAX_PIXELS:
+            raise ImageProcessingError("Image dimensions are too large.")
+        image.load()
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, SyntaxError) as exc:
+        raise ImageProcessingError("File is not a readable image.") from exc
+    if image.format not in ORIGINAL_EXTENSIONS:
+        raise ImageProcessingError("Invalid file type. Only JPEG, PNG, GIF, and WebP are allowed.")
+    return image
+
+
+def variant_widths(width):
+    """Target widths for an original `width` px wide; never upscales."""
+    return [target for target in VARIANT_WIDTHS if target <= width] or [width]
+
+
+def _has_alpha(image):
+    return image.mode in ('RGBA', 'LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info)
+
+
+def _normalize(image):
+    """Orient by EXIF and convert to RGB/RGBA so resizing can filter properly."""
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if _has_alpha(image) else 'RGB')
+    return image
+
+
+def _flatten(image):
+    """RGB for JPEG; transparent areas become white."""
+    if image.mode != 'RGBA':
+        return image
+    background = Image.new('RGB', image.size, (255, 255, 255))
+    background.paste(image, mask=image.getchannel('A'))
+    return background
+
+
+def _encode(image, width):
+    """Resize to `width` and return {extension: bytes} for every format."""
+    if width != image.width:
+        height = max(1, round(image.height * width / image.width))
+        image = image.resize((width, height), Image.LANCZOS, reducing_gap=3.0)
+
+    encoded = {}
+    for extension, image_format, options in FORMATS:
+        buffer = io.BytesIO()
+        (image if image_format == 'WEBP' else _flatten(image)).save(buffer, image_format, **options)
+        encoded[extension] = buffer.getvalue()
+    return encoded
+
+
+def _save(name, data):
+    if default_storage.exists(name):
+        return name
+    return default_storage.save(name, ContentFile(data))
+
+
+def process_upload(uploaded_file):
+    """
+    Store `uploaded_file` and its variants; return URLs keyed by format and width.
+
+    Raises ImageProcessingError if the file is not a supported image.
+    """
+    data = uploaded_file.read()
+    digest = hashlib.sha256(data).hexdigest()
+    image = _open(data)
+    original_name = f'products/{digest}/original.{ORIGINAL_EXTENSIONS[image.format]}'
+    image = _normalize(image)
+    widths = variant_widths(image.width)
+
+    names = {
+        (extension, width): f'products/{digest}/{width}.{extension}'
+        for extension, _, _ in FORMATS
+        for width in widths
+    }
+    missing = sorted({width for (_, width), name in names.items() if not default_storage.exists(name)})
+    for width, encoded in zip(missing, _executor.map(lambda target: _encode(image, target), missing)):
+        for extension, content in encoded.items():
+            names[extension, width] = _save(names[extension, width], content)
+    original_name = _save(original_name, data)
+
+    variants = {
+        extension: {width: default_storage.url(names[extension, width]) for width in widths}
+        for extension, _, _ in FORMATS
+    }
+    return {
+        'hash': digest,
+        'width': image.width,
+        'height': image.height,
+        'original': default_storage.url(original_name),
+        'variants': variants,
+        'srcset': {
+            extension: ', '.join(f'{url} {width}w' for width, url in urls.items())
+            for extension, urls in variants.items()
+        },
+        'deduplicated': not missing,
+    }
@@ -0,0 +1,43 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+
+from back.analytics import rebuild_rollups
+from back.models import Order
+
+
+class Command(BaseCommand):
+    help = "Rebuild DailySalesRollup rows from delivered orders, a chunk of days at a time."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help="First day to rebuild (YYYY-MM-DD). Defaults to the oldest order.")
+        parser.add_argument('--end', help="Last day to rebuild (YYYY-MM-DD). Defaults to today.")
+        parser.add_argument('--chunk-days', type=int, default=31, help="Days rebuilt per transaction.")
+
+    def handle(self, *args, **options):
+        try:
+            start = date.fromisoformat(options['start']) if options['start'] else None
+            end = date.fromisoformat(options['end']) if options['end'] else timezone.localdate()
+        except ValueError as e:
+            raise CommandError(f"Invalid date: {e}")
+
+        if start is None:
+            first_order = Order.objects.aggregate(first=Min('created_at'))['first']
+            if first_order is None:
+                self.stdout.write("No orders to backfill.")
+                return
+            start = timezone.localtime(first_order).date()
+
+        chunk_days = max(options['chunk_days'], 1)
+        total_rows = 0
+        chunk_start = start
+        while chunk_start <= end:
+            chunk_end = min(chunk_start + timedelta(days=chunk_days - 1), end)
+            rows = rebuild_rollups(chunk_start, chunk_end)
+            total_rows += rows
+            self.stdout.write(f"{chunk_start} .. {chunk_end}: {rows} rows")
+            chunk_start = chunk_end + timedelta(days=1)
+
+        self.stdout.write(self.style.SUCCESS(f"Backfilled {total_rows} rollup rows from {start} to {end}"))
@@ -0,0 +1,130 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+
+from back.models import Location, Product
+from back.services import create_order, update_order_status
+
+# Environment per mode. no-wait is the stock backend without sqlite3's 5s lock wait.
+MODES = {
+    'no-wait': {'DB_SQLITE_CONCURRENT': '0', 'DB_SQLITE_TIMEOUT': '0'},
+    'default': {'DB_SQLITE_CONCURRENT': '0', 'DB_SQLITE_TIMEOUT': '5'},
+    'concurrent': {'DB_SQLITE_CONCURRENT': '1'},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Order writes per second with N parallel writers on a scratch SQLite file, "
+        "stock settings (with and without the lock wait) vs DB_SQLITE_CONCURRENT."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8, help="Parallel writer threads.")
+        parser.add_argument('--orders', type=int, default=25, help="Orders created (and moved to preparing) per writer.")
+        parser.add_argument('--mode', choices=['both', *MODES], default='both')
+        parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options['worker']:
+            self.stdout.write(json.dumps(self.run_writers(options['writers'], options['orders'])))
+            return
+
+        results = []
+        for mode in MODES if options['mode'] == 'both' else [options['mode']]:
+            with tempfile.TemporaryDirectory() as scratch:
+                env = {
+                    **os.environ,
+                    'DB_ENGINE': 'sqlite3',
+                    'DB_NAME': os.path.join(scratch, 'benchmark.sqlite3'),
+                    **MODES[mode],
+                    'DB_REPLICA_NAME': '',
+                    'DB_REPLICA_HOST': '',
+                }
+                # A fresh process per mode, so the engine comes from settings as in production.
+                run = subprocess.run(
+                    [sys.executable, str(settings.BASE_DIR / 'manage.py'), 'benchmark_sqlite_writes', '--worker',
+                     '--writers', str(options['writers']), '--orders', str(options['orders'])],
+                    env=env, capture_output=True, text=True,
+                )
+            if run.returncode:
+                raise CommandError(f"{mode} run failed:\n{run.stderr}")
+            results.append({'mode': mode, **json.loads(run.stdout.strip().splitlines()[-1])})
+
+        self.stdout.write(
+            f"{'mode':<12}{'writers':>8}{'committed':>11}{'locked':>8}{'orders/s':>10}{'p50 ms':>9}{'p95 ms':>9}"
+        )
+        for result in results:
+            self.stdout.write(
+                f"{result['mode']:<12}{result['writers']:>8}{result['committed']:>11}{result['locked']:>8}"
+                f"{result['orders_per_second']:>10.1f}{result['p50_ms']:>9.1f}{result['p95_ms']:>9.1f}"
+            )
+
+    def run_writers(self, writers, orders):
+        call_command('migrate', verbosity=0)
+        location = Location.objects.create(
+            name='Benchmark', area='Bench', address='Bench', delivery_time='15-25 min',
+            delivery_fee=Decimal('100.00'),
+        )
+        product = Product.objects.create(
+            name='Benchmark Swirl', description='', price=Decimal('500.00'), category='swirls',
+        )
+        connection.close()
+
+        latencies, failures = [], []
+        lock = threading.Lock()
+        barrier = threading.Barrier(writers)
+
+        def write(worker):
+            barrier.wait()
+            for number in range(orders):
+                started = time.perf_counter()
+                try:
+                    order = create_order(
+                        {
+                            'customer_name': f'Writer {worker}', 'customer_phone': '03001234567',
+                            'delivery_address': 'Bench', 'payment_method': 'cash',
+                            'delivery_type': 'delivery', 'selected_location': location,
+                        },
+                        [{'product_id': product.id, 'quantity': 2}],
+                    )
+                    update_order_status(order, 'preparing', updated_by='Benchmark')
+                except OperationalError as e:
+                    with lock:
+                        failures.append(str(e))
+                else:
+                    with lock:
+                        latencies.append(time.perf_counter() - started)
+            connection.close()
+
+        threads = [threading.Thread(target=write, args=(worker,)) for worker in range(writers)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        return {
+            'writers': writers,
+            'attempted': writers * orders,
+            'committed': len(latencies),
+            'locked': sum('locked' in failure for failure in failures),
+            'seconds': round(elapsed, 3),
+            'orders_per_second': len(latencies) / elapsed if elapsed else 0.0,
+            'p50_ms': statistics.median(latencies) * 1000 if latencies else 0.0,
+            'p95_ms': latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000 if latencies else 0.0,
+        }
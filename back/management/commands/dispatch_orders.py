@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from back.dispatch import dispatch_pending_orders
+
+
+class Command(BaseCommand):
+    help = "Assign every pending delivery order to the nearest available rider in one pass."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=None, help="Only dispatch the N oldest orders.")
+        parser.add_argument('--dry-run', action='store_true', help="Show the matches without assigning.")
+
+    def handle(self, *args, **options):
+        assignments, unassigned = dispatch_pending_orders(
+            limit=options['limit'], dry_run=options['dry_run']
+        )
+        for assignment in assignments:
+            self.stdout.write(
+                f"Order #{assignment.order.id} -> {assignment.rider.name} "
+                f"({assignment.distance_km:.1f} km, score {assignment.score:.2f})"
+            )
+
+        verb = "Would assign" if options['dry_run'] else "Assigned"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {len(assignments)} orders"))
+        if unassigned:
+            self.stdout.write(self.style.WARNING(
+                f"{len(unassigned)} orders left without a rider: "
+                + ", ".join(f"#{order.id}" for order in unassigned)
+            ))
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from back.export import DEFAULT_CHUNK_SIZE, FORMATS, export_orders, export_queryset
+from back.models import Order
+from back.routers import replica_alias
+from back.services import filter_created_between
+
+
+class Command(BaseCommand):
+    help = "Write order history with line items as CSV or NDJSON, streamed in chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', choices=list(FORMATS), default='csv', help="Export format.")
+        parser.add_argument('--file', help="Write to this path instead of stdout.")
+        parser.add_argument('--date-from', help="First day to include (YYYY-MM-DD).")
+        parser.add_argument('--date-to', help="Last day to include (YYYY-MM-DD).")
+        parser.add_argument('--status', help="Only orders with this status.")
+        parser.add_argument('--location', type=int, help="Only orders for this location id.")
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="Orders fetched per query.")
+
+    def handle(self, *args, **options):
+        orders = Order.objects.using(replica_alias())
+        if options['status']:
+            orders = orders.filter(status=options['status'])
+        if options['location']:
+            orders = orders.filter(selected_location_id=options['location'])
+        try:
+            orders = filter_created_between(orders, options['date_from'], options['date_to'])
+        except ValueError as e:
+            raise CommandError(f"Invalid date: {e}")
+
+        chunks = export_orders(export_queryset(orders), options['output'], max(options['chunk_size'], 1))
+        if not options['file']:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+
+        with open(options['file'], 'w', newline='', encoding='utf-8') as handle:
+            for chunk in chunks:
+                handle.write(chunk)
+        self.stderr.write(self.style.SUCCESS(f"Exported orders to {options['file']}"))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from back import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the product full-text search index from the Product table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        if not search.is_supported():
+            self.stdout.write(self.style.WARNING("This database has no product search index; nothing to do."))
+            return
+
+        with transaction.atomic():
+            count = search.rebuild_index(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} products"))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from back.services import reconcile_rider_load
+
+
+class Command(BaseCommand):
+    help = "Recompute riders' current_orders from their open orders. Safe to run periodically (e.g. from cron)."
+
+    def handle(self, *args, **options):
+        changed = reconcile_rider_load()
+        self.stdout.write(self.style.SUCCESS(f"Reconciled {changed} riders"))
@@ -0,0 +1,132 @@
+"""
+Whole storefront menu in one response, precompiled per catalog version.
+
+The snapshot (available products with addon ids, each referenced addon once,
+categories, available locations and the status choices) is built once,
+encoded to JSON and compressed with gzip and, when the brotli package is
+installed, brotli. It is kept in process memory and rebuilt only when the
+CatalogVersion counters bumped by back.signals move on, so a request costs
+one small version query plus a copy of ready-made bytes.
+"""
+import gzip
+import hashlib
+import json
+import threading
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Addon, CatalogVersion, Location, Order, Product, Rider
+from .serializers import AddonSerializer, LocationSerializer, MenuProductSerializer
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MENU_CATALOGS = ('addon', 'location', 'product')
+
+# Preferred first.
+ENCODINGS = ('br', 'gzip') if brotli else ('gzip',)
+
+_lock = threading.Lock()
+_snapshot = None
+
+
+def accepted_encodings(header):
+    """{coding: q} from an Accept-Encoding header; a coding without q= has q=1."""
+    accepted = {}
+    for part in (header or '').split(','):
+        coding, *params = [piece.strip() for piece in part.split(';')]
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding.lower()] = q
+    return accepted
+
+
+class MenuSnapshot:
+    def __init__(self, version, body):
+        self.version = version
+        self.bodies = {None: body, 'gzip': gzip.compress(body, compresslevel=9, mtime=0)}
+        if brotli:
+            self.bodies['br'] = brotli.compress(body, quality=11)
+        # Strong ETags name exact bytes, so each encoding hashes its own body.
+        self.etags = {
+            encoding: f'"menu-{hashlib.sha1(data).hexdigest()[:16]}"' for encoding, data in self.bodies.items()
+        }
+
+    def negotiate(self, accept_encoding):
+        """
+        (encoding, bytes, etag) for an Accept-Encoding header; encoding is None for identity.
+
+        The highest q-value wins, ties go to ENCODINGS order, and q=0 rules a
+        coding out.
+        """
+        accepted = accepted_encodings(accept_encoding)
+        wildcard = accepted.get('*', 0.0)
+        q, _, encoding = max((accepted.get(name, wildcard), -rank, name) for rank, name in enumerate(ENCODINGS))
+        if q <= 0:
+            encoding = None
+        return encoding, self.bodies[encoding], self.etags[encoding]
+
+
+def catalog_version():
+    rows = dict(CatalogVersion.objects.filter(name__in=MENU_CATALOGS).values_list('name', 'version'))
+    return ','.join(f"{name}:{rows.get(name, 0)}" for name in MENU_CATALOGS)
+
+
+def _choices(choices):
+    return [{'value': value, 'label': label} for value, label in choices]
+
+
+def build_menu(version):
+    products = MenuProductSerializer(
+        Product.objects.filter(is_available=True).prefetch_related('addons').order_by('category', 'name'),
+        many=True,
+    ).data
+    addon_ids = {addon_id for product in products for addon_id in product['addon_ids']}
+    addons = AddonSerializer(Addon.objects.filter(id__in=addon_ids).order_by('id'), many=True).data
+    return {
+        # Nothing per-process (like a build time): every worker must produce
+        # the same bytes for a version, since they share the ETags.
+        'version': version,
+        'products': products,
+        'addons': {str(addon['id']): addon for addon in addons},
+        'categories': _choices(Product.CATEGORY_CHOICES),
+        'locations': LocationSerializer(Location.objects.filter(available=True).order_by('name'), many=True).data,
+        'status_choices': {
+            'order': _choices(Order.STATUS_CHOICES),
+            'payment': _choices(Order.PAYMENT_CHOICES),
+            'rider': _choices(Rider.STATUS_CHOICES),
+            'vehicle': _choices(Rider.VEHICLE_CHOICES),
+        },
+    }
+
+
+def get_menu_snapshot():
+    """The current snapshot, rebuilt first if the catalog version has moved."""
+    global _snapshot
+    version = catalog_version()
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.version == version:
+        return snapshot
+    with _lock:
+        if _snapshot is None or _snapshot.version != version:
+            # The version is read before the rows, so a snapshot is never
+            # labelled newer than what it contains.
+            body = json.dumps(build_menu(version), cls=DjangoJSONEncoder, separators=(',', ':')).encode()
+            _snapshot = MenuSnapshot(version, body)
+        return _snapshot
+
+
+def clear_menu_snapshot():
+    global _snapshot
+    with _lock:
+        _snapshot = None
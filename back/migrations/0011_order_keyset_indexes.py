@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-17 10:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('back', '0010_dailysalesrollup'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['-created_at', '-id'], name='order_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['sooicy_user', '-created_at', '-id'], name='order_user_created_id_idx'),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 4.2.7 on 2026-10-17 12:41
+
+from django.db import migrations
+
+
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS back_product_fts USING fts5("
+    "name, description, category, tags, ingredients, "
+    "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS back_product_fts_vocab USING fts5vocab(back_product_fts, 'row')",
+    "INSERT INTO back_product_fts (rowid, name, description, category, tags, ingredients) "
+    "SELECT id, name, description, category, tags, ingredients FROM back_product",
+]
+SQLITE_REVERSE = [
+    "DROP TABLE IF EXISTS back_product_fts_vocab",
+    "DROP TABLE IF EXISTS back_product_fts",
+]
+
+POSTGRES_FORWARD = [
+    "CREATE TABLE IF NOT EXISTS back_product_search ("
+    "product_id integer PRIMARY KEY REFERENCES back_product (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+    "document tsvector NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS back_product_search_document_idx ON back_product_search USING GIN (document)",
+    "INSERT INTO back_product_search (product_id, document) "
+    "SELECT id, "
+    "setweight(to_tsvector('simple', name), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(description, '')), 'C') || "
+    "setweight(to_tsvector('simple', coalesce(category, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(tags::text, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(ingredients::text, '')), 'C') "
+    "FROM back_product",
+]
+POSTGRES_REVERSE = [
+    "DROP TABLE IF EXISTS back_product_search",
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+        for sql in statements.get(vendor, []):
+            schema_editor.execute(sql)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('back', '0012_catalogversion'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run({'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRES_FORWARD}),
+            run({'sqlite': SQLITE_REVERSE, 'postgresql': POSTGRES_REVERSE}),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.7 on 2026-10-17 13:30
+
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+def backfill_normalized_phones(apps, schema_editor):
+    from back.models import normalize_phone
+
+    Order = apps.get_model('back', 'Order')
+    orders = Order.objects.db_manager(schema_editor.connection.alias)
+    batch = []
+    for order in orders.only('id', 'customer_phone').iterator(chunk_size=2000):
+        order.customer_phone_normalized = normalize_phone(order.customer_phone)
+        batch.append(order)
+        if len(batch) >= 2000:
+            orders.bulk_update(batch, ['customer_phone_normalized'])
+            batch = []
+    orders.bulk_update(batch, ['customer_phone_normalized'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('back', '0013_product_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='customer_phone_normalized',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=15),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(django.db.models.functions.text.Lower('customer_name'), name='order_customer_name_lower_idx'),
+        ),
+        migrations.RunPython(backfill_normalized_phones, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-17 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('back', '0014_order_customer_phone_normalized'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', '-created_at', '-id'], name='order_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('status', 'delivered')), fields=['created_at'], name='order_delivered_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orderitem',
+            index=models.Index(fields=['product', 'order'], name='orderitem_product_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ordertracking',
+            index=models.Index(fields=['order', '-timestamp'], name='tracking_order_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rider',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['status'], name='rider_active_status_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-17 15:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('back', '0015_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rider',
+            name='latitude',
+            field=models.DecimalField(blank=True, decimal_places=8, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='rider',
+            name='longitude',
+            field=models.DecimalField(blank=True, decimal_places=8, max_digits=11, null=True),
+        ),
+    ]
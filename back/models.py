@@ -1,8 +1,23 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.db.models.functions import Lower
+import re
 import uuid
 
+DEFAULT_COUNTRY_CODE = "92"
+
+
+def normalize_phone(value, country_code=DEFAULT_COUNTRY_CODE):
+    """Digits only, without the international prefix or trunk zero: '+92 300-1234567' -> '3001234567'."""
+    value = (value or "").strip()
+    digits = re.sub(r"\D", "", value)
+    if digits.startswith("00" + country_code):
+        digits = digits[2 + len(country_code):]
+    elif digits.startswith(country_code) and (value.startswith("+") or len(digits) > 10):
+        digits = digits[len(country_code):]
+    return digits.lstrip("0")
+
 
 class SooicyUser(models.Model):
     id = models.AutoField(primary_key=True)
@@ -27,6 +42,8 @@ class SooicyUser(models.Model):
 
 
 class Rider(models.Model):
+    MAX_CONCURRENT_ORDERS = 3
+
     STATUS_CHOICES = [
         ("available", "Available"),
         ("busy", "Busy"),
@@ -61,6 +78,13 @@ class Rider(models.Model):
     )
     total_deliveries = models.IntegerField(default=0)
     current_orders = models.IntegerField(default=0)
+    # Last reported position, used by back.dispatch to find the nearest rider.
+    latitude = models.DecimalField(
+        max_digits=10, decimal_places=8, blank=True, null=True
+    )
+    longitude = models.DecimalField(
+        max_digits=11, decimal_places=8, blank=True, null=True
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True)
@@ -70,9 +94,19 @@ class Rider(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(
+                fields=["status"],
+                condition=models.Q(is_active=True),
+                name="rider_active_status_idx",
+            ),
+        ]
 
 
 class Location(models.Model):
+    # back.coverage scans a grid area that grows with the square of the largest radius.
+    MAX_COVERAGE_RADIUS = 50  # in KM
+
     id = models.AutoField(primary_key=True)
     name = models.CharField(max_length=100)
     area = models.CharField(max_length=100)
@@ -208,9 +242,14 @@ class Order(models.Model):
         ("pickup", "Pickup"),
     ]
 
+    TERMINAL_STATUSES = ("delivered", "cancelled")
+
     id = models.AutoField(primary_key=True)
     customer_name = models.CharField(max_length=100)
     customer_phone = models.CharField(max_length=15)
+    customer_phone_normalized = models.CharField(
+        max_length=15, blank=True, default="", db_index=True, editable=False
+    )
     customer_email = models.EmailField(blank=True, null=True)
     delivery_address = models.TextField()
     payment_method = models.CharField(max_length=20, choices=PAYMENT_CHOICES)
@@ -235,8 +274,32 @@ class Order(models.Model):
     def __str__(self):
         return f"Order #{self.id} - {self.customer_name}"
 
+    def save(self, *args, **kwargs):
+        self.customer_phone_normalized = normalize_phone(self.customer_phone)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "customer_phone" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "customer_phone_normalized"}
+        super().save(*args, **kwargs)
+
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            # Keyset pagination (back.pagination.KeysetPagination).
+            models.Index(fields=["-created_at", "-id"], name="order_created_id_idx"),
+            models.Index(
+                fields=["sooicy_user", "-created_at", "-id"], name="order_user_created_id_idx"
+            ),
+            # Prefix search on customer name (back.services.search_orders).
+            models.Index(Lower("customer_name"), name="order_customer_name_lower_idx"),
+            # Status-filtered lists and dashboard counters.
+            models.Index(fields=["status", "-created_at", "-id"], name="order_status_created_idx"),
+            # Sales analytics only ever look at delivered orders.
+            models.Index(
+                fields=["created_at"],
+                condition=models.Q(status="delivered"),
+                name="order_delivered_created_idx",
+            ),
+        ]
 
 
 class OrderItem(models.Model):
@@ -262,6 +325,12 @@ class OrderItem(models.Model):
     def __str__(self):
         return f"{self.product.name} x{self.quantity}"
 
+    class Meta:
+        indexes = [
+            # Per-product sales joined to order status (top products).
+            models.Index(fields=["product", "order"], name="orderitem_product_order_idx"),
+        ]
+
 
 class OrderTracking(models.Model):
     order = models.ForeignKey(Order, related_name="tracking", on_delete=models.CASCADE)
@@ -275,3 +344,52 @@ class OrderTracking(models.Model):
 
     class Meta:
         ordering = ["-timestamp"]
+        indexes = [
+            models.Index(fields=["order", "-timestamp"], name="tracking_order_time_idx"),
+        ]
+
+
+class DailySalesRollup(models.Model):
+    """Delivered-order totals per day and branch, maintained by back.signals."""
+
+    date = models.DateField()
+    # Rows are folded into the no-location row before a Location is deleted
+    # (back.signals), so the cascade only removes rows written meanwhile.
+    location = models.ForeignKey(
+        Location,
+        on_delete=models.CASCADE,
+        blank=True,
+        null=True,
+        related_name="daily_sales",
+    )
+    order_count = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    items_sold = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.date} - {self.location or 'No location'}"
+
+    class Meta:
+        ordering = ["date"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["date", "location"], name="daily_sales_rollup_date_location"
+            ),
+            models.UniqueConstraint(
+                fields=["date"],
+                condition=models.Q(location__isnull=True),
+                name="daily_sales_rollup_date_no_location",
+            ),
+        ]
+
+
+class CatalogVersion(models.Model):
+    """Change counter per catalog table, bumped by back.signals; feeds ETag/Last-Modified."""
+
+    name = models.CharField(max_length=50, unique=True)
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} v{self.version}"
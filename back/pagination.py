@@ -0,0 +1,109 @@
+import base64
+import json
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset pagination over (created_at, id), newest first.
+
+    Each page is a single indexed range scan ("created_at, id < last row seen"),
+    so deep pages cost the same as the first one. Cursors are opaque
+    base64 tokens carrying the boundary row and the direction of travel.
+    Backed by the (-created_at, -id) indexes on Order.
+    """
+
+    cursor_query_param = 'cursor'
+    limit_query_param = 'limit'
+    default_limit = settings.REST_FRAMEWORK.get('PAGE_SIZE', 20)
+    max_limit = 100
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_limit(self, request):
+        try:
+            limit = int(request.query_params.get(self.limit_query_param, self.default_limit))
+        except ValueError:
+            return self.default_limit
+        return min(max(limit, 1), self.max_limit)
+
+    def encode_cursor(self, obj, reverse):
+        payload = {'c': obj.created_at.isoformat(), 'i': obj.pk, 'r': int(reverse)}
+        token = base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode())
+        return token.decode().rstrip('=')
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            padded = token + '=' * (-len(token) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            created_at = parse_datetime(payload['c'])
+            if created_at is None:
+                raise ValueError(payload['c'])
+            return created_at, int(payload['i']), bool(payload['r'])
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.limit = self.get_limit(request)
+        cursor = self.decode_cursor(request)
+
+        if cursor is None:
+            reverse = False
+            queryset = queryset.order_by('-created_at', '-id')
+        else:
+            created_at, pk, reverse = cursor
+            if reverse:
+                queryset = queryset.filter(
+                    Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk)
+                ).order_by('created_at', 'id')
+            else:
+                queryset = queryset.filter(
+                    Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+                ).order_by('-created_at', '-id')
+
+        results = list(queryset[:self.limit + 1])
+        has_more = len(results) > self.limit
+        results = results[:self.limit]
+        if reverse:
+            results.reverse()
+
+        self.has_next = has_more if not reverse else cursor is not None
+        self.has_previous = has_more if reverse else cursor is not None
+        self.page = results
+        return results
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1], False))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        url = self.request.build_absolute_uri()
+        if not self.page:
+            return remove_query_param(url, self.cursor_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[0], True))
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+
+class RecentOrdersPagination(KeysetPagination):
+    default_limit = 10
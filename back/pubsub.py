@@ -0,0 +1,193 @@
+"""
+Publish/subscribe used to push order-tracking rows to connected clients.
+
+Subscribers are bounded asyncio queues on the ASGI event loop. Publishing is
+synchronous and thread-safe, so it can be called from ORM signal handlers
+running in the sync thread pool. An idle subscriber costs one queue and one
+set entry, which lets a single worker park thousands of them.
+
+InProcessBroker only reaches subscribers in the same process. RedisBroker
+publishes through Redis, and each worker keeps one pattern subscription that
+fans messages out to its local queues, so Redis connections do not grow with
+the number of clients. settings.TRACKING_PUBSUB_BACKEND picks the backend.
+"""
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+
+import redis
+import redis.asyncio
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIBER_QUEUE_SIZE = 100
+LISTENER_READY_TIMEOUT = 5
+RECONNECT_DELAY = 1
+
+
+class Subscription:
+    """
+    Messages published to one channel, read with get().
+
+    Registered on `async with` entry and dropped on exit. A subscriber that
+    stops reading loses its oldest messages instead of blocking publishers.
+    """
+
+    def __init__(self, broker, channel):
+        self.broker = broker
+        self.channel = channel
+        self.loop = None
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def _put(self, message):
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(message)
+
+    async def get(self, timeout=None):
+        """Next message; raises asyncio.TimeoutError after `timeout` seconds."""
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    async def __aenter__(self):
+        self.loop = asyncio.get_running_loop()
+        await self.broker._register(self)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.broker._unregister(self)
+
+
+class InProcessBroker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def subscribe(self, channel):
+        return Subscription(self, channel)
+
+    async def _register(self, subscription):
+        with self._lock:
+            self._subscribers[subscription.channel].add(subscription)
+
+    def _unregister(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.channel]
+
+    def subscriber_count(self, channel):
+        with self._lock:
+            return len(self._subscribers.get(channel, ()))
+
+    def deliver(self, channel, message):
+        """Hand `message` to this process's subscribers of `channel`."""
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._put, message)
+            except RuntimeError:
+                # The subscriber's event loop has been closed.
+                self._unregister(subscription)
+
+    def publish(self, channel, message):
+        self.deliver(channel, message)
+
+
+class RedisBroker(InProcessBroker):
+    """
+    Fan-out across processes through Redis PUBLISH / PSUBSCRIBE.
+
+    `client` and `async_client_factory` default to connections built from
+    `url` (settings.REDIS_URL); tests pass fakeredis clients instead.
+    """
+
+    def __init__(self, url=None, prefix='sooicy:', client=None, async_client_factory=None):
+        super().__init__()
+        self.url = url or settings.REDIS_URL
+        self.prefix = prefix
+        self._client = client
+        self._async_client_factory = async_client_factory or (lambda: redis.asyncio.Redis.from_url(self.url))
+        self._listeners = {}
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = redis.Redis.from_url(self.url)
+        return self._client
+
+    def publish(self, channel, message):
+        self.client.publish(self.prefix + channel, json.dumps(message))
+
+    async def _register(self, subscription):
+        await super()._register(subscription)
+        loop = subscription.loop
+        if loop not in self._listeners:
+            ready = asyncio.Event()
+            self._listeners[loop] = (loop.create_task(self._listen(ready)), ready)
+        _, ready = self._listeners[loop]
+        try:
+            # Callers read history after subscribing; wait until Redis is
+            # actually forwarding so nothing written in between is missed.
+            await asyncio.wait_for(ready.wait(), LISTENER_READY_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning('Redis pub/sub listener is not connected yet')
+
+    async def _listen(self, ready):
+        while True:
+            client = self._async_client_factory()
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.psubscribe(self.prefix + '*')
+                ready.set()
+                async for message in pubsub.listen():
+                    try:
+                        channel = message['channel']
+                        if isinstance(channel, bytes):
+                            channel = channel.decode()
+                        payload = json.loads(message['data'])
+                        self.deliver(channel[len(self.prefix):], payload)
+                    except Exception:
+                        # One bad message must not end the listener for every subscriber.
+                        logger.exception('Dropping undeliverable pub/sub message')
+            except (redis.RedisError, OSError):
+                logger.warning('Redis pub/sub connection lost, reconnecting', exc_info=True)
+                ready.clear()
+                await asyncio.sleep(RECONNECT_DELAY)
+            except Exception:
+                logger.exception('Redis pub/sub listener failed, restarting')
+                ready.clear()
+                await asyncio.sleep(RECONNECT_DELAY)
+            finally:
+                await pubsub.aclose()
+                await client.aclose()
+
+    async def aclose(self):
+        """Stop the listener on the running loop (worker shutdown, tests)."""
+        listener = self._listeners.pop(asyncio.get_running_loop(), None)
+        if listener is not None:
+            task, _ = listener
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(settings.TRACKING_PUBSUB_BACKEND)()
+    return _broker
@@ -0,0 +1,129 @@
+"""
+Stale-while-revalidate cache for expensive read-only payloads.
+
+Entries are stored in the two-tier cache (back.caching) with the time they
+were computed. Younger than `soft_ttl` they are served as they are. Between
+`soft_ttl` and `hard_ttl` they are still served at once, but a background
+thread recomputes them for the next request. Past `hard_ttl` (the entry has
+expired out of the cache) the request computes the payload itself, through
+back.singleflight so concurrent misses share one computation.
+
+Per-key counters and the age of each entry are kept in process, for the
+freshness endpoint.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import close_old_connections
+
+from .caching import get_cache
+from .singleflight import get_flight
+
+logger = logging.getLogger(__name__)
+
+FRESH, STALE, MISS = 'fresh', 'stale', 'miss'
+# Query parameters are free-form, so metrics are kept for the most recent keys only.
+MAX_TRACKED_KEYS = 256
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='revalidate')
+
+
+class ResponseCache:
+    def __init__(self, name, soft_ttl, hard_ttl, executor=None):
+        if soft_ttl > hard_ttl:
+            raise ValueError("soft_ttl must not exceed hard_ttl")
+        self.name = name
+        self.soft_ttl = soft_ttl
+        self.hard_ttl = hard_ttl
+        self.executor = executor or _executor
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self._metrics = {}
+
+    def _key(self, key):
+        return f'swr:{self.name}:{key}'
+
+    def _record(self, key, counter, computed_at=None):
+        with self._lock:
+            metrics = self._metrics.get(key)
+            if metrics is None:
+                if len(self._metrics) >= MAX_TRACKED_KEYS:
+                    del self._metrics[next(iter(self._metrics))]
+                metrics = self._metrics[key] = dict.fromkeys(
+                    (FRESH, STALE, MISS, 'refreshes', 'refresh_errors'), 0
+                ) | {'computed_at': None}
+            if counter:
+                metrics[counter] += 1
+            if computed_at is not None:
+                metrics['computed_at'] = computed_at
+
+    def get(self, key, build):
+        """
+        Return (payload, age in seconds, state) for `key`; state is FRESH, STALE or MISS.
+
+        build() produces the payload on a miss and on background refreshes,
+        so it must not depend on the calling request.
+        """
+        entry = get_cache().get(self._key(key))
+        if entry is not None:
+            age = time.time() - entry['computed_at']
+            if age < self.soft_ttl:
+                self._record(key, FRESH, entry['computed_at'])
+                return entry['payload'], age, FRESH
+            if age < self.hard_ttl:
+                self._record(key, STALE, entry['computed_at'])
+                self._schedule_refresh(key, build)
+                return entry['payload'], age, STALE
+        self._record(key, MISS)
+        return get_flight().do(self._key(key), lambda: self._compute(key, build)), 0, MISS
+
+    def _compute(self, key, build):
+        payload = build()
+        computed_at = time.time()
+        get_cache().set(self._key(key), {'payload': payload, 'computed_at': computed_at}, self.hard_ttl)
+        self._record(key, None, computed_at)
+        return payload
+
+    def _schedule_refresh(self, key, build):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        self.executor.submit(self._refresh, key, build)
+
+    def _refresh(self, key, build):
+        try:
+            get_flight().do(self._key(key), lambda: self._compute(key, build))
+            self._record(key, 'refreshes')
+        except Exception:
+            logger.exception('Refreshing %s failed', self._key(key))
+            self._record(key, 'refresh_errors')
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+            close_old_connections()
+
+    def cache_control(self, age):
+        """Cache-Control directives matching an entry of `age` seconds."""
+        return {
+            'private': True,
+            'max_age': max(int(self.soft_ttl - age), 0),
+            'stale_while_revalidate': self.hard_ttl - self.soft_ttl,
+        }
+
+    def stats(self):
+        now = time.time()
+        with self._lock:
+            keys = {key: dict(metrics) for key, metrics in self._metrics.items()}
+            refreshing = set(self._refreshing)
+        for key, metrics in keys.items():
+            computed_at = metrics.pop('computed_at')
+            age = now - computed_at if computed_at is not None else None
+            metrics.update(
+                age=round(age, 3) if age is not None else None,
+                state=None if age is None else FRESH if age < self.soft_ttl else STALE if age < self.hard_ttl else 'expired',
+                refreshing=key in refreshing,
+            )
+        return {'soft_ttl': self.soft_ttl, 'hard_ttl': self.hard_ttl, 'keys': keys}
@@ -0,0 +1,62 @@
+"""
+Sends heavy read-only analytics queries to the 'replica' database.
+
+Reads go to the replica only inside use_replica() (a context manager that
+also works as a decorator) and only when a 'replica' alias is configured;
+everything else, including every write, uses the primary. Inside a scope,
+reads fall back to the primary while a transaction is open there or once
+the scope has written anything, so a flow always sees its own writes.
+"""
+import contextvars
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA_DB_ALIAS = 'replica'
+
+_scope = contextvars.ContextVar('replica_scope', default=None)
+
+
+class _Scope:
+    __slots__ = ('wrote',)
+
+    def __init__(self):
+        self.wrote = False
+
+
+@contextmanager
+def use_replica():
+    token = _scope.set(_Scope())
+    try:
+        yield
+    finally:
+        _scope.reset(token)
+
+
+def replica_configured():
+    return REPLICA_DB_ALIAS in connections.settings
+
+
+def replica_alias():
+    """Alias for an explicit .using() on a read-only path: the replica if there is one."""
+    return REPLICA_DB_ALIAS if replica_configured() else DEFAULT_DB_ALIAS
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        scope = _scope.get()
+        if scope is None or scope.wrote or not replica_configured():
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return REPLICA_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        scope = _scope.get()
+        if scope is not None:
+            scope.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data.
+        return True
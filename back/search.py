@@ -0,0 +1,210 @@
+"""
+Full-text search over products.
+
+SQLite uses an FTS5 table (``back_product_fts``, rowid = product id) ranked
+with bm25; PostgreSQL uses ``back_product_search`` with a weighted tsvector
+behind a GIN index, ranked with ts_rank. Both are created by migration 0013,
+kept in sync by back.signals and rebuilt by ``manage.py rebuild_search_index``.
+Terms are prefix-matched; when a query finds nothing, each term is retried
+with its closest spellings from the index vocabulary. The vocabulary is read
+once per 'product' catalog version and kept in process memory, grouped by
+word length so difflib only scores words long or short enough to pass the
+cutoff.
+"""
+import difflib
+import re
+import threading
+
+from django.db import connection
+
+from .catalog import CATALOG_NAMES, bump_catalog_version
+from .models import CatalogVersion, Product
+
+SQLITE_TABLE = 'back_product_fts'
+SQLITE_VOCAB_TABLE = 'back_product_fts_vocab'
+POSTGRES_TABLE = 'back_product_search'
+
+# name, description, category, tags, ingredients
+SQLITE_WEIGHTS = (10.0, 2.0, 4.0, 6.0, 3.0)
+
+TYPO_CUTOFF = 0.75
+TYPO_ALTERNATIVES = 3
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+_vocabulary_lock = threading.Lock()
+_vocabulary_cache = None  # (catalog version, {word length: [words]})
+
+
+def is_supported():
+    return connection.vendor in ('sqlite', 'postgresql')
+
+
+def tokenize(query):
+    return TOKEN_RE.findall(query.lower())
+
+
+def _join(values):
+    return ' '.join(str(value) for value in values or [])
+
+
+def _document(product):
+    return (
+        product.name,
+        product.description or '',
+        product.category or '',
+        _join(product.tags),
+        _join(product.ingredients),
+    )
+
+
+def index_products(products):
+    """Insert or replace the index rows for the given products."""
+    if not is_supported():
+        return
+    rows = [(product.pk, *_document(product)) for product in products]
+    if not rows:
+        return
+
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.executemany(f"DELETE FROM {SQLITE_TABLE} WHERE rowid = %s", [(row[0],) for row in rows])
+            cursor.executemany(
+                f"INSERT INTO {SQLITE_TABLE} (rowid, name, description, category, tags, ingredients) "
+                "VALUES (%s, %s, %s, %s, %s, %s)",
+                rows,
+            )
+        else:
+            cursor.executemany(
+                f"INSERT INTO {POSTGRES_TABLE} (product_id, document) VALUES (%s, "
+                "setweight(to_tsvector('simple', %s), 'A') || "
+                "setweight(to_tsvector('simple', %s), 'C') || "
+                "setweight(to_tsvector('simple', %s), 'B') || "
+                "setweight(to_tsvector('simple', %s), 'B') || "
+                "setweight(to_tsvector('simple', %s), 'C')) "
+                "ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document",
+                rows,
+            )
+
+
+def remove_products(product_ids):
+    if not is_supported() or not product_ids:
+        return
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.executemany(f"DELETE FROM {SQLITE_TABLE} WHERE rowid = %s", [(pk,) for pk in product_ids])
+        else:
+            cursor.execute(f"DELETE FROM {POSTGRES_TABLE} WHERE product_id = ANY(%s)", [list(product_ids)])
+
+
+def rebuild_index(chunk_size=500):
+    """Drop every index row and re-index all products. Returns the number indexed."""
+    if not is_supported():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SQLITE_TABLE if connection.vendor == 'sqlite' else POSTGRES_TABLE}")
+
+    count = 0
+    batch = []
+    for product in Product.objects.order_by('id').iterator(chunk_size=chunk_size):
+        batch.append(product)
+        if len(batch) >= chunk_size:
+            index_products(batch)
+            count += len(batch)
+            batch = []
+    index_products(batch)
+    # Other workers drop their cached vocabulary when the version moves.
+    bump_catalog_version(CATALOG_NAMES[Product])
+    clear_vocabulary()
+    return count + len(batch)
+
+
+def _read_vocabulary():
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f"SELECT term FROM {SQLITE_VOCAB_TABLE}")
+        else:
+            cursor.execute(f"SELECT word FROM ts_stat('SELECT document FROM {POSTGRES_TABLE}')")
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _vocabulary():
+    """{word length: [words]} for the index, re-read only when the product catalog version moves."""
+    global _vocabulary_cache
+    version = CatalogVersion.objects.filter(name=CATALOG_NAMES[Product]).values_list('version', flat=True).first() or 0
+    cached = _vocabulary_cache
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    with _vocabulary_lock:
+        if _vocabulary_cache is None or _vocabulary_cache[0] != version:
+            # The version is read before the words, so the cache is never
+            # labelled newer than what it contains.
+            by_length = {}
+            for word in _read_vocabulary():
+                by_length.setdefault(len(word), []).append(word)
+            _vocabulary_cache = (version, by_length)
+        return _vocabulary_cache[1]
+
+
+def clear_vocabulary():
+    global _vocabulary_cache
+    with _vocabulary_lock:
+        _vocabulary_cache = None
+
+
+def _close_matches(term, vocabulary):
+    # difflib's ratio is at most 2 * min(len) / (sum of lens), so words much
+    # shorter or longer than the term cannot reach the cutoff.
+    low = int(len(term) * TYPO_CUTOFF / (2 - TYPO_CUTOFF))
+    high = int(len(term) * (2 - TYPO_CUTOFF) / TYPO_CUTOFF) + 1
+    candidates = [word for length in range(low, high + 1) for word in vocabulary.get(length, ())]
+    return difflib.get_close_matches(term, candidates, n=TYPO_ALTERNATIVES, cutoff=TYPO_CUTOFF)
+
+
+def _match(term_groups):
+    """Run one ranked query; each group is a list of alternatives for one query term."""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            expression = ' AND '.join(
+                '(' + ' OR '.join(f'"{term}"*' for term in group) + ')' for group in term_groups
+            )
+            weights = ', '.join(str(weight) for weight in SQLITE_WEIGHTS)
+            cursor.execute(
+                f"SELECT rowid FROM {SQLITE_TABLE} WHERE {SQLITE_TABLE} MATCH %s "
+                f"ORDER BY bm25({SQLITE_TABLE}, {weights})",
+                [expression],
+            )
+        else:
+            expression = ' & '.join(
+                '(' + ' | '.join(f"{term}:*" for term in group) + ')' for group in term_groups
+            )
+            cursor.execute(
+                f"SELECT product_id FROM {POSTGRES_TABLE}, to_tsquery('simple', %s) query "
+                "WHERE document @@ query ORDER BY ts_rank(document, query) DESC, product_id",
+                [expression],
+            )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def search_product_ids(query):
+    """
+    Product ids matching `query`, best match first.
+
+    Returns None when the database has no search index, so callers can fall
+    back to plain filtering.
+    """
+    if not is_supported():
+        return None
+    terms = tokenize(query)
+    if not terms:
+        return []
+
+    ids = _match([[term] for term in terms])
+    if ids:
+        return ids
+
+    vocabulary = _vocabulary()
+    corrected = [[term] + _close_matches(term, vocabulary) for term in terms]
+    if all(len(group) == 1 for group in corrected):
+        return []
+    return _match(corrected)
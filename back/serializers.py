@@ -1,3 +1,4 @@
+from django.db.models import Prefetch
 from rest_framework import serializers
 from .models import (
     Addon,
@@ -10,9 +11,10 @@ from .models import (
     Customer,
     SooicyUser,
 )
+from .identity import IdentityRepresentationMixin
 
 
-class RiderSerializer(serializers.ModelSerializer):
+class RiderSerializer(IdentityRepresentationMixin, serializers.ModelSerializer):
     class Meta:
         model = Rider
         fields = "__all__"
@@ -33,7 +35,7 @@ class RiderSerializer(serializers.ModelSerializer):
         return value
 
 
-class LocationSerializer(serializers.ModelSerializer):
+class LocationSerializer(IdentityRepresentationMixin, serializers.ModelSerializer):
     class Meta:
         model = Location
         fields = "__all__"
@@ -47,10 +49,14 @@ class LocationSerializer(serializers.ModelSerializer):
     def validate_coverage_radius(self, value):
         if value <= 0:
             raise serializers.ValidationError("Coverage radius must be greater than 0.")
+        if value > Location.MAX_COVERAGE_RADIUS:
+            raise serializers.ValidationError(
+                f"Coverage radius cannot exceed {Location.MAX_COVERAGE_RADIUS} km."
+            )
         return value
 
 
-class AddonSerializer(serializers.ModelSerializer):
+class AddonSerializer(IdentityRepresentationMixin, serializers.ModelSerializer):
     class Meta:
         model = Addon
         fields = ["id", "name", "price", "description", "is_available"]
@@ -97,6 +103,17 @@ class ProductSerializer(serializers.ModelSerializer):
         return instance
 
 
+class MenuProductSerializer(serializers.ModelSerializer):
+    """Product row for the menu snapshot: addons by id, their details are listed once."""
+
+    discounted_price = serializers.ReadOnlyField()
+    addon_ids = serializers.PrimaryKeyRelatedField(source="addons", many=True, read_only=True)
+
+    class Meta:
+        model = Product
+        exclude = ("addons",)
+
+
 class CustomerSerializer(serializers.ModelSerializer):
     class Meta:
         model = Customer
@@ -155,6 +172,112 @@ class OrderSerializer(serializers.ModelSerializer):
         return value
 
 
+class OrderListSerializer(serializers.ModelSerializer):
+    """
+    Compact order shape for list endpoints.
+
+    Nested data is opt-in through ``?expand=rider,location,items,tracking`` and
+    the top-level keys can be narrowed with ``?fields=``. Call
+    ``OrderListSerializer.options(request)`` to parse both and
+    ``OrderListSerializer.setup_queryset(queryset, expand)`` to add exactly the
+    joins/prefetches the expansions need.
+    """
+
+    EXPANSIONS = {
+        "rider": {"select_related": ("rider",)},
+        "location": {"select_related": ("selected_location",)},
+        "items": {
+            "prefetch_related": (
+                Prefetch(
+                    "items",
+                    queryset=OrderItem.objects.select_related("product").prefetch_related("addons"),
+                ),
+            )
+        },
+        "tracking": {"prefetch_related": ("tracking",)},
+    }
+
+    class Meta:
+        model = Order
+        fields = [
+            "id",
+            "customer_name",
+            "customer_phone",
+            "status",
+            "delivery_type",
+            "payment_method",
+            "selected_location",
+            "rider",
+            "subtotal",
+            "delivery_fee",
+            "tax",
+            "total",
+            "estimated_time",
+            "created_at",
+            "updated_at",
+        ]
+        read_only_fields = fields
+
+    def __init__(self, *args, expand=(), fields=None, **kwargs):
+        self.expand = set(expand)
+        self.sparse_fields = set(fields) if fields else None
+        super().__init__(*args, **kwargs)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if "rider" in self.expand:
+            fields["rider"] = RiderSerializer(read_only=True)
+        if "location" in self.expand:
+            fields["location_name"] = serializers.CharField(
+                source="selected_location.name", read_only=True
+            )
+        if "items" in self.expand:
+            fields["items"] = OrderItemSerializer(many=True, read_only=True)
+        if "tracking" in self.expand:
+            fields["tracking"] = OrderTrackingSerializer(many=True, read_only=True)
+        if self.sparse_fields is not None:
+            fields = {name: field for name, field in fields.items() if name in self.sparse_fields}
+        return fields
+
+    @classmethod
+    def available_fields(cls, expand):
+        extra = {"location": "location_name"}
+        return set(cls.Meta.fields) | {extra.get(name, name) for name in expand}
+
+    @classmethod
+    def options(cls, request):
+        """Parse and validate ``?expand=`` and ``?fields=`` into (expand, fields)."""
+        expand = [
+            name for name in request.query_params.get("expand", "").split(",") if name
+        ]
+        unknown = set(expand) - set(cls.EXPANSIONS)
+        if unknown:
+            raise serializers.ValidationError(
+                {"expand": f"Unknown expansions {sorted(unknown)}. Allowed: {sorted(cls.EXPANSIONS)}"}
+            )
+
+        fields = [
+            name for name in request.query_params.get("fields", "").split(",") if name
+        ] or None
+        if fields:
+            unknown = set(fields) - cls.available_fields(expand)
+            if unknown:
+                raise serializers.ValidationError(
+                    {"fields": f"Unknown fields {sorted(unknown)}. Allowed: {sorted(cls.available_fields(expand))}"}
+                )
+        return expand, fields
+
+    @classmethod
+    def setup_queryset(cls, queryset, expand):
+        for name in expand:
+            expansion = cls.EXPANSIONS[name]
+            if expansion.get("select_related"):
+                queryset = queryset.select_related(*expansion["select_related"])
+            if expansion.get("prefetch_related"):
+                queryset = queryset.prefetch_related(*expansion["prefetch_related"])
+        return queryset
+
+
 class OrderCreateSerializer(serializers.ModelSerializer):
     items_data = serializers.ListField(write_only=True)
     sooicy_user = serializers.IntegerField(
@@ -0,0 +1,337 @@
+import re
+from datetime import date
+from decimal import Decimal
+
+from django.db import router, transaction
+from django.db.models import Case, Count, F, Q, Value, When
+from django.db.models.functions import Lower
+from django.db.models.signals import post_save
+from django.utils import timezone
+
+from . import identity
+from .analytics import day_bounds
+from .models import Addon, Order, OrderItem, OrderTracking, Product, Rider, normalize_phone
+from .tasks import enqueue_on_commit, refresh_user_stats
+
+TAX_RATE = Decimal('0.08')
+
+PHONE_LIKE_RE = re.compile(r'^[\d\s()+\-]+$')
+MAX_ID_DIGITS = 18
+
+
+def _parse_line(item_data):
+    """Return (product_id, quantity, addon_ids, special_instructions) for one cart line."""
+    product_id = item_data.get('product_id')
+    if not product_id:
+        return None
+
+    addon_ids = []
+    for addon_data in item_data.get('selectedAddons', []) or []:
+        addon_id = addon_data.get('id')
+        if addon_id and int(addon_id) not in addon_ids:
+            addon_ids.append(int(addon_id))
+
+    return (
+        int(product_id),
+        int(item_data.get('quantity', 1)),
+        addon_ids,
+        item_data.get('special_instructions', ''),
+    )
+
+
+def estimate_delivery_time(order):
+    if order.delivery_type == 'pickup':
+        return '15-20 minutes'
+    base_time = 25
+    location_adjustment = getattr(order.selected_location, 'delivery_time_minutes', 10) if order.selected_location else 10
+    total_time = base_time + location_adjustment
+    return f'{total_time}-{total_time + 10} minutes'
+
+
+def create_order(order_data, items_data, sooicy_user=None):
+    """
+    Create an order with all its items in a single transaction.
+
+    Products and addons for the whole cart are loaded with one in_bulk() each
+    (through the request's identity map, see back.identity),
+    line totals are computed in memory and the items plus their addon rows are
+    inserted with bulk_create, so the query count does not grow with cart size.
+    Lines whose product does not exist are skipped, as before. The customer's
+    order stats are refreshed by a background task after commit.
+    """
+    lines = [line for line in map(_parse_line, items_data) if line]
+
+    products = identity.in_bulk(Product, {line[0] for line in lines})
+    addons = identity.in_bulk(Addon, {addon_id for line in lines for addon_id in line[2]})
+
+    order_items = []
+    item_addons = []
+    subtotal = Decimal('0.00')
+    for product_id, quantity, addon_ids, special_instructions in lines:
+        product = products.get(product_id)
+        if product is None:
+            continue
+
+        line_addons = [addons[addon_id] for addon_id in addon_ids if addon_id in addons]
+        order_item = OrderItem(
+            product=product,
+            quantity=quantity,
+            unit_price=Decimal(str(product.price)),
+            special_instructions=special_instructions,
+            addons_price=sum((addon.price for addon in line_addons), Decimal('0.00')),
+        )
+        # bulk_create() bypasses OrderItem.save(), so price the line here.
+        order_item.total_price = order_item.calculate_total_price()
+        subtotal += order_item.total_price
+
+        order_items.append(order_item)
+        item_addons.append(line_addons)
+
+    order = Order(sooicy_user=sooicy_user, **order_data)
+    order.subtotal = subtotal
+    order.tax = subtotal * TAX_RATE
+    if order.delivery_type == 'delivery' and order.selected_location:
+        order.delivery_fee = order.selected_location.delivery_fee
+    else:
+        order.delivery_fee = Decimal('0.00')
+    order.total = order.subtotal + order.tax + order.delivery_fee
+    order.estimated_time = estimate_delivery_time(order)
+
+    with transaction.atomic():
+        order.save()
+
+        for order_item in order_items:
+            order_item.order = order
+        OrderItem.objects.bulk_create(order_items)
+
+        Through = OrderItem.addons.through
+        Through.objects.bulk_create([
+            Through(orderitem_id=order_item.pk, addon_id=addon.pk)
+            for order_item, line_addons in zip(order_items, item_addons)
+            for addon in line_addons
+        ])
+
+        if sooicy_user is not None:
+            enqueue_on_commit(refresh_user_stats, sooicy_user.pk)
+
+        OrderTracking.objects.create(
+            order=order,
+            status='pending',
+            notes=f"Order #{order.id} created successfully",
+            updated_by='System'
+        )
+
+    return order
+
+
+def _prefix_range(prefix):
+    """Bounds [prefix, upper) so a prefix match is a plain index range scan."""
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def search_orders(queryset, search):
+    """
+    Filter orders by an ops search box without full scans.
+
+    '#123' or a bare number is an exact id lookup; anything phone-shaped is a
+    prefix match on customer_phone_normalized; everything else is a prefix
+    match on lower(customer_name). Each branch is served by its own index.
+    """
+    search = search.strip()
+    if not search:
+        return queryset
+
+    if search.startswith('#') and search[1:].isdigit() and len(search) <= MAX_ID_DIGITS + 1:
+        return queryset.filter(pk=int(search[1:]))
+
+    if PHONE_LIKE_RE.match(search):
+        condition = Q()
+        if search.isdigit() and len(search) <= MAX_ID_DIGITS:
+            condition |= Q(pk=int(search))
+        phone = normalize_phone(search)
+        if phone:
+            low, high = _prefix_range(phone)
+            condition |= Q(customer_phone_normalized__gte=low, customer_phone_normalized__lt=high)
+        return queryset.filter(condition) if condition else queryset.none()
+
+    low, high = _prefix_range(search.lower())
+    return queryset.alias(customer_name_lower=Lower('customer_name')).filter(
+        customer_name_lower__gte=low, customer_name_lower__lt=high
+    )
+
+
+def filter_created_between(queryset, date_from=None, date_to=None):
+    """
+    Restrict to orders created on date_from..date_to (inclusive, local days).
+
+    Uses a half-open created_at range instead of created_at__date so the
+    (-created_at, -id) indexes apply. Raises ValueError on malformed dates.
+    """
+    if date_from:
+        start, _ = day_bounds(date.fromisoformat(date_from), date.fromisoformat(date_from))
+        queryset = queryset.filter(created_at__gte=start)
+    if date_to:
+        _, end = day_bounds(date.fromisoformat(date_to), date.fromisoformat(date_to))
+        queryset = queryset.filter(created_at__lt=end)
+    return queryset
+
+
+class AssignmentError(Exception):
+    pass
+
+
+def claim_rider_capacity(rider_id):
+    """
+    Book one order slot on a rider in a single conditional UPDATE.
+
+    Succeeds only while the rider is active, available and under the cap, so
+    concurrent dispatchers can never push current_orders past it. The rider
+    flips to busy in the same statement when the last slot is taken.
+    """
+    return bool(Rider.objects.filter(
+        pk=rider_id,
+        is_active=True,
+        status='available',
+        current_orders__lt=Rider.MAX_CONCURRENT_ORDERS,
+    ).update(
+        current_orders=F('current_orders') + 1,
+        status=Case(
+            When(current_orders__gte=Rider.MAX_CONCURRENT_ORDERS - 1, then=Value('busy')),
+            default=F('status'),
+        ),
+        updated_at=timezone.now(),
+    ))
+
+
+def release_rider_capacity(rider_id, delivered=False):
+    """Give back one order slot; a busy rider becomes available again."""
+    Rider.objects.filter(pk=rider_id, current_orders__gt=0).update(
+        current_orders=F('current_orders') - 1,
+        status=Case(When(status='busy', then=Value('available')), default=F('status')),
+        updated_at=timezone.now(),
+    )
+    if delivered:
+        Rider.objects.filter(pk=rider_id).update(total_deliveries=F('total_deliveries') + 1)
+
+
+def _save_if(order, condition, **changes):
+    """
+    Write `changes` to the order's row only if it still matches `condition`; False if it no longer does.
+
+    One conditional UPDATE instead of a locked read followed by a write. On
+    SQLite a transaction that reads first cannot wait for the write lock and
+    fails with "database is locked"; on PostgreSQL the UPDATE re-checks the
+    condition against the latest committed row. On success `order` carries
+    the written values and Order's post_save receivers run as for save().
+    """
+    changes['updated_at'] = timezone.now()
+    if not Order.objects.filter(condition, pk=order.pk).update(**changes):
+        return False
+    expressions = [name for name, value in changes.items() if hasattr(value, 'resolve_expression')]
+    for name, value in changes.items():
+        if name not in expressions:
+            setattr(order, name, value)
+    if expressions:
+        order.refresh_from_db(fields=expressions)
+    post_save.send(
+        sender=Order, instance=order, created=False, update_fields=frozenset(changes), raw=False,
+        using=order._state.db or router.db_for_write(Order, instance=order),
+    )
+    return True
+
+
+def assign_rider(order, rider, updated_by='System'):
+    """
+    Attach `rider` to `order`, move a pending order to preparing and book the rider's load.
+
+    Raises AssignmentError if the rider has no free slot, or if the order was
+    closed or given to someone else since it was loaded.
+    """
+    if order.rider_id == rider.id:
+        raise AssignmentError(f"Order #{order.id} is already assigned to {rider.name}")
+    previous_rider_id = order.rider_id
+
+    with transaction.atomic():
+        if not claim_rider_capacity(rider.id):
+            raise AssignmentError(f"Rider {rider.name} is not available")
+        # The status comes from the row as it is now, not from the caller's copy.
+        assigned = _save_if(
+            order,
+            Q(rider=previous_rider_id) & ~Q(status__in=Order.TERMINAL_STATUSES),
+            rider=rider,
+            status=Case(When(status='pending', then=Value('preparing')), default=F('status')),
+        )
+        if not assigned:
+            # Rolls back the claim above.
+            raise AssignmentError(f"Order #{order.id} changed while being assigned")
+        if previous_rider_id:
+            release_rider_capacity(previous_rider_id)
+
+        OrderTracking.objects.create(
+            order=order,
+            status='assigned',
+            notes=f"Order assigned to rider {rider.name}",
+            updated_by=updated_by
+        )
+
+    rider.refresh_from_db(fields=['current_orders', 'status', 'updated_at'])
+    return order
+
+
+def update_order_status(order, new_status, updated_by='System'):
+    """Change an order's status, log it, and free the rider's slot when the order closes."""
+    orders = Order.objects.filter(pk=order.pk)
+    while True:
+        # Read outside the transaction and write only if nothing changed since,
+        # so of two concurrent closers exactly one frees the rider's slot.
+        old_status, rider_id = orders.values_list('status', 'rider').get()
+        # The sales rollup signal compares against this.
+        order._saved_status = old_status
+        with transaction.atomic():
+            if not _save_if(order, Q(status=old_status, rider=rider_id), status=new_status):
+                continue
+            order.rider_id = rider_id
+
+            closing = old_status not in Order.TERMINAL_STATUSES and new_status in Order.TERMINAL_STATUSES
+            if closing and rider_id:
+                release_rider_capacity(rider_id, delivered=new_status == 'delivered')
+
+            OrderTracking.objects.create(
+                order=order,
+                status=new_status,
+                notes=f"Status changed from {old_status} to {new_status}",
+                updated_by=updated_by
+            )
+        return order
+
+
+def reconcile_rider_load():
+    """
+    Recompute every rider's current_orders from their open orders.
+
+    Repairs drift from manual edits or crashed requests: riders at the cap are
+    marked busy and busy riders below it become available again. Returns the
+    number of riders changed.
+    """
+    open_orders = dict(
+        Order.objects.filter(rider__isnull=False)
+        .exclude(status__in=Order.TERMINAL_STATUSES)
+        .values_list('rider')
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+
+    changed = []
+    for rider in Rider.objects.only('id', 'current_orders', 'status'):
+        load = open_orders.get(rider.id, 0)
+        new_status = rider.status
+        if load >= Rider.MAX_CONCURRENT_ORDERS and new_status == 'available':
+            new_status = 'busy'
+        elif load < Rider.MAX_CONCURRENT_ORDERS and new_status == 'busy':
+            new_status = 'available'
+        if (load, new_status) != (rider.current_orders, rider.status):
+            rider.current_orders, rider.status = load, new_status
+            changed.append(rider)
+
+    Rider.objects.bulk_update(changed, ['current_orders', 'status'], batch_size=500)
+    return len(changed)
@@ -0,0 +1,90 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+
+from .analytics import DELIVERED, apply_order_to_rollup, fold_location_rollups, invalidate_dashboard_stats
+from . import search, sqlite
+from .catalog import CATALOG_NAMES, bump_catalog_version
+from .models import Addon, Location, Order, OrderTracking, Product, Rider
+from .tracking import publish_tracking
+
+
+@receiver(post_init, sender=Order)
+def remember_order_status(sender, instance, **kwargs):
+    instance._saved_status = instance.status
+
+
+@receiver(post_save, sender=Order)
+def update_sales_rollup(sender, instance, created, **kwargs):
+    previous = None if created else instance._saved_status
+    instance._saved_status = instance.status
+
+    if previous != DELIVERED and instance.status == DELIVERED:
+        apply_order_to_rollup(instance, 1)
+    elif previous == DELIVERED and instance.status != DELIVERED:
+        apply_order_to_rollup(instance, -1)
+
+
+@receiver(post_delete, sender=Order)
+def remove_from_sales_rollup(sender, instance, **kwargs):
+    if instance._saved_status == DELIVERED:
+        apply_order_to_rollup(instance, -1)
+
+
+@receiver(pre_delete, sender=Location)
+def keep_location_sales(sender, instance, **kwargs):
+    fold_location_rollups(instance.pk)
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+@receiver(post_save, sender=Rider)
+@receiver(post_delete, sender=Rider)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Location)
+@receiver(post_delete, sender=Location)
+def drop_dashboard_stats(sender, **kwargs):
+    invalidate_dashboard_stats()
+    # Drop it again once committed, in case a reader cached pre-commit data meanwhile.
+    transaction.on_commit(invalidate_dashboard_stats)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Addon)
+@receiver(post_delete, sender=Addon)
+@receiver(post_save, sender=Location)
+@receiver(post_delete, sender=Location)
+def bump_catalog(sender, **kwargs):
+    bump_catalog_version(CATALOG_NAMES[sender])
+
+
+@receiver(m2m_changed, sender=Product.addons.through)
+def bump_product_addons(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_catalog_version(CATALOG_NAMES[Product])
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, **kwargs):
+    search.index_products([instance])
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    search.remove_products([instance.pk])
+
+
+@receiver(post_save, sender=OrderTracking)
+def push_tracking(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(partial(publish_tracking, instance))
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    sqlite.apply_pragmas(connection)
@@ -0,0 +1,161 @@
+"""
+Request coalescing for expensive read endpoints.
+
+When identical requests arrive together (the dashboard opening on several
+tablets at once), only the first one computes; the others wait for it and
+share its result. Requests are identical when they hit the same view with
+the same query parameters, in any order.
+
+Within a worker, waiting threads block on the leader's event. With
+SINGLEFLIGHT_LEASE set (seconds) and Redis configured, the leader also
+takes a short lease in the shared cache so leaders in other workers wait
+for its result instead of running the same queries; a worker that cannot
+get the result before the lease runs out computes it itself.
+
+Nothing is cached beyond the flight: a request that starts after the
+leader finished computes afresh.
+"""
+import logging
+import pickle
+import threading
+import time
+import uuid
+from urllib.parse import urlencode
+
+import redis
+from django.conf import settings
+
+from .caching import get_cache
+
+logger = logging.getLogger(__name__)
+
+LEASE_POLL_INTERVAL = 0.05
+
+
+class _Call:
+    __slots__ = ('done', 'value', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    do(key, fn) runs fn() once per key at a time; concurrent callers get its result.
+
+    `client` (a redis client) and `lease` (seconds) enable coalescing across
+    processes; without them only threads of this process are coalesced.
+    """
+
+    def __init__(self, client=None, lease=0, prefix='sooicy:flight:'):
+        self.client = client
+        self.lease = lease
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._counters = dict.fromkeys(('leaders', 'followers', 'shared_hits', 'shared_fallbacks'), 0)
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self._counters['leaders'] += 1
+            else:
+                self._counters['followers'] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = self._shared(key, fn) if self.client is not None and self.lease else fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.value
+
+    def _shared(self, key, fn):
+        lease_key, result_key = f'{self.prefix}lease:{key}', f'{self.prefix}result:{key}'
+        lease_ms = int(self.lease * 1000)
+        token = uuid.uuid4().hex
+        try:
+            acquired = self.client.set(lease_key, token, nx=True, px=lease_ms)
+            if acquired:
+                # A result left by an earlier flight must not be handed to this one's followers.
+                self.client.delete(result_key)
+        except redis.RedisError:
+            logger.warning('Single-flight lease unavailable for %s', key, exc_info=True)
+            return fn()
+
+        if acquired:
+            try:
+                value = fn()
+                try:
+                    self.client.set(result_key, pickle.dumps(value), px=lease_ms)
+                except redis.RedisError:
+                    logger.warning('Single-flight result not shared for %s', key, exc_info=True)
+                return value
+            finally:
+                try:
+                    if self.client.get(lease_key) == token.encode():
+                        self.client.delete(lease_key)
+                except redis.RedisError:
+                    pass
+
+        deadline = time.monotonic() + self.lease
+        try:
+            while time.monotonic() < deadline:
+                raw = self.client.get(result_key)
+                if raw is not None:
+                    self._count('shared_hits')
+                    return pickle.loads(raw)
+                if not self.client.exists(lease_key):
+                    break
+                time.sleep(LEASE_POLL_INTERVAL)
+        except redis.RedisError:
+            logger.warning('Single-flight result unavailable for %s', key, exc_info=True)
+        self._count('shared_fallbacks')
+        return fn()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, in_flight=len(self._calls))
+
+
+def request_key(name, request):
+    """`name` plus the request's query parameters, sorted so their order does not matter."""
+    params = sorted((key, sorted(values)) for key, values in request.GET.lists())
+    return f"{name}?{urlencode([(key, value) for key, values in params for value in values])}"
+
+
+_flight = None
+_flight_lock = threading.Lock()
+
+
+def get_flight():
+    global _flight
+    if _flight is None:
+        with _flight_lock:
+            if _flight is None:
+                cache = get_cache()
+                _flight = SingleFlight(client=cache.client, lease=settings.SINGLEFLIGHT_LEASE)
+    return _flight
+
+
+def coalesce(name, request, build):
+    """build(), shared with concurrent identical requests to the view called `name`."""
+    return get_flight().do(request_key(name, request), build)
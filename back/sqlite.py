@@ -0,0 +1,29 @@
+"""
+Connection pragmas for the SQLite concurrent-writers mode (back.backends.sqlite3).
+
+WAL lets readers run alongside the single writer, synchronous=NORMAL is
+durable across application crashes in WAL mode (only a power loss can drop
+the last commits), busy_timeout makes writers queue for the lock instead of
+failing, and mmap/cache keep hot pages out of read() calls.
+"""
+
+BUSY_TIMEOUT_MS = 5000
+
+PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('busy_timeout', BUSY_TIMEOUT_MS),
+    ('mmap_size', 256 * 1024 * 1024),
+    # Negative means KiB: 64 MiB of page cache per connection.
+    ('cache_size', -64 * 1024),
+    ('temp_store', 'MEMORY'),
+)
+
+
+def apply_pragmas(connection):
+    """Configure a new connection when its backend runs in concurrent mode."""
+    if connection.vendor != 'sqlite' or not getattr(connection, 'concurrent_writes', False):
+        return
+    with connection.cursor() as cursor:
+        for name, value in PRAGMAS:
+            cursor.execute(f'PRAGMA {name} = {value}')
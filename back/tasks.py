@@ -0,0 +1,55 @@
+"""
+Background work that does not have to finish before an API response.
+
+Every task can run more than once (late acks, retries) and must end in the
+same state, so they recompute from the source rows instead of incrementing.
+With CELERY_TASK_ALWAYS_EAGER (no CELERY_BROKER_URL set) they run inline.
+"""
+import logging
+from functools import partial
+
+from celery import shared_task
+from django.db import DatabaseError, transaction
+from django.db.models import Count, Max, Sum
+from django.utils import timezone
+
+from .models import Order, SooicyUser
+
+logger = logging.getLogger(__name__)
+
+RETRY_OPTIONS = {
+    'autoretry_for': (DatabaseError,),
+    'retry_backoff': True,
+    'retry_backoff_max': 60,
+    'max_retries': 5,
+}
+
+
+@shared_task(**RETRY_OPTIONS)
+def refresh_user_stats(user_id):
+    """Recompute a customer's order count, spend and last order date from their orders."""
+    stats = Order.objects.filter(sooicy_user_id=user_id).aggregate(
+        total_orders=Count('id'),
+        total_spent=Sum('total'),
+        last_order_date=Max('created_at'),
+    )
+    SooicyUser.objects.filter(pk=user_id).update(
+        total_orders=stats['total_orders'],
+        total_spent=stats['total_spent'] or 0,
+        last_order_date=stats['last_order_date'],
+        updated_at=timezone.now(),
+    )
+
+
+def enqueue(task, *args):
+    """Queue `task`; if the broker is unreachable, run it here rather than lose it."""
+    try:
+        task.delay(*args)
+    except Exception:
+        logger.exception('Could not queue %s, running it inline', task.name)
+        task.apply(args=args)
+
+
+def enqueue_on_commit(task, *args):
+    """Queue `task` once the current transaction commits, so workers see its rows."""
+    transaction.on_commit(partial(enqueue, task, *args))
@@ -1,3 +1,1608 @@
-from django.test import TestCase
+import asyncio
+import csv
+import gzip
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from psycopg2 import extensions
+from rest_framework.test import APIClient
+
+from . import identity, menu, pubsub, search
+from .backends.sqlite3.base import DatabaseWrapper as ConcurrentSQLiteWrapper
+from .caching import LocalCache, TieredCache, get_cache
+from .response_cache import FRESH, MISS, STALE, ResponseCache
+from .singleflight import SingleFlight, request_key
+from .dbpool import ConnectionPool, PoolTimeout
+from .routers import REPLICA_DB_ALIAS, ReplicaRouter, use_replica
+from .models import Addon, DailySalesRollup, Location, Order, OrderItem, Product, Rider, SooicyUser
+from .services import update_order_status
+from .tasks import enqueue, refresh_user_stats
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+
+def make_product(name='Classic Swirl', price='500.00', category='swirls', **kwargs):
+    return Product.objects.create(
+        name=name, description=name, price=Decimal(price), category=category, **kwargs
+    )
+
+
+def make_location(name='Clifton', **kwargs):
+    kwargs.setdefault('delivery_fee', Decimal('150.00'))
+    kwargs.setdefault('delivery_time', '15-25 min')
+    return Location.objects.create(name=name, area='Block 5', address='Main road', **kwargs)
+
+
+def make_order(total='1000.00', status='pending', location=None, items=(), **kwargs):
+    """Create an order the way the app does: pending first, then moved to `status`."""
+    kwargs.setdefault('customer_name', 'Ayesha')
+    kwargs.setdefault('customer_phone', '03001234567')
+    order = Order.objects.create(
+        delivery_address='House 1', payment_method='cash', subtotal=Decimal(total), total=Decimal(total),
+        selected_location=location, **kwargs
+    )
+    for product, quantity in items:
+        OrderItem.objects.create(order=order, product=product, quantity=quantity, unit_price=product.price)
+    if status != order.status:
+        order.status = status
+        order.save()
+    return order
+
+
+def order_payload(items_data, **overrides):
+    payload = {
+        'customer_name': 'Ayesha',
+        'customer_phone': '+92 300 1234567',
+        'delivery_address': 'House 1, Street 2',
+        'payment_method': 'cash',
+        'delivery_type': 'delivery',
+        'subtotal': '1',
+        'delivery_fee': '0',
+        'tax': '0',
+        'total': '1',
+        'items_data': items_data,
+    }
+    payload.update(overrides)
+    return payload
+
+
+class OrderCreateViewTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.location = make_location()
+        self.user = SooicyUser.objects.create(name='Ayesha', email='a@example.com', phone='03001234567')
+        self.products = [make_product(name=f'Product {i}', price=f'{100 * (i + 1)}.00') for i in range(6)]
+        self.sprinkles = Addon.objects.create(name='Sprinkles', price=Decimal('50.00'))
+        self.fudge = Addon.objects.create(name='Fudge', price=Decimal('75.00'))
+
+    def cart(self, size):
+        return [
+            {
+                'product_id': product.id,
+                'quantity': 2,
+                'selectedAddons': [{'id': self.sprinkles.id}, {'id': self.fudge.id}],
+            }
+            for product in self.products[:size]
+        ]
+
+    def post(self, items_data, **overrides):
+        payload = order_payload(
+            items_data, selected_location=self.location.id, sooicy_user=self.user.id, **overrides
+        )
+        return self.client.post(reverse('order-create'), payload, format='json')
+
+    def test_totals_are_computed_from_items_and_addons(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.post(self.cart(2))
+        self.assertEqual(response.status_code, 201)
+
+        order = Order.objects.get(pk=response.data['id'])
+        # (100 + 125) * 2 + (200 + 125) * 2
+        self.assertEqual(order.subtotal, Decimal('1100.00'))
+        self.assertEqual(order.tax, Decimal('88.00'))
+        self.assertEqual(order.delivery_fee, Decimal('150.00'))
+        self.assertEqual(order.total, Decimal('1338.00'))
+        self.assertEqual(order.estimated_time, '35-45 minutes')
+        self.assertEqual(order.tracking.count(), 1)
+
+        item = order.items.get(product=self.products[0])
+        self.assertEqual(item.addons_price, Decimal('125.00'))
+        self.assertEqual(item.total_price, Decimal('450.00'))
+        self.assertEqual(set(item.addons.values_list('id', flat=True)), {self.sprinkles.id, self.fudge.id})
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.total_orders, 1)
+        self.assertEqual(self.user.total_spent, Decimal('1338.00'))
+        self.assertIsNotNone(self.user.last_order_date)
+
+    def test_unknown_products_are_skipped(self):
+        response = self.post(self.cart(1) + [{'product_id': 999999, 'quantity': 1}])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(OrderItem.objects.filter(order_id=response.data['id']).count(), 1)
+
+    def test_invalid_line_rolls_back_everything(self):
+        with self.assertLogs('back.views', 'ERROR'):
+            response = self.post(self.cart(1) + [{'product_id': self.products[1].id, 'quantity': 'two'}])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderItem.objects.exists())
+
+    def test_response_reuses_the_products_loaded_for_pricing(self):
+        response = self.post(self.cart(3))
+        self.assertEqual(response.status_code, 201)
+        self.assertIn('queries-saved=1', response['X-Identity-Map'])
+        self.assertEqual([item['product_name'] for item in response.data['items']], ['Product 0', 'Product 1', 'Product 2'])
+
+    def test_query_count_does_not_grow_with_cart_size(self):
+        counts = []
+        for size in (1, 6):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.post(self.cart(size))
+            self.assertEqual(response.status_code, 201)
+            counts.append(len(ctx.captured_queries))
+        self.assertEqual(counts[0], counts[1])
+
+
+class TaskTests(TestCase):
+    def setUp(self):
+        self.user = SooicyUser.objects.create(name='Ayesha', email='a@example.com', phone='03001234567')
+
+    def test_stats_are_queued_after_commit(self):
+        with mock.patch.object(refresh_user_stats, 'delay') as delay:
+            with self.captureOnCommitCallbacks() as callbacks:
+                response = self.client.post(
+                    reverse('order-create'),
+                    order_payload([{'product_id': make_product().id}], sooicy_user=self.user.id),
+                    content_type='application/json',
+                )
+            self.assertEqual(response.status_code, 201)
+            delay.assert_not_called()
+            for callback in callbacks:
+                callback()
+        delay.assert_called_once_with(self.user.id)
+
+    def test_refresh_user_stats_is_idempotent(self):
+        make_order(total='300.00', sooicy_user=self.user)
+        latest = make_order(total='200.00', sooicy_user=self.user)
+        make_order(total='999.00')
+        for _ in range(2):
+            refresh_user_stats.delay(self.user.id)
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.total_orders, self.user.total_spent), (2, Decimal('500.00')))
+        self.assertEqual(self.user.last_order_date, latest.created_at)
+
+    def test_runs_inline_when_broker_is_down(self):
+        make_order(total='300.00', sooicy_user=self.user)
+        with mock.patch.object(refresh_user_stats, 'delay', side_effect=ConnectionError):
+            with self.assertLogs('back.tasks', 'ERROR'):
+                enqueue(refresh_user_stats, self.user.id)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.total_orders, 1)
+
+
+class DailySalesRollupTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+        self.location = make_location()
+        self.product = make_product()
+
+    def rollup(self):
+        return DailySalesRollup.objects.get(date=timezone.localdate(), location=self.location)
+
+    def test_rollup_follows_delivered_transitions(self):
+        order = make_order(total='1000.00', location=self.location, items=[(self.product, 3)])
+        self.assertFalse(DailySalesRollup.objects.exists())
+
+        order.status = 'delivered'
+        order.save()
+        rollup = self.rollup()
+        self.assertEqual((rollup.order_count, rollup.revenue, rollup.items_sold), (1, Decimal('1000.00'), 3))
+
+        # Saving again without a status change must not double count.
+        order.save()
+        self.assertEqual(self.rollup().order_count, 1)
+
+        order.status = 'cancelled'
+        order.save()
+        rollup = self.rollup()
+        self.assertEqual((rollup.order_count, rollup.revenue, rollup.items_sold), (0, Decimal('0.00'), 0))
+
+    def test_deleting_delivered_order_removes_it(self):
+        order = make_order(total='400.00', location=self.location, status='delivered')
+        self.assertEqual(self.rollup().order_count, 1)
+        order.delete()
+        self.assertEqual(self.rollup().order_count, 0)
+
+    def test_deleting_a_location_keeps_its_sales(self):
+        make_order(total='250.00', location=self.location, status='delivered', items=[(self.product, 2)])
+        make_order(total='300.00', status='delivered')
+        self.location.delete()
+
+        rollup = DailySalesRollup.objects.get()
+        self.assertEqual(
+            (rollup.location_id, rollup.order_count, rollup.revenue, rollup.items_sold),
+            (None, 2, Decimal('550.00'), 2),
+        )
+
+    def test_backfill_matches_incremental_rollup(self):
+        make_order(total='250.00', location=self.location, status='delivered', items=[(self.product, 2)])
+        make_order(total='300.00', status='delivered')
+        make_order(total='999.00', location=self.location, status='pending')
+        expected = sorted(DailySalesRollup.objects.values_list('location', 'order_count', 'revenue', 'items_sold'), key=str)
+
+        DailySalesRollup.objects.all().delete()
+        call_command('backfill_sales_rollup', '--chunk-days', '1', stdout=StringIO())
+        actual = sorted(DailySalesRollup.objects.values_list('location', 'order_count', 'revenue', 'items_sold'), key=str)
+        self.assertEqual(actual, expected)
+
+    def test_analytics_daily_sales_read_from_rollup(self):
+        make_order(total='250.00', location=self.location, status='delivered')
+        with CaptureQueriesContext(connection) as short_range:
+            response = self.client.get(reverse('sales-analytics'), {'days': 7})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['daily_sales']), 8)
+        self.assertEqual(response.data['daily_sales'][-1], {
+            'date': timezone.localdate().strftime('%Y-%m-%d'), 'revenue': 250.0, 'orders': 1,
+        })
+
+        with CaptureQueriesContext(connection) as long_range:
+            response = self.client.get(reverse('sales-analytics'), {'days': 365})
+        self.assertEqual(len(long_range.captured_queries), len(short_range.captured_queries))
+
+    def test_analytics_days_is_bounded(self):
+        response = self.client.get(reverse('sales-analytics'), {'days': 10000})
+        self.assertEqual(response.status_code, 400)
+
+
+class SalesAnalyticsBreakdownTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+        self.clifton = make_location('Clifton')
+        self.dha = make_location('DHA')
+        self.swirl = make_product('Swirl', '200.00', 'swirls')
+        self.waffle = make_product('Waffle', '300.00', 'waffles')
+        self.shake = make_product('Shake', '250.00', 'rizzler-shake')
+
+    def test_top_products_and_categories(self):
+        make_order(location=self.clifton, status='delivered', items=[(self.swirl, 2), (self.waffle, 1)])
+        make_order(location=self.dha, status='delivered', items=[(self.swirl, 1)])
+        make_order(location=self.dha, status='cancelled', items=[(self.shake, 5)])
+
+        response = self.client.get(reverse('sales-analytics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['top_products'], [
+            {'id': self.swirl.id, 'name': 'Swirl', 'orders': 2, 'quantity': 3, 'revenue': 600.0},
+            {'id': self.waffle.id, 'name': 'Waffle', 'orders': 1, 'quantity': 1, 'revenue': 300.0},
+        ])
+        self.assertEqual(response.data['category_performance']['Swirls'], 600.0)
+        self.assertEqual(response.data['category_performance']['Rizzler-Shake'], 0.0)
+        self.assertEqual(len(response.data['category_breakdown']), len(Product.CATEGORY_CHOICES))
+
+        response = self.client.get(reverse('sales-analytics'), {'location': self.dha.id, 'limit': 1})
+        self.assertEqual(response.data['top_products'], [
+            {'id': self.swirl.id, 'name': 'Swirl', 'orders': 1, 'quantity': 1, 'revenue': 200.0},
+        ])
+
+        tomorrow = (timezone.localdate() + timedelta(days=1)).isoformat()
+        response = self.client.get(reverse('sales-analytics'), {'date_from': tomorrow})
+        self.assertEqual(response.data['top_products'], [])
+
+    def test_query_count_independent_of_limit(self):
+        for product in (self.swirl, self.waffle, self.shake):
+            make_order(location=self.clifton, status='delivered', items=[(product, 1)])
+
+        counts = []
+        for limit in (1, 50):
+            with CaptureQueriesContext(connection) as ctx:
+                self.client.get(reverse('sales-analytics'), {'limit': limit, 'location': self.clifton.id})
+            counts.append(len(ctx.captured_queries))
+        self.assertEqual(counts[0], counts[1])
+        self.assertLessEqual(counts[0], 3)
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.builds = []
+        # Refreshes run inline so the test can see their result.
+        self.inline = mock.Mock(submit=lambda fn, *args: fn(*args))
+
+    def build(self):
+        self.builds.append(1)
+        return {'build': len(self.builds)}
+
+    def test_fresh_entries_are_served_without_building(self):
+        responses = ResponseCache('test', soft_ttl=60, hard_ttl=120, executor=self.inline)
+        self.assertEqual(responses.get('k', self.build)[::2], ({'build': 1}, MISS))
+        self.assertEqual(responses.get('k', self.build)[::2], ({'build': 1}, FRESH))
+        self.assertEqual(len(self.builds), 1)
+
+    def test_stale_entry_is_served_then_refreshed(self):
+        responses = ResponseCache('test', soft_ttl=0, hard_ttl=120, executor=self.inline)
+        responses.get('k', self.build)
+        self.assertEqual(responses.get('k', self.build)[::2], ({'build': 1}, STALE))
+        self.assertEqual(responses.get('k', self.build)[::2], ({'build': 2}, STALE))
+        metrics = responses.stats()['keys']['k']
+        self.assertEqual((metrics[MISS], metrics[STALE], metrics['refreshes']), (1, 2, 2))
+        self.assertEqual(metrics['state'], STALE)
+
+    def test_failed_refresh_keeps_serving_stale(self):
+        responses = ResponseCache('test', soft_ttl=0, hard_ttl=120, executor=self.inline)
+        responses.get('k', self.build)
+        with self.assertLogs('back.response_cache', 'ERROR'):
+            payload, _, state = responses.get('k', mock.Mock(side_effect=RuntimeError('db down')))
+        self.assertEqual((payload, state), ({'build': 1}, STALE))
+        self.assertEqual(responses.stats()['keys']['k']['refresh_errors'], 1)
+
+    def test_analytics_headers_and_freshness(self):
+        first = self.client.get(reverse('sales-analytics'), {'days': 30})
+        self.assertEqual(first['X-Cache'], MISS)
+        self.assertIn('stale-while-revalidate=', first['Cache-Control'])
+        self.assertIn('private', first['Cache-Control'])
+        with self.assertNumQueries(0):
+            second = self.client.get(reverse('sales-analytics'), {'days': 30})
+        self.assertEqual((second['X-Cache'], second.json()), (FRESH, first.json()))
+
+        keys = self.client.get(reverse('sales-analytics-freshness')).json()['keys']
+        key = next(key for key in keys if key.endswith('sales-analytics?days=30'))
+        self.assertEqual((keys[key][MISS], keys[key][FRESH]), (1, 1))
+
+
+class DashboardStatsViewTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+        self.product = make_product()
+
+    def test_counters(self):
+        make_order(total='100.00', status='delivered')
+        make_order(total='50.00', status='pending')
+        make_order(total='70.00', status='cancelled')
+        Rider.objects.create(name='Ali', phone='03000000001')
+        Rider.objects.create(name='Bilal', phone='03000000002', status='busy')
+
+        response = self.client.get(reverse('dashboard-stats'))
+        self.assertEqual(response.status_code, 200)
+        data = response.data
+        self.assertEqual(
+            (data['total_orders'], data['pending_orders'], data['completed_orders'], data['cancelled_orders']),
+            (3, 1, 1, 1),
+        )
+        self.assertEqual((data['orders_today'], data['total_revenue'], data['revenue_today']), (3, '100.00', '100.00'))
+        self.assertEqual((data['total_riders'], data['available_riders']), (2, 1))
+        self.assertEqual((data['total_products'], data['total_locations']), (1, 0))
+
+    def test_polling_is_served_from_cache_until_data_changes(self):
+        with CaptureQueriesContext(connection) as cold:
+            self.client.get(reverse('dashboard-stats'))
+        self.assertEqual(len(cold.captured_queries), 4)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('dashboard-stats'))
+        self.assertEqual(response.data['pending_orders'], 0)
+
+        make_order(status='pending')
+        response = self.client.get(reverse('dashboard-stats'))
+        self.assertEqual(response.data['pending_orders'], 1)
+
+        self.client.patch(
+            reverse('bulk-product-update'), {'product_ids': [self.product.id], 'updates': {'is_available': False}},
+            format='json',
+        )
+        make_location()
+        response = self.client.get(reverse('dashboard-stats'))
+        self.assertEqual(response.data['total_locations'], 1)
+
+
+class OrderKeysetPaginationTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+        self.user = SooicyUser.objects.create(name='Ayesha', email='a@example.com', phone='03001234567')
+        # Several orders share a created_at so the id tie-breaker is exercised.
+        now = timezone.now()
+        self.orders = []
+        for i in range(7):
+            order = make_order(sooicy_user=self.user)
+            Order.objects.filter(pk=order.pk).update(created_at=now - timedelta(minutes=i // 2))
+            self.orders.append(order)
+        self.expected = list(Order.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+
+    def walk(self, url, params):
+        seen, pages = [], []
+        response = self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            pages.append(response.data)
+            seen.extend(order['id'] for order in response.data['results'])
+            if not response.data['next']:
+                return seen, pages
+            response = self.client.get(response.data['next'])
+
+    def test_pages_cover_every_order_once_in_order(self):
+        for url in (reverse('order-list'), reverse('user-orders', args=[self.user.id])):
+            seen, pages = self.walk(url, {'limit': 3})
+            self.assertEqual(seen, self.expected)
+            self.assertEqual(len(pages), 3)
+            self.assertIsNone(pages[0]['previous'])
+
+    def test_previous_link_returns_the_prior_page(self):
+        _, pages = self.walk(reverse('order-list'), {'limit': 3})
+        response = self.client.get(pages[2]['previous'])
+        self.assertEqual(
+            [order['id'] for order in response.data['results']],
+            [order['id'] for order in pages[1]['results']],
+        )
+
+    def test_recent_orders_limit_is_bounded(self):
+        response = self.client.get(reverse('recent-orders'))
+        self.assertEqual(len(response.data['results']), 7)
+        response = self.client.get(reverse('recent-orders'), {'limit': 2})
+        self.assertEqual([order['id'] for order in response.data['results']], self.expected[:2])
+        response = self.client.get(reverse('recent-orders'), {'limit': 100000})
+        self.assertEqual(len(response.data['results']), 7)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('order-list'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+
+class OrderListSerializerTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.location = make_location()
+        self.rider = Rider.objects.create(name='Ali', phone='03000000001')
+        addon = Addon.objects.create(name='Sprinkles', price=Decimal('50.00'))
+        for i in range(4):
+            order = make_order(location=self.location, rider=self.rider, items=[(make_product(f'P{i}'), 1)])
+            order.items.first().addons.add(addon)
+
+    def test_compact_shape_by_default(self):
+        response = self.client.get(reverse('order-list'))
+        order = response.data['results'][0]
+        self.assertEqual(order['rider'], self.rider.id)
+        self.assertNotIn('items', order)
+        self.assertNotIn('tracking', order)
+
+    def test_expand_and_sparse_fields(self):
+        response = self.client.get(reverse('order-list'), {'expand': 'rider,items,location', 'fields': 'id,rider,items,location_name'})
+        order = response.data['results'][0]
+        self.assertEqual(set(order), {'id', 'rider', 'items', 'location_name'})
+        self.assertEqual(order['rider']['name'], 'Ali')
+        self.assertEqual(order['location_name'], 'Clifton')
+        self.assertEqual(order['items'][0]['addons_detail'][0]['name'], 'Sprinkles')
+
+    def test_unknown_expansion_or_field_is_rejected(self):
+        self.assertEqual(self.client.get(reverse('order-list'), {'expand': 'customer'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('order-list'), {'fields': 'items'}).status_code, 400)
+
+    def test_query_count_is_constant_per_page(self):
+        params = {'expand': 'rider,location,items,tracking'}
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(reverse('order-list'), {**params, 'limit': 1})
+        with CaptureQueriesContext(connection) as large:
+            self.client.get(reverse('order-list'), {**params, 'limit': 4})
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+
+        with self.assertNumQueries(1):
+            self.client.get(reverse('order-list'))
+
+
+class CatalogConditionalGetTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.product = make_product()
+        self.addon = Addon.objects.create(name='Sprinkles', price=Decimal('50.00'))
+
+    def test_matching_etag_returns_304_without_serializing(self):
+        response = self.client.get(reverse('product-list'))
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('product-list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_changes_produce_a_new_etag(self):
+        etag = self.client.get(reverse('product-list'))['ETag']
+
+        self.product.addons.add(self.addon)
+        response = self.client.get(reverse('product-list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        self.addon.price = Decimal('60.00')
+        self.addon.save()
+        self.assertEqual(self.client.get(reverse('product-list'), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        etag = self.client.get(reverse('addon-list'))['ETag']
+        self.addon.delete()
+        self.assertEqual(self.client.get(reverse('addon-list'), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        etag = self.client.get(reverse('product-list'))['ETag']
+        self.client.patch(
+            reverse('bulk-product-update'), {'product_ids': [self.product.id], 'updates': {'discount': 10}},
+            format='json',
+        )
+        self.assertEqual(self.client.get(reverse('product-list'), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_query_string_is_part_of_the_etag(self):
+        etag = self.client.get(reverse('location-list'))['ETag']
+        response = self.client.get(reverse('location-list'), {'available': 'true'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_categories_are_conditional_without_queries(self):
+        etag = self.client.get(reverse('category-list'))['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('category-list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+
+class MenuSnapshotTests(TestCase):
+    def setUp(self):
+        menu.clear_menu_snapshot()
+        self.addCleanup(menu.clear_menu_snapshot)
+        self.addon = Addon.objects.create(name='Sprinkles', price=Decimal('50.00'))
+        for name in ('Classic Swirl', 'Mango Swirl'):
+            make_product(name=name, discount=Decimal('10')).addons.add(self.addon)
+        make_product(name='Retired', is_available=False)
+        make_location()
+
+    def test_snapshot_lists_addons_once(self):
+        data = self.client.get(reverse('menu')).json()
+        self.assertEqual([product['name'] for product in data['products']], ['Classic Swirl', 'Mango Swirl'])
+        self.assertEqual(data['products'][0]['addon_ids'], [self.addon.id])
+        self.assertEqual(Decimal(data['products'][0]['discounted_price']), Decimal('450'))
+        self.assertEqual(list(data['addons']), [str(self.addon.id)])
+        self.assertEqual([location['name'] for location in data['locations']], ['Clifton'])
+        self.assertIn({'value': 'swirls', 'label': 'Swirls'}, data['categories'])
+
+    def test_compressed_bodies_match(self):
+        plain = self.client.get(reverse('menu')).content
+        response = self.client.get(reverse('menu'), HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), plain)
+        if menu.brotli:
+            response = self.client.get(reverse('menu'), HTTP_ACCEPT_ENCODING='gzip, br')
+            self.assertEqual(response['Content-Encoding'], 'br')
+            self.assertEqual(menu.brotli.decompress(response.content), plain)
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_negotiation_honours_q_values_and_etags_differ(self):
+        snapshot = menu.get_menu_snapshot()
+        self.assertEqual(snapshot.negotiate('br;q=0, gzip')[0], 'gzip')
+        self.assertEqual(snapshot.negotiate('gzip;q=0, identity')[0], None)
+        self.assertEqual(snapshot.negotiate('*')[0], menu.ENCODINGS[0])
+        self.assertEqual(len({etag for etag in snapshot.etags.values()}), len(snapshot.bodies))
+
+        gzipped = self.client.get(reverse('menu'), HTTP_ACCEPT_ENCODING='gzip')
+        plain = self.client.get(reverse('menu'), HTTP_IF_NONE_MATCH=gzipped['ETag'])
+        self.assertEqual((plain.status_code, plain['ETag']), (200, snapshot.etags[None]))
+
+    def test_hit_is_one_version_query(self):
+        etag = self.client.get(reverse('menu'))['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('menu'))
+        self.assertEqual(response['ETag'], etag)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(reverse('menu'), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(reverse('menu'), HTTP_IF_NONE_MATCH='*').status_code, 304)
+        self.assertEqual(self.client.get(reverse('menu'), HTTP_IF_NONE_MATCH=f'"x{etag[1:]}').status_code, 200)
+
+    def test_rebuilt_snapshot_has_the_same_bytes_and_etag(self):
+        # What another worker would build for the same catalog version.
+        first = menu.get_menu_snapshot()
+        menu.clear_menu_snapshot()
+        second = menu.get_menu_snapshot()
+        self.assertIsNot(first, second)
+        self.assertEqual((first.bodies, first.etags), (second.bodies, second.etags))
+
+    def test_catalog_change_rebuilds(self):
+        etag = self.client.get(reverse('menu'))['ETag']
+        self.addon.price = Decimal('75.00')
+        self.addon.save()
+        response = self.client.get(reverse('menu'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['addons'][str(self.addon.id)]['price'], '75.00')
+
+
+class ProductSearchTests(TestCase):
+    def setUp(self):
+        search.clear_vocabulary()
+        self.addCleanup(search.clear_vocabulary)
+        self.client = APIClient()
+        self.fudge = make_product(
+            'Chocolate Fudge Sundae', category='slay-sundae',
+            tags=['bestseller'], ingredients=['chocolate', 'fudge', 'vanilla'],
+        )
+        self.shake = make_product('Strawberry Shake', category='rizzler-shake', ingredients=['strawberry', 'milk'])
+        self.waffle = make_product('Belgian Waffle', category='waffles', tags=['chocolate drizzle'])
+
+    def search(self, query):
+        response = self.client.get(reverse('product-list'), {'search': query})
+        self.assertEqual(response.status_code, 200)
+        return [product['id'] for product in response.data]
+
+    def test_ranked_prefix_matches_across_tags_and_ingredients(self):
+        self.assertEqual(self.search('choc'), [self.fudge.id, self.waffle.id])
+        self.assertEqual(self.search('bestseller'), [self.fudge.id])
+        self.assertEqual(self.search('milk'), [self.shake.id])
+
+    def test_typo_tolerance(self):
+        self.assertEqual(self.search('strawbery'), [self.shake.id])
+
+    def test_vocabulary_is_read_once_per_catalog_version(self):
+        with mock.patch.object(search, '_read_vocabulary', wraps=search._read_vocabulary) as read:
+            self.assertEqual(self.search('strawbery'), [self.shake.id])
+            self.assertEqual(self.search('wafle'), [self.waffle.id])
+            self.assertEqual(read.call_count, 1)
+
+            self.shake.ingredients = ['strawberry', 'pistachio']
+            self.shake.save()
+            self.assertEqual(self.search('pistacho'), [self.shake.id])
+            self.assertEqual(read.call_count, 2)
+
+    def test_index_follows_saves_and_deletes(self):
+        self.shake.name = self.shake.description = 'Mango Shake'
+        self.shake.ingredients = ['mango']
+        self.shake.save()
+        self.assertEqual(self.search('mango'), [self.shake.id])
+        self.assertEqual(self.search('strawberry'), [])
+
+        self.shake.delete()
+        self.assertEqual(self.search('mango'), [])
+
+    def test_rebuild_command(self):
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM back_product_fts")
+        self.assertEqual(self.search('waffle'), [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.search('waffle'), [self.waffle.id])
+
+
+class OrderSearchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.ayesha = make_order(customer_name='Ayesha Khan', customer_phone='+92 300 1234567')
+        self.bilal = make_order(customer_name='Bilal Ahmed')
+        self.bilal.customer_phone = '0321-7654321'
+        self.bilal.save(update_fields=['customer_phone'])
+
+    def search(self, query):
+        response = self.client.get(reverse('order-list'), {'search': query})
+        return sorted(order['id'] for order in response.data['results'])
+
+    def test_normalize_phone(self):
+        from .models import normalize_phone
+        for raw in ('+92 300 1234567', '0092-300-1234567', '03001234567', '3001234567'):
+            self.assertEqual(normalize_phone(raw), '3001234567')
+
+    def test_phone_prefix_in_any_format(self):
+        self.assertEqual(self.bilal.customer_phone_normalized, '3217654321')
+        self.assertEqual(self.search('0300 123'), [self.ayesha.id])
+        self.assertEqual(self.search('+92321'), [self.bilal.id])
+
+    def test_id_lookup(self):
+        self.assertEqual(self.search(f'#{self.bilal.id}'), [self.bilal.id])
+        self.assertIn(self.bilal.id, self.search(str(self.bilal.id)))
+
+    def test_name_prefix_is_case_insensitive(self):
+        self.assertEqual(self.search('ayesha'), [self.ayesha.id])
+        self.assertEqual(self.search('BIL'), [self.bilal.id])
+        self.assertEqual(self.search('khan'), [])
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Plans are asserted against SQLite EXPLAIN QUERY PLAN output')
+class QueryPlanTests(TestCase):
+    """
+    Runs EXPLAIN QUERY PLAN on every SELECT a hot endpoint emits and fails on a
+    bare table scan of a large table. "SCAN ... USING INDEX" is accepted: it is
+    an ordered index walk stopped early by LIMIT.
+    """
+
+    LARGE_TABLES = {'back_order', 'back_orderitem', 'back_ordertracking', 'back_rider', 'back_dailysalesrollup'}
+    FULL_SCAN_RE = re.compile(r'^SCAN (\w+)$')
+
+    def setUp(self):
+        # A cached response runs no SELECTs and would pass unchecked.
+        get_cache().clear()
+        self.client = APIClient()
+        self.user = SooicyUser.objects.create(name='Ayesha', email='a@example.com', phone='03001234567')
+        self.order = make_order(
+            location=make_location(), items=[(make_product(), 1)], status='delivered', sooicy_user=self.user
+        )
+        Rider.objects.create(name='Ali', phone='03000000001')
+
+    def assert_no_full_scans(self, url, params=None):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, 200)
+
+        selects = [query for query in ctx.captured_queries if query['sql'].startswith('SELECT')]
+        self.assertTrue(selects, f"{url} {params} ran no SELECT to check")
+        for query in selects:
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN QUERY PLAN ' + query['sql'])
+                plan = [row[3] for row in cursor.fetchall()]
+            for step in plan:
+                match = self.FULL_SCAN_RE.match(step)
+                if match and match.group(1) in self.LARGE_TABLES:
+                    self.fail(f"Full scan of {match.group(1)} for {url} {params}:\n{query['sql']}\n" + '\n'.join(plan))
+
+    def test_order_lists(self):
+        url = reverse('order-list')
+        self.assert_no_full_scans(url)
+        self.assert_no_full_scans(url, {'status': 'pending'})
+        self.assert_no_full_scans(url, {'date_from': '2026-01-01', 'date_to': '2026-12-31'})
+        self.assert_no_full_scans(url, {'expand': 'rider,location,items,tracking'})
+        self.assert_no_full_scans(reverse('user-orders', args=[self.user.id]), {'status': 'delivered'})
+        self.assert_no_full_scans(reverse('recent-orders'))
+
+    def test_order_search(self):
+        url = reverse('order-list')
+        for term in ('ayes', '0300 123', f'#{self.order.id}', str(self.order.id)):
+            self.assert_no_full_scans(url, {'search': term})
+
+    def test_tracking_and_riders(self):
+        self.assert_no_full_scans(reverse('order-tracking', args=[self.order.id]))
+        self.assert_no_full_scans(reverse('rider-list'), {'status': 'available'})
+
+    def test_sales_analytics(self):
+        self.assert_no_full_scans(reverse('sales-analytics'), {'days': 365})
+        self.assert_no_full_scans(reverse('sales-analytics'), {'date_from': '2026-01-01', 'limit': 10})
+
+
+class DispatchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        # Clifton branch; riders roughly 1 km and 5 km away.
+        self.branch = make_location(latitude=Decimal('24.8138'), longitude=Decimal('67.0300'))
+        self.near = Rider.objects.create(
+            name='Near', phone='03000000001', latitude=Decimal('24.8200'), longitude=Decimal('67.0350')
+        )
+        self.far = Rider.objects.create(
+            name='Far', phone='03000000002', latitude=Decimal('24.8600'), longitude=Decimal('67.0300')
+        )
+
+    def test_nearest_rider_wins_until_full(self):
+        orders = [make_order(location=self.branch) for _ in range(4)]
+        response = self.client.post(reverse('order-dispatch'), {}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        riders = [assignment['rider'] for assignment in response.data['assigned']]
+        self.assertEqual(riders[0], self.near.id)
+        self.assertEqual(riders.count(self.near.id), Rider.MAX_CONCURRENT_ORDERS)
+        self.assertEqual(riders[-1], self.far.id)
+
+        self.near.refresh_from_db()
+        self.assertEqual((self.near.current_orders, self.near.status), (3, 'busy'))
+        for order in orders:
+            order.refresh_from_db()
+            self.assertEqual(order.status, 'preparing')
+            self.assertTrue(order.tracking.filter(status='assigned').exists())
+
+    def test_load_and_rating_break_ties(self):
+        self.near.current_orders = 2
+        self.near.save()
+        twin = Rider.objects.create(
+            name='Twin', phone='03000000003', latitude=self.near.latitude, longitude=self.near.longitude
+        )
+        make_order(location=self.branch)
+        response = self.client.post(reverse('order-dispatch'), {}, format='json')
+        self.assertEqual(response.data['assigned'][0]['rider'], twin.id)
+
+    def test_dry_run_and_unassigned(self):
+        Rider.objects.filter(pk=self.far.pk).update(status='offline')
+        orders = [make_order(location=self.branch) for _ in range(4)]
+        make_order(location=self.branch, delivery_type='pickup')
+
+        response = self.client.post(reverse('order-dispatch'), {'dry_run': True}, format='json')
+        self.assertEqual(len(response.data['assigned']), 3)
+        self.assertEqual(response.data['unassigned'], [orders[-1].id])
+        self.assertFalse(Order.objects.filter(rider__isnull=False).exists())
+
+    def test_management_command_assigns_backlog(self):
+        Rider.objects.create(name='Unlocated', phone='03000000004')
+        for _ in range(7):
+            make_order(location=self.branch)
+        make_order()  # no branch coordinates
+        call_command('dispatch_orders', stdout=StringIO())
+        self.assertEqual(Order.objects.filter(rider__isnull=True).count(), 0)
+        self.assertFalse(Rider.objects.filter(current_orders__gt=Rider.MAX_CONCURRENT_ORDERS).exists())
+
+
+class RiderCapacityTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.rider = Rider.objects.create(name='Ali', phone='03000000001', current_orders=2)
+
+    def assign(self, order, rider=None):
+        return self.client.patch(
+            reverse('order-assign-rider', args=[order.id]), {'rider_id': (rider or self.rider).id}, format='json'
+        )
+
+    def test_stale_reads_cannot_overbook(self):
+        from .services import AssignmentError, assign_rider
+
+        first, second = make_order(), make_order()
+        # Two dispatchers loaded the rider at 2/3 before either wrote.
+        stale_a, stale_b = Rider.objects.get(pk=self.rider.pk), Rider.objects.get(pk=self.rider.pk)
+        assign_rider(first, stale_a)
+        with self.assertRaises(AssignmentError):
+            assign_rider(second, stale_b)
+
+        self.rider.refresh_from_db()
+        self.assertEqual((self.rider.current_orders, self.rider.status), (3, 'busy'))
+        second.refresh_from_db()
+        self.assertIsNone(second.rider_id)
+
+    def test_terminal_status_releases_capacity(self):
+        delivered, cancelled = make_order(), make_order()
+        Rider.objects.filter(pk=self.rider.pk).update(current_orders=1)
+        self.assertEqual(self.assign(delivered).status_code, 200)
+        self.assertEqual(self.assign(cancelled).status_code, 200)
+        self.rider.refresh_from_db()
+        self.assertEqual((self.rider.current_orders, self.rider.status), (3, 'busy'))
+
+        url = reverse('order-status-update', args=[delivered.id])
+        self.client.patch(url, {'status': 'delivered'}, format='json')
+        self.client.patch(url, {'status': 'delivered'}, format='json')  # no double release
+        self.rider.refresh_from_db()
+        self.assertEqual((self.rider.current_orders, self.rider.status, self.rider.total_deliveries), (2, 'available', 1))
+
+        self.client.patch(reverse('order-status-update', args=[cancelled.id]), {'status': 'cancelled'}, format='json')
+        self.rider.refresh_from_db()
+        self.assertEqual((self.rider.current_orders, self.rider.total_deliveries), (1, 1))
+
+    def test_concurrent_close_releases_once(self):
+        order = make_order(location=make_location())
+        self.assertEqual(self.assign(order).status_code, 200)
+        # Both requests loaded the order while it was still open.
+        stale_a, stale_b = Order.objects.get(pk=order.pk), Order.objects.get(pk=order.pk)
+        update_order_status(stale_a, 'delivered')
+        update_order_status(stale_b, 'delivered')
+
+        self.rider.refresh_from_db()
+        self.assertEqual((self.rider.current_orders, self.rider.total_deliveries), (2, 1))
+        self.assertEqual(DailySalesRollup.objects.get().order_count, 1)
+
+    def test_stale_close_keeps_a_newer_assignment(self):
+        order = make_order()
+        stale = Order.objects.get(pk=order.pk)
+        self.assertEqual(self.assign(order).status_code, 200)
+        update_order_status(stale, 'cancelled')
+
+        order.refresh_from_db()
+        self.assertEqual((order.rider_id, order.status), (self.rider.id, 'cancelled'))
+        self.rider.refresh_from_db()
+        self.assertEqual(self.rider.current_orders, 2)
+
+    def test_assignment_keeps_concurrent_order_changes(self):
+        from .services import assign_rider
+
+        order = make_order()
+        stale = Order.objects.get(pk=order.pk)
+        Order.objects.filter(pk=order.pk).update(status='ready', delivery_address='Gate 2')
+        assign_rider(stale, self.rider)
+
+        order.refresh_from_db()
+        self.assertEqual((order.rider_id, order.status, order.delivery_address), (self.rider.id, 'ready', 'Gate 2'))
+        self.assertEqual(stale.status, 'ready')
+
+    def test_reassignment_moves_the_slot(self):
+        order = make_order()
+        other = Rider.objects.create(name='Bilal', phone='03000000002')
+        self.assign(order)
+        self.assertEqual(self.assign(order, other).status_code, 200)
+        self.rider.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((self.rider.current_orders, other.current_orders), (2, 1))
+
+    def test_reconciliation_recomputes_from_open_orders(self):
+        make_order(rider=self.rider)
+        make_order(rider=self.rider, status='delivered')
+        Rider.objects.filter(pk=self.rider.pk).update(current_orders=3, status='busy')
+        idle = Rider.objects.create(name='Idle', phone='03000000003', current_orders=5, status='offline')
+
+        call_command('reconcile_rider_load', stdout=StringIO())
+        self.rider.refresh_from_db()
+        idle.refresh_from_db()
+        self.assertEqual((self.rider.current_orders, self.rider.status), (1, 'available'))
+        self.assertEqual((idle.current_orders, idle.status), (0, 'offline'))
+
+
+class LocationServingTests(TestCase):
+    def setUp(self):
+        from .coverage import CoverageIndex
+        # Catalog versions repeat across rolled-back tests, so start from an empty index.
+        patcher = mock.patch('back.views.coverage_index', CoverageIndex())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = APIClient()
+        self.clifton = make_location(
+            'Clifton', latitude=Decimal('24.8138'), longitude=Decimal('67.0300'), coverage_radius=5,
+        )
+        self.dha = make_location(
+            'DHA', latitude=Decimal('24.7900'), longitude=Decimal('67.0650'), coverage_radius=3,
+            delivery_time='20-30 min', delivery_fee=Decimal('200.00'),
+        )
+        make_location('Gulshan', latitude=Decimal('24.9200'), longitude=Decimal('67.0900'))
+        make_location('No coordinates')
+
+    def serving(self, lat, lng):
+        response = self.client.get(reverse('location-serving'), {'lat': lat, 'lng': lng})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_ranked_by_distance_within_coverage(self):
+        results = self.serving(24.8000, 67.0500)
+        self.assertEqual([row['name'] for row in results], ['DHA', 'Clifton'])
+        self.assertLess(results[0]['distance_km'], results[1]['distance_km'])
+        self.assertEqual(results[0]['delivery_fee'], '200.00')
+        self.assertEqual(results[0]['min_order_amount'], '0.00')
+        self.assertEqual(results[0]['eta_minutes'], 20 + round(results[0]['distance_km'] * 3))
+
+        # Inside Clifton's 5 km but outside DHA's 3 km.
+        self.assertEqual([row['name'] for row in self.serving(24.8300, 67.0200)], ['Clifton'])
+        self.assertEqual(self.serving(25.5, 68.0), [])
+
+    def test_index_rebuilds_after_changes(self):
+        self.serving(24.8000, 67.0500)
+        self.client.patch(reverse('location-toggle', args=[self.dha.id]))
+        self.assertEqual([row['name'] for row in self.serving(24.8000, 67.0500)], ['Clifton'])
+
+        self.client.patch(reverse('location-update', args=[self.clifton.id]), {'coverage_radius': 1}, format='json')
+        self.assertEqual(self.serving(24.8000, 67.0500), [])
+
+    def test_coverage_radius_is_capped(self):
+        response = self.client.patch(
+            reverse('location-update', args=[self.clifton.id]),
+            {'coverage_radius': Location.MAX_COVERAGE_RADIUS + 1}, format='json',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('coverage_radius', response.data)
+
+    def test_steady_state_costs_one_query(self):
+        self.serving(24.8000, 67.0500)
+        with self.assertNumQueries(1):
+            self.serving(24.8000, 67.0500)
+
+    def test_bad_coordinates(self):
+        self.assertEqual(self.client.get(reverse('location-serving'), {'lat': 'x', 'lng': 1}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('location-serving'), {'lat': 91, 'lng': 1}).status_code, 400)
+
+
+class PubSubTests(TestCase):
+    async def test_in_process_delivery_from_another_thread(self):
+        broker = pubsub.InProcessBroker()
+        async with broker.subscribe('order-tracking:1') as subscription:
+            self.assertEqual(broker.subscriber_count('order-tracking:1'), 1)
+            thread = threading.Thread(target=broker.publish, args=('order-tracking:1', {'id': 7}))
+            thread.start()
+            thread.join()
+            broker.publish('order-tracking:2', {'id': 8})
+            self.assertEqual(await subscription.get(timeout=1), {'id': 7})
+            with self.assertRaises(asyncio.TimeoutError):
+                await subscription.get(timeout=0.05)
+        self.assertEqual(broker.subscriber_count('order-tracking:1'), 0)
+
+    async def test_slow_subscriber_drops_oldest(self):
+        broker = pubsub.InProcessBroker()
+        async with broker.subscribe('c') as subscription:
+            for number in range(pubsub.SUBSCRIBER_QUEUE_SIZE + 5):
+                broker.publish('c', number)
+            await asyncio.sleep(0)
+            self.assertEqual(await subscription.get(timeout=1), 5)
+
+    @skipUnless(fakeredis, 'fakeredis is not installed')
+    async def test_redis_fans_out_across_brokers(self):
+        server = fakeredis.FakeServer()
+        make = lambda: pubsub.RedisBroker(
+            url='redis://fake', client=fakeredis.FakeRedis(server=server),
+            async_client_factory=lambda: fakeredis.FakeAsyncRedis(server=server),
+        )
+        publisher, worker = make(), make()
+        try:
+            async with worker.subscribe('order-tracking:1') as subscription:
+                publisher.publish('order-tracking:1', {'id': 3, 'status': 'preparing'})
+                self.assertEqual(await subscription.get(timeout=2), {'id': 3, 'status': 'preparing'})
+        finally:
+            await worker.aclose()
+
+    @skipUnless(fakeredis, 'fakeredis is not installed')
+    async def test_bad_messages_do_not_stop_the_listener(self):
+        server = fakeredis.FakeServer()
+        worker = pubsub.RedisBroker(
+            url='redis://fake', client=fakeredis.FakeRedis(server=server),
+            async_client_factory=lambda: fakeredis.FakeAsyncRedis(server=server),
+        )
+        try:
+            async with worker.subscribe('order-tracking:1') as subscription:
+                with self.assertLogs('back.pubsub', 'ERROR'):
+                    worker.client.publish(b'sooicy:\xff', b'{}')
+                    worker.client.publish('sooicy:order-tracking:1', b'not json')
+                    worker.publish('order-tracking:1', {'id': 4})
+                    self.assertEqual(await subscription.get(timeout=2), {'id': 4})
+        finally:
+            await worker.aclose()
+
+
+class TieredCacheTests(TestCase):
+    def test_local_cache_evicts_least_recently_used(self):
+        local = LocalCache(max_entries=2, timeout=60)
+        local.set('a', 1)
+        local.set('b', 2)
+        local.get('a')
+        local.set('c', 3)
+        self.assertEqual((local.get('a'), local.get('b'), local.get('c')), (1, None, 3))
+        self.assertEqual(
+            {name: local.stats()[name] for name in ('hits', 'misses', 'evictions')},
+            {'hits': 3, 'misses': 1, 'evictions': 1},
+        )
+
+    def test_local_cache_expires(self):
+        local = LocalCache(timeout=60)
+        local.set('a', 1, timeout=0)
+        self.assertIsNone(local.get('a'))
+        self.assertEqual(local.stats()['expirations'], 1)
+
+    def test_l1_only_without_redis(self):
+        tiered = TieredCache()
+        calls = []
+        build = lambda: calls.append(1) or {'total': 1}
+        self.assertEqual(tiered.get_or_set('k', build, 60), {'total': 1})
+        self.assertEqual(tiered.get_or_set('k', build, 60), {'total': 1})
+        self.assertEqual(len(calls), 1)
+
+    @skipUnless(fakeredis, 'fakeredis is not installed')
+    def test_invalidation_reaches_other_workers(self):
+        server = fakeredis.FakeServer()
+        first, second = (TieredCache(client=fakeredis.FakeRedis(server=server)) for _ in range(2))
+        self.addCleanup(first.stop_listener)
+        self.addCleanup(second.stop_listener)
+        first.start_listener(wait=2)
+        second.start_listener(wait=2)
+
+        first.set('menu', 'v1', 60)
+        self.assertEqual(second.get('menu'), 'v1')
+        self.assertEqual(second.stats()['l2_hits'], 1)
+        self.assertEqual(second.get('menu'), 'v1')
+        self.assertEqual(second.stats()['l1']['hits'], 1)
+
+        first.set('menu', 'v2', 60)
+        for _ in range(100):
+            if second.stats()['invalidations_received']:
+                break
+            time.sleep(0.01)
+        self.assertEqual(second.get('menu'), 'v2')
+
+        second.delete('menu')
+        for _ in range(100):
+            if first.stats()['invalidations_received']:
+                break
+            time.sleep(0.01)
+        self.assertIsNone(first.get('menu'))
+
+    @skipUnless(fakeredis, 'fakeredis is not installed')
+    def test_writing_worker_receives_invalidations(self):
+        server = fakeredis.FakeServer()
+        writer, other = (TieredCache(client=fakeredis.FakeRedis(server=server)) for _ in range(2))
+        self.addCleanup(writer.stop_listener)
+        self.addCleanup(other.stop_listener)
+
+        writer.set('menu', 'v1', 60)
+        for _ in range(100):
+            if writer.stats()['listening']:
+                break
+            time.sleep(0.01)
+        # Subscribing clears L1, so fill it again.
+        writer.set('menu', 'v1', 60)
+        other.set('menu', 'v2', 60)
+        for _ in range(100):
+            if writer.stats()['invalidations_received']:
+                break
+            time.sleep(0.01)
+        self.assertEqual(writer.get('menu'), 'v2')
+
+    def test_stats_endpoint(self):
+        response = self.client.get(reverse('cache-stats'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('evictions', response.json()['l1'])
+
+
+class SingleFlightTests(TestCase):
+    def run_concurrently(self, flights, key, count=4):
+        release, calls, results = threading.Event(), [], []
+
+        def build():
+            calls.append(1)
+            release.wait(2)
+            return {'total': len(calls)}
+
+        threads = [
+            threading.Thread(target=lambda flight=flights[n % len(flights)]: results.append(flight.do(key, build)))
+            for n in range(count)
+        ]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.2)
+        release.set()
+        for thread in threads:
+            thread.join()
+        return calls, results
+
+    def test_concurrent_callers_share_one_computation(self):
+        flight = SingleFlight()
+        calls, results = self.run_concurrently([flight], 'dashboard-stats?')
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{'total': 1}] * 4)
+        self.assertEqual(flight.stats(), {'leaders': 1, 'followers': 3, 'shared_hits': 0,
+                                          'shared_fallbacks': 0, 'in_flight': 0})
+
+    def test_error_reaches_every_waiter(self):
+        flight, started, errors = SingleFlight(), threading.Event(), []
+
+        def fail():
+            started.set()
+            time.sleep(0.1)
+            raise ValueError('boom')
+
+        def call():
+            try:
+                flight.do('k', fail)
+            except ValueError as e:
+                errors.append(e)
+
+        leader = threading.Thread(target=call)
+        leader.start()
+        started.wait(1)
+        follower = threading.Thread(target=call)
+        follower.start()
+        leader.join()
+        follower.join()
+        self.assertEqual(len(errors), 2)
+        self.assertEqual(flight.stats()['in_flight'], 0)
+
+    @skipUnless(fakeredis, 'fakeredis is not installed')
+    def test_lease_coalesces_across_workers(self):
+        server = fakeredis.FakeServer()
+        flights = [SingleFlight(client=fakeredis.FakeRedis(server=server), lease=2) for _ in range(2)]
+        calls, results = self.run_concurrently(flights, 'sales-analytics?days=30', count=2)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{'total': 1}] * 2)
+        self.assertEqual(sum(flight.stats()['shared_hits'] for flight in flights), 1)
+
+    def test_key_ignores_parameter_order(self):
+        factory = RequestFactory()
+        self.assertEqual(
+            request_key('sales-analytics', factory.get('/', {'days': 30, 'limit': 5})),
+            request_key('sales-analytics', factory.get('/?limit=5&days=30')),
+        )
+        self.assertNotEqual(
+            request_key('sales-analytics', factory.get('/', {'days': 30})),
+            request_key('sales-analytics', factory.get('/', {'days': 90})),
+        )
+
+
+class IdentityMapTests(TestCase):
+    def test_repeated_lookups_are_served_from_memory(self):
+        product = make_product()
+        with identity.identity_scope() as identity_map:
+            first = identity.get(Product, product.id)
+            with self.assertNumQueries(0):
+                self.assertIs(identity.get(Product, product.id), first)
+                self.assertEqual(identity.in_bulk(Product, [product.id]), {product.id: first})
+            with self.assertRaises(Product.DoesNotExist):
+                identity.get(Product, 999999)
+        self.assertEqual(
+            {name: identity_map.counters[name] for name in ('hits', 'queries', 'queries_saved')},
+            {'hits': 2, 'queries': 2, 'queries_saved': 2},
+        )
+
+    def test_plain_queries_outside_a_request(self):
+        product = make_product()
+        self.assertIsNone(identity.current())
+        with self.assertNumQueries(2):
+            self.assertIsNot(identity.get(Product, product.id), identity.get(Product, product.id))
+
+    def test_nested_rider_rendered_once(self):
+        rider = Rider.objects.create(name='Bilal', phone='03111111111', vehicle_type='bike')
+        for _ in range(3):
+            make_order(rider=rider)
+        response = self.client.get(reverse('order-list'), {'expand': 'rider'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({order['rider']['name'] for order in response.json()['results']}, {'Bilal'})
+        self.assertIn('reused=2', response['X-Identity-Map'])
+
+
+class OrderTrackingStreamTests(TestCase):
+    def setUp(self):
+        self.order = make_order()
+        broker = mock.patch.object(pubsub, '_broker', pubsub.InProcessBroker())
+        broker.start()
+        self.addCleanup(broker.stop)
+
+    def set_status(self, new_status):
+        with self.captureOnCommitCallbacks(execute=True):
+            update_order_status(self.order, new_status, updated_by='Kitchen')
+
+    async def next_event(self, content):
+        while True:
+            frame = (await asyncio.wait_for(anext(content), 2)).decode()
+            if frame.startswith('id:'):
+                return json.loads(frame.split('data: ', 1)[1])
+
+    async def test_replays_history_then_pushes_new_rows(self):
+        await sync_to_async(self.set_status)('preparing')
+        url = reverse('order-tracking-stream', args=[self.order.id])
+        response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        content = response.streaming_content
+
+        self.assertEqual((await self.next_event(content))['status'], 'preparing')
+
+        await sync_to_async(self.set_status)('delivering')
+        self.assertEqual((await self.next_event(content))['status'], 'delivering')
+
+        await sync_to_async(self.set_status)('delivered')
+        self.assertEqual((await self.next_event(content))['status'], 'delivered')
+        with self.assertRaises(StopAsyncIteration):
+            await asyncio.wait_for(anext(content), 2)
+        self.assertEqual(pubsub._broker.subscriber_count(f'order-tracking:{self.order.id}'), 0)
+
+    async def test_resumes_after_last_event_id(self):
+        for new_status in ('preparing', 'delivering', 'cancelled'):
+            await sync_to_async(self.set_status)(new_status)
+        url = reverse('order-tracking-stream', args=[self.order.id])
+        first = await self.next_event((await self.async_client.get(url)).streaming_content)
+
+        response = await self.async_client.get(url, headers={'Last-Event-ID': str(first['id'])})
+        frames = [frame.decode() async for frame in response.streaming_content]
+        statuses = [json.loads(f.split('data: ', 1)[1])['status'] for f in frames if f.startswith('id:')]
+        self.assertEqual(statuses, ['delivering', 'cancelled'])
+
+    async def test_replays_past_a_reopened_terminal_row(self):
+        for new_status in ('cancelled', 'preparing'):
+            await sync_to_async(self.set_status)(new_status)
+        url = reverse('order-tracking-stream', args=[self.order.id])
+        content = (await self.async_client.get(url, headers={'Last-Event-ID': '0'})).streaming_content
+        self.assertEqual((await self.next_event(content))['status'], 'cancelled')
+        self.assertEqual((await self.next_event(content))['status'], 'preparing')
+
+        await sync_to_async(self.set_status)('delivered')
+        self.assertEqual((await self.next_event(content))['status'], 'delivered')
+
+    async def test_errors(self):
+        url = reverse('order-tracking-stream', args=[self.order.id])
+        self.assertEqual((await self.async_client.get(reverse('order-tracking-stream', args=[999]))).status_code, 404)
+        self.assertEqual((await self.async_client.get(url, headers={'Last-Event-ID': 'x'})).status_code, 400)
+
+    def test_requires_asgi(self):
+        url = reverse('order-tracking-stream', args=[self.order.id])
+        self.assertEqual(self.client.get(url).status_code, 501)
+
+
+class ProductImageUploadTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root, MEDIA_URL='/media/')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.media_root = media_root
+
+    def image_file(self, size=(1000, 500), mode='RGBA', image_format='PNG', name='swirl.png'):
+        buffer = BytesIO()
+        Image.new(mode, size, (200, 30, 90, 128) if mode == 'RGBA' else (200, 30, 90)).save(buffer, image_format)
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type=f'image/{image_format.lower()}')
+
+    def upload(self, image):
+        return self.client.post(reverse('product-image-upload'), {'image': image})
+
+    def test_variants_and_srcset(self):
+        response = self.upload(self.image_file())
+        self.assertEqual(response.status_code, 201)
+        data = response.json()
+        digest = data['hash']
+        self.assertEqual(list(data['variants']['webp']), ['200', '400', '800'])
+        self.assertEqual(data['variants']['jpg']['400'], f'/media/products/{digest}/400.jpg')
+        self.assertEqual(data['imageUrl'], f'/media/products/{digest}/800.jpg')
+        self.assertEqual(
+            data['srcset']['webp'],
+            ', '.join(f'/media/products/{digest}/{width}.webp {width}w' for width in (200, 400, 800)),
+        )
+        self.assertFalse(data['deduplicated'])
+
+        with Image.open(f'{self.media_root}/products/{digest}/400.webp') as variant:
+            self.assertEqual((variant.format, variant.size), ('WEBP', (400, 200)))
+        with Image.open(f'{self.media_root}/products/{digest}/800.jpg') as variant:
+            self.assertEqual((variant.format, variant.mode), ('JPEG', 'RGB'))
+
+    def test_duplicate_upload_reuses_files(self):
+        first = self.upload(self.image_file(name='a.png')).json()
+        second = self.upload(self.image_file(name='b.png')).json()
+        self.assertTrue(second['deduplicated'])
+        self.assertEqual(first['variants'], second['variants'])
+        self.assertEqual(len(os.listdir(f"{self.media_root}/products/{first['hash']}")), 7)
+
+    def test_small_images_are_not_upscaled(self):
+        data = self.upload(self.image_file(size=(150, 100), mode='RGB', image_format='JPEG', name='s.jpg')).json()
+        self.assertEqual(list(data['variants']['jpg']), ['150'])
+
+    def test_rejects_files_that_are_not_images(self):
+        fake = SimpleUploadedFile('x.png', b'not an image', content_type='image/png')
+        self.assertEqual(self.upload(fake).status_code, 400)
+
+
+class OrderExportTests(TestCase):
+    def setUp(self):
+        self.location = make_location()
+        self.rider = Rider.objects.create(name='Bilal', phone='03110000000', email='b@example.com', vehicle_type='bike')
+        product = make_product(price='300.00')
+        sprinkles = Addon.objects.create(name='Sprinkles', price=Decimal('50.00'))
+        self.order = make_order(
+            total='700.00', status='delivered', location=self.location, items=[(product, 2)],
+            customer_name='=HYPERLINK("x")', customer_phone='=HYPERLINK("y")', rider=self.rider,
+        )
+        self.order.items.get().addons.add(sprinkles)
+        self.empty = make_order(
+            total='0.00', status='cancelled', customer_name='\t=SUM(A1)', customer_phone='\r+923001234567',
+        )
+
+    def export(self, **params):
+        response = self.client.get(reverse('order-export'), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_has_a_row_per_item(self):
+        rows = list(csv.DictReader(StringIO(self.export())))
+        self.assertEqual([row['order_id'] for row in rows], [str(self.order.id), str(self.empty.id)])
+        first = rows[0]
+        self.assertEqual(first['customer_name'], "'=HYPERLINK(\"x\")")
+        self.assertEqual(first['customer_phone'], "'=HYPERLINK(\"y\")")
+        self.assertEqual((first['status'], first['rider_name'], first['location_name']), ('delivered', 'Bilal', 'Clifton'))
+        self.assertEqual((first['quantity'], first['addons']), ('2', 'Sprinkles (50.00)'))
+        self.assertEqual(rows[1]['item_id'], '')
+        self.assertEqual((rows[1]['customer_name'], rows[1]['customer_phone']), ("'\t=SUM(A1)", "'\r+923001234567"))
+
+    def test_ndjson_nests_items_and_filters(self):
+        lines = self.export(output='ndjson', status='delivered').splitlines()
+        self.assertEqual(len(lines), 1)
+        record = json.loads(lines[0])
+        self.assertEqual(record['customer_name'], '=HYPERLINK("x")')
+        self.assertEqual(record['items'][0]['addons'], [{'id': mock.ANY, 'name': 'Sprinkles', 'price': '50.00'}])
+
+        self.assertEqual(self.export(output='ndjson', location=self.location.id + 1), '')
+
+    def test_queries_do_not_grow_with_orders(self):
+        product = make_product(name='Other')
+        for _ in range(5):
+            make_order(location=self.location, items=[(product, 1)], rider=self.rider)
+        with self.assertNumQueries(3):
+            self.export(output='ndjson')
+
+    async def test_streams_under_asgi(self):
+        response = await self.async_client.get(reverse('order-export'), {'output': 'ndjson'})
+        self.assertTrue(response.is_async)
+        lines = b''.join([chunk async for chunk in response.streaming_content]).decode().splitlines()
+        self.assertEqual(len(lines), 2)
+
+    def test_bad_parameters(self):
+        self.assertEqual(self.client.get(reverse('order-export'), {'output': 'xlsx'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('order-export'), {'date_from': 'x'}).status_code, 400)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('export_orders', output='ndjson', chunk_size=1, stdout=out)
+        ids = [json.loads(line)['order_id'] for line in out.getvalue().splitlines()]
+        self.assertEqual(ids, [self.order.id, self.empty.id])
+
+
+class FakeConnection:
+    """Just enough of a psycopg2 connection for ConnectionPool."""
+
+    def __init__(self, transaction_status=extensions.TRANSACTION_STATUS_IDLE):
+        self.closed = 0
+        self.transaction_status = transaction_status
+        self.rolled_back = False
+
+    def get_transaction_status(self):
+        return self.transaction_status
+
+    def rollback(self):
+        self.rolled_back = True
+        self.transaction_status = extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+class ConnectionPoolTests(TestCase):
+    def test_connections_are_reused(self):
+        pool = ConnectionPool(max_size=2)
+        first = pool.acquire(FakeConnection)
+        pool.release(first)
+        self.assertIs(pool.acquire(FakeConnection), first)
+        stats = pool.stats()
+        self.assertEqual((stats['created'], stats['reused'], stats['in_use'], stats['idle']), (1, 1, 1, 0))
+
+    def test_waits_then_times_out_when_exhausted(self):
+        pool = ConnectionPool(max_size=1, timeout=0.01)
+        pool.acquire(FakeConnection)
+        with self.assertRaises(PoolTimeout):
+            pool.acquire(FakeConnection)
+        self.assertEqual((pool.stats()['waits'], pool.stats()['timeouts']), (1, 1))
+
+    def test_unusable_connections_are_discarded(self):
+        pool = ConnectionPool(max_size=2)
+        failed = pool.acquire(lambda: FakeConnection(extensions.TRANSACTION_STATUS_INERROR))
+        pool.release(failed)
+        self.assertTrue(failed.rolled_back)
+        self.assertIs(pool.acquire(FakeConnection), failed)
+
+        broken = FakeConnection(extensions.TRANSACTION_STATUS_UNKNOWN)
+        pool.release(broken)
+        self.assertTrue(broken.closed)
+        self.assertEqual(pool.stats()['discarded'], 1)
+
+    def test_failed_health_check_opens_a_new_connection(self):
+        pool = ConnectionPool(max_size=1, check=lambda connection: False)
+        stale = pool.acquire(FakeConnection)
+        pool.release(stale)
+        self.assertIsNot(pool.acquire(FakeConnection), stale)
+        self.assertTrue(stale.closed)
+
+    def test_health_endpoint(self):
+        response = self.client.get(reverse('database-health'))
+        self.assertEqual(response.status_code, 200)
+        default = response.json()['databases']['default']
+        self.assertEqual((default['ok'], default['vendor'], default['pool']), (True, 'sqlite', None))
+
+
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    Primary and replica as two separate SQLite files, so a read shows which one it hit.
+
+    The replica alias is attached after the runner has set up the test
+    databases and removed again before teardown.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.replica_dir = tempfile.mkdtemp()
+        connections.settings[REPLICA_DB_ALIAS] = {
+            **connections.settings[DEFAULT_DB_ALIAS],
+            'NAME': os.path.join(cls.replica_dir, 'replica.sqlite3'),
+        }
+        call_command('migrate', database=REPLICA_DB_ALIAS, verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        connections[REPLICA_DB_ALIAS].close()
+        del connections[REPLICA_DB_ALIAS]
+        del connections.settings[REPLICA_DB_ALIAS]
+        shutil.rmtree(cls.replica_dir)
+        super().tearDownClass()
+
+    def setUp(self):
+        get_cache().clear()
+        call_command('flush', database=REPLICA_DB_ALIAS, interactive=False, verbosity=0)
+        make_order(total='100.00')
+        Order.objects.using(REPLICA_DB_ALIAS).create(
+            customer_name='Replica', customer_phone='03000000000', delivery_address='x',
+            payment_method='cash', subtotal=Decimal('5.00'), total=Decimal('5.00'), status='delivered',
+        )
+
+    def test_dashboard_and_exports_read_the_replica(self):
+        stats = self.client.get(reverse('dashboard-stats')).json()
+        self.assertEqual((stats['total_orders'], stats['completed_orders']), (1, 1))
+
+        rows = list(csv.DictReader(StringIO(
+            b''.join(self.client.get(reverse('order-export')).streaming_content).decode()
+        )))
+        self.assertEqual([row['customer_name'] for row in rows], ['Replica'])
+
+    def test_replica_snapshots_expire_quickly(self):
+        # Replica lag can outlast the invalidation, so only the short timeout bounds it.
+        with mock.patch('back.analytics.DASHBOARD_STATS_REPLICA_TIMEOUT', 0):
+            self.client.get(reverse('dashboard-stats'))
+            Order.objects.using(REPLICA_DB_ALIAS).filter(customer_name='Replica').update(status='pending')
+            stats = self.client.get(reverse('dashboard-stats')).json()
+        self.assertEqual(stats['completed_orders'], 0)
+
+    def test_sales_analytics_read_the_replica(self):
+        with CaptureQueriesContext(connections[REPLICA_DB_ALIAS]) as replica_queries:
+            self.assertEqual(self.client.get(reverse('sales-analytics')).status_code, 200)
+        self.assertTrue(replica_queries.captured_queries)
+
+    def test_admin_lists_read_the_replica(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        response = self.client.get(reverse('admin:back_order_changelist'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Replica')
+        self.assertNotContains(response, 'Ayesha')
+
+    def test_writes_and_order_flows_stay_on_primary(self):
+        self.assertEqual(self.client.get(reverse('order-list')).json()['results'][0]['customer_name'], 'Ayesha')
+        order = make_order(customer_name='Fresh')
+        self.assertFalse(Order.objects.using(REPLICA_DB_ALIAS).filter(customer_name='Fresh').exists())
+
+        with use_replica():
+            self.assertEqual(Order.objects.count(), 1)
+            order.status = 'preparing'
+            order.save()
+            # Read-your-writes: after a write the scope reads the primary.
+            self.assertEqual(Order.objects.get(pk=order.pk).status, 'preparing')
+            self.assertEqual(Order.objects.count(), 2)
+
+
+class ReplicaFallbackTests(TestCase):
+    def test_reads_use_primary_without_a_replica(self):
+        with use_replica():
+            self.assertIsNone(ReplicaRouter().db_for_read(Order))
+        self.assertEqual(self.client.get(reverse('dashboard-stats')).status_code, 200)
+
+
+class SQLiteConcurrencyTests(TestCase):
+    def setUp(self):
+        self.scratch = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.scratch)
+
+    def make_connection(self):
+        wrapper = ConcurrentSQLiteWrapper(
+            {**connections.settings[DEFAULT_DB_ALIAS], 'NAME': os.path.join(self.scratch, 'db.sqlite3')},
+            alias='concurrent',
+        )
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def test_pragmas_applied_on_connect(self):
+        wrapper = self.make_connection()
+        with wrapper.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+
+    def test_atomic_takes_the_write_lock_up_front(self):
+        wrapper = self.make_connection()
+        with CaptureQueriesContext(wrapper) as queries:
+            # What atomic() does on entering its outermost block.
+            wrapper.set_autocommit(False, force_begin_transaction_with_broken_autocommit=True)
+            wrapper.rollback()
+            wrapper.set_autocommit(True)
+        self.assertIn('BEGIN IMMEDIATE', [query['sql'] for query in queries])
+
+    def test_stock_backend_is_left_alone(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertNotEqual(cursor.fetchone()[0], 'wal')
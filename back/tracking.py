@@ -0,0 +1,82 @@
+"""
+Live order tracking over Server-Sent Events.
+
+Every committed OrderTracking row is published on the order's channel
+(back.signals -> publish_tracking). tracking_stream() replays the rows a
+client has not seen yet and then forwards new ones as they arrive, so apps
+can hold one idle connection per open order instead of polling
+OrderTrackingView.
+"""
+import asyncio
+import json
+import logging
+
+from .models import Order, OrderTracking
+from .pubsub import get_broker
+from .serializers import OrderTrackingSerializer
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_SECONDS = 15
+# Django 4.2 does not notice when a streaming client goes away, so streams
+# end on their own; EventSource reconnects with Last-Event-ID and resumes.
+MAX_STREAM_SECONDS = 15 * 60
+RETRY_MILLISECONDS = 3000
+
+
+def order_channel(order_id):
+    return f'order-tracking:{order_id}'
+
+
+def publish_tracking(tracking):
+    try:
+        get_broker().publish(order_channel(tracking.order_id), dict(OrderTrackingSerializer(tracking).data))
+    except Exception:
+        # Clients catch up from history on reconnect; never fail the write.
+        logger.exception('Could not publish tracking row %s', tracking.pk)
+
+
+def format_event(payload):
+    return f"id: {payload['id']}\nevent: tracking\ndata: {json.dumps(payload)}\n\n"
+
+
+async def tracking_stream(order_id, last_event_id=0, closed=False,
+                          heartbeat=HEARTBEAT_SECONDS, max_seconds=MAX_STREAM_SECONDS):
+    """
+    Yield SSE frames for `order_id`: rows after `last_event_id`, then live rows.
+
+    Ends after the history when its latest row is delivered/cancelled or the
+    order was already `closed`, after a live delivered/cancelled row, or once
+    `max_seconds` have passed.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + max_seconds
+
+    async with get_broker().subscribe(order_channel(order_id)) as subscription:
+        yield f'retry: {RETRY_MILLISECONDS}\n\n'
+
+        # Subscribed before reading history, so a row committed in between
+        # shows up in both and is skipped by id below, never lost.
+        history = OrderTracking.objects.filter(order_id=order_id, pk__gt=last_event_id).order_by('pk')
+        last_status = None
+        async for row in history:
+            payload = OrderTrackingSerializer(row).data
+            yield format_event(payload)
+            last_event_id = payload['id']
+            last_status = payload['status']
+        # Only the latest row counts: a delivered or cancelled order can be reopened.
+        if closed or last_status in Order.TERMINAL_STATUSES:
+            return
+
+        while (remaining := deadline - loop.time()) > 0:
+            try:
+                payload = await subscription.get(timeout=min(heartbeat, remaining))
+            except asyncio.TimeoutError:
+                yield ': keep-alive\n\n'
+                continue
+            if payload['id'] <= last_event_id:
+                continue
+            yield format_event(payload)
+            last_event_id = payload['id']
+            if payload['status'] in Order.TERMINAL_STATUSES:
+                return
@@ -13,6 +13,7 @@ urlpatterns = [
     
     # ============ LOCATION URLS ============
     path('locations/', views.LocationListView.as_view(), name='location-list'),
+    path('locations/serving/', views.LocationServingView.as_view(), name='location-serving'),
     path('locations/<int:pk>/', views.LocationDetailView.as_view(), name='location-detail'),
     path('locations/create/', views.LocationCreateView.as_view(), name='location-create'),
     path('locations/<int:pk>/update/', views.LocationUpdateView.as_view(), name='location-update'),
@@ -44,15 +45,22 @@ urlpatterns = [
     path('orders/<int:pk>/status/', views.OrderStatusUpdateView.as_view(), name='order-status-update'),
     path('orders/<int:pk>/assign-rider/', views.OrderAssignRiderView.as_view(), name='order-assign-rider'),
     path('orders/<int:order_id>/tracking/', views.OrderTrackingView.as_view(), name='order-tracking'),
+    path('orders/<int:order_id>/tracking/stream/', views.OrderTrackingStreamView.as_view(), name='order-tracking-stream'),
     path('orders/recent/', views.RecentOrdersView.as_view(), name='recent-orders'),
+    path('orders/export/', views.OrderExportView.as_view(), name='order-export'),
+    path('orders/dispatch/', views.OrderDispatchView.as_view(), name='order-dispatch'),
     path('user/create-or-get/', views.UserCreateOrGetView.as_view(), name='user-create-or-get'),
     path('user/<int:user_id>/orders/', views.UserOrdersView.as_view(), name='user-orders'),
     
     # ============ DASHBOARD URLS ============
     path('dashboard/stats/', views.DashboardStatsView.as_view(), name='dashboard-stats'),
     path('dashboard/analytics/', views.SalesAnalyticsView.as_view(), name='sales-analytics'),
+    path('dashboard/analytics/freshness/', views.SalesAnalyticsFreshnessView.as_view(), name='sales-analytics-freshness'),
     
     # ============ UTILITY URLS ============
     path('categories/', views.CategoryListView.as_view(), name='category-list'),
     path('status-choices/', views.StatusChoicesView.as_view(), name='status-choices'),
+    path('menu/', views.MenuView.as_view(), name='menu'),
+    path('health/db/', views.DatabaseHealthView.as_view(), name='database-health'),
+    path('health/cache/', views.CacheStatsView.as_view(), name='cache-stats'),
 ]
\ No newline at end of file
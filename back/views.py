@@ -1,21 +1,54 @@
 from rest_framework.views import APIView
-from decimal import Decimal
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.parsers import MultiPartParser, FormParser
 from django.shortcuts import get_object_or_404
-from django.db.models import Q, Sum, Count
+from django.db.models import Q, Case, When
 from django.utils import timezone
-from datetime import datetime, timedelta
-from django.core.files.storage import default_storage
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from datetime import date, timedelta
 from django.conf import settings
+from django.db import DatabaseError, connections
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views import View
+import logging
 import os
-from .models import Addon, Rider, Location, Product, Order, OrderItem, OrderTracking, SooicyUser
+from .models import Addon, Rider, Location, Product, Order, OrderTracking, SooicyUser
 from .serializers import (
     AddonSerializer, RiderSerializer, LocationSerializer, ProductSerializer,
-    OrderSerializer, OrderCreateSerializer, DashboardStatsSerializer,
+    OrderSerializer, OrderListSerializer, OrderCreateSerializer, DashboardStatsSerializer,
     OrderTrackingSerializer
 )
+from .services import (
+    AssignmentError, assign_rider, create_order, filter_created_between, search_orders,
+    update_order_status,
+)
+from .pagination import KeysetPagination, RecentOrdersPagination
+from .catalog import bump_catalog_version, conditional_catalog_response
+from . import analytics
+from .dispatch import DEFAULT_BATCH_SIZE, dispatch_pending_orders
+from .coverage import coverage_index
+from . import search as product_search
+from .tracking import tracking_stream
+from .images import ImageProcessingError, process_upload
+from .export import FORMATS as EXPORT_FORMATS, async_chunks, export_orders, export_queryset
+from .routers import replica_alias, use_replica
+from .menu import get_menu_snapshot
+from .caching import get_cache
+from .singleflight import coalesce, get_flight, request_key
+from .response_cache import ResponseCache
+from . import identity
+
+logger = logging.getLogger(__name__)
+
+MAX_ANALYTICS_DAYS = 366
+MAX_TOP_PRODUCTS = 50
+MAX_DISPATCH_BATCH = 500
+
+sales_analytics_cache = ResponseCache(
+    'sales-analytics', settings.ANALYTICS_SOFT_TTL, settings.ANALYTICS_HARD_TTL
+)
 
 # ============ RIDER VIEWS ============
 
@@ -91,6 +124,9 @@ class RiderStatusUpdateView(APIView):
 
 class LocationListView(APIView):
     def get(self, request):
+        return conditional_catalog_response(request, ['location'], lambda: self.build_response(request))
+
+    def build_response(self, request):
         locations = Location.objects.all()
         
         # Filter by availability
@@ -149,10 +185,33 @@ class LocationToggleAvailabilityView(APIView):
         serializer = LocationSerializer(location)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+class LocationServingView(APIView):
+    """Branches that deliver to ?lat=&lng=, nearest first, with fee and ETA."""
+    def get(self, request):
+        try:
+            lat = float(request.query_params['lat'])
+            lng = float(request.query_params['lng'])
+        except (KeyError, ValueError):
+            return Response(
+                {"error": "lat and lng are required numeric query parameters"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            return Response(
+                {"error": "lat must be within [-90, 90] and lng within [-180, 180]"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        locations = coverage_index.serving(lat, lng)
+        return Response(locations, status=status.HTTP_200_OK)
+
 # ============ PRODUCT VIEWS ============
 
 class ProductListView(APIView):
     def get(self, request):
+        return conditional_catalog_response(request, ['product', 'addon'], lambda: self.build_response(request))
+
+    def build_response(self, request):
         products = Product.objects.all()
         
         # Filter by category
@@ -166,14 +225,22 @@ class ProductListView(APIView):
             available = available_filter.lower() == 'true'
             products = products.filter(is_available=available)
             
-        # Search functionality
+        # Search functionality, ranked by the full-text index when available
         search = request.query_params.get('search')
         if search:
-            products = products.filter(
-                Q(name__icontains=search) |
-                Q(description__icontains=search) |
-                Q(category__icontains=search)
-            )
+            ranked_ids = product_search.search_product_ids(search)
+            if ranked_ids is None:
+                products = products.filter(
+                    Q(name__icontains=search) |
+                    Q(description__icontains=search) |
+                    Q(category__icontains=search)
+                )
+            elif ranked_ids:
+                products = products.filter(id__in=ranked_ids).order_by(
+                    Case(*[When(id=pk, then=position) for position, pk in enumerate(ranked_ids)])
+                )
+            else:
+                products = products.none()
             
         serializer = ProductSerializer(products, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
@@ -234,21 +301,22 @@ class ProductImageUploadView(APIView):
             )
         
         try:
-            # Save file
-            filename = f"products/{timezone.now().strftime('%Y%m%d_%H%M%S')}_{image.name}"
-            filepath = default_storage.save(filename, image)
-            image_url = default_storage.url(filepath)
-            
-            return Response(
-                {"imageUrl": image_url}, 
-                status=status.HTTP_201_CREATED
-            )
+            upload = process_upload(image)
+        except ImageProcessingError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response(
                 {"error": f"Failed to upload image: {str(e)}"}, 
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+        # imageUrl stays for existing clients: the largest JPEG variant.
+        jpeg = upload['variants']['jpg']
+        return Response(
+            {"imageUrl": jpeg[max(jpeg)], **upload},
+            status=status.HTTP_201_CREATED
+        )
+
 
 
 class ProductCategoryListView(APIView):
@@ -256,11 +324,17 @@ class ProductCategoryListView(APIView):
     Returns the list of available product categories from Product.CATEGORY_CHOICES
     """
     def get(self, request):
-        return Response(Product.CATEGORY_CHOICES, status=status.HTTP_200_OK)
+        return conditional_catalog_response(
+            request, [], lambda: Response(Product.CATEGORY_CHOICES, status=status.HTTP_200_OK),
+            static=repr(Product.CATEGORY_CHOICES)
+        )
 
 # ============ ADDONS ==============
 class AddonListView(APIView):
     def get(self, request):
+        return conditional_catalog_response(request, ['addon'], lambda: self.build_response(request))
+
+    def build_response(self, request):
         addons = Addon.objects.all()
 
         # Filter by availability
@@ -324,7 +398,8 @@ class AddonDeleteView(APIView):
 
 class OrderListView(APIView):
     def get(self, request):
-        orders = Order.objects.all().select_related('rider', 'selected_location').prefetch_related('items__product')
+        expand, fields = OrderListSerializer.options(request)
+        orders = OrderListSerializer.setup_queryset(Order.objects.all(), expand)
         
         # Filter by status
         status_filter = request.query_params.get('status')
@@ -332,24 +407,66 @@ class OrderListView(APIView):
             orders = orders.filter(status=status_filter)
             
         # Filter by date range
-        date_from = request.query_params.get('date_from')
-        date_to = request.query_params.get('date_to')
-        if date_from:
-            orders = orders.filter(created_at__date__gte=date_from)
-        if date_to:
-            orders = orders.filter(created_at__date__lte=date_to)
+        try:
+            orders = filter_created_between(
+                orders, request.query_params.get('date_from'), request.query_params.get('date_to')
+            )
+        except ValueError:
+            return Response(
+                {"error": "date_from/date_to must be YYYY-MM-DD"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
             
         # Search functionality
         search = request.query_params.get('search')
         if search:
-            orders = orders.filter(
-                Q(id__icontains=search) |
-                Q(customer_name__icontains=search) |
-                Q(customer_phone__icontains=search)
-            )
+            orders = search_orders(orders, search)
             
-        serializer = OrderSerializer(orders, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(orders, request, view=self)
+        serializer = OrderListSerializer(page, many=True, expand=expand, fields=fields)
+        return paginator.get_paginated_response(serializer.data)
+
+class OrderExportView(APIView):
+    """
+    Streams order history with line items for finance: ?output=csv (default)
+    or ndjson, filtered by date_from/date_to, status and location.
+    """
+    def get(self, request):
+        output = request.query_params.get('output', 'csv')
+        if output not in EXPORT_FORMATS:
+            return Response(
+                {"error": f"output must be one of: {', '.join(EXPORT_FORMATS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Pinned with using() because the rows are read while the response streams.
+        orders = Order.objects.using(replica_alias())
+        status_filter = request.query_params.get('status')
+        if status_filter:
+            orders = orders.filter(status=status_filter)
+        location = request.query_params.get('location')
+        if location:
+            if not location.isdigit():
+                return Response({"error": "location must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+            orders = orders.filter(selected_location_id=int(location))
+        date_from = request.query_params.get('date_from')
+        date_to = request.query_params.get('date_to')
+        try:
+            orders = filter_created_between(orders, date_from, date_to)
+        except ValueError:
+            return Response(
+                {"error": "date_from/date_to must be YYYY-MM-DD"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        chunks = export_orders(export_queryset(orders), output)
+        if isinstance(request._request, ASGIRequest):
+            chunks = async_chunks(chunks)
+        response = StreamingHttpResponse(chunks, content_type=EXPORT_FORMATS[output])
+        filename = '-'.join(['orders', *filter(None, [date_from, date_to])])
+        response['Content-Disposition'] = f'attachment; filename="{filename}.{output}"'
+        return response
 
 class OrderDetailView(APIView):
     def get(self, request, pk):
@@ -362,11 +479,6 @@ class OrderDetailView(APIView):
 
 class OrderCreateView(APIView):
     def post(self, request):
-        print("=" * 80)
-        print("INCOMING REQUEST DATA:")
-        print(request.data)
-        print("=" * 80)
-        
         sooicy_user_id = request.data.get('sooicy_user')
         sooicy_user_instance = None
 
@@ -389,8 +501,6 @@ class OrderCreateView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        print(f"Extracted items_data: {items_data}")
-
         # ✅ Now create order_data INCLUDING items_data for serializer validation
         order_data = {
             'customer_name': request.data.get('customer_name'),
@@ -410,159 +520,35 @@ class OrderCreateView(APIView):
             'items_data': items_data,  # ✅ Include items_data for serializer
         }
 
-        print(f"Order data for serializer: {order_data}")
-
         serializer = OrderCreateSerializer(data=order_data)
         if not serializer.is_valid():
-            print(f"Serializer errors: {serializer.errors}")
+            logger.info('Order rejected: %s', serializer.errors)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-        try:
-            order = serializer.save()
-            if sooicy_user_instance:
-                order.sooicy_user = sooicy_user_instance
-                order.save()
-
-            print(f"Order created: #{order.id}")
-
-            total_amount = Decimal('0.00')
-
-            # Process items from items_data
-            for item_data in items_data:
-                product_id = item_data.get('product_id')
-                if not product_id:
-                    print("Skipping item - no product_id")
-                    continue
-                    
-                try:
-                    product = Product.objects.get(id=product_id)
-                except Product.DoesNotExist:
-                    print(f"Product {product_id} not found")
-                    continue
-                
-                quantity = int(item_data.get('quantity', 1))
-                unit_price = Decimal(str(product.price))
-
-                print(f"\nProcessing item: {product.name}")
-                print(f"Quantity: {quantity}, Unit Price: {unit_price}")
-
-                # Create the order item
-                order_item = OrderItem.objects.create(
-                    order=order,
-                    product=product,
-                    quantity=quantity,
-                    unit_price=unit_price,
-                    special_instructions=item_data.get('special_instructions', '')
-                )
-
-                # Process addons
-                selected_addons = item_data.get('selectedAddons', [])
-                print(f"Selected addons: {selected_addons}")
-
-                if selected_addons and len(selected_addons) > 0:
-                    addon_ids = []
-                    for addon_data in selected_addons:
-                        addon_id = addon_data.get('id')
-                        if addon_id:
-                            addon_ids.append(int(addon_id))
-                    
-                    print(f"Addon IDs to fetch: {addon_ids}")
-                    
-                    if addon_ids:
-                        addons = Addon.objects.filter(id__in=addon_ids)
-                        print(f"Found addons: {list(addons.values_list('id', 'name', 'price'))}")
-                        
-                        order_item.addons.set(addons)
-                        
-                        # Calculate total addon price
-                        addons_total = sum((addon.price for addon in addons), Decimal('0.00'))
-                        order_item.addons_price = addons_total
-                        
-                        print(f"Addons total price: {addons_total}")
-                        
-                        # Save to recalculate total_price
-                        order_item.save()
-
-                # Refresh from DB to get updated total_price
-                order_item.refresh_from_db()
-                
-                print(f"Order item total_price (with addons): {order_item.total_price}")
-                
-                # Add to order total
-                total_amount += order_item.total_price
-                print(f"Running order total: {total_amount}")
-
-            # Update order totals
-            print(f"\n{'='*50}")
-            print("CALCULATING ORDER TOTALS")
-            print(f"{'='*50}")
-            
-            order.subtotal = total_amount
-            order.tax = total_amount * Decimal('0.08')
-            
-            if order.delivery_type == 'delivery' and order.selected_location:
-                order.delivery_fee = order.selected_location.delivery_fee
-            else:
-                order.delivery_fee = Decimal('0.00')
-            
-            order.total = order.subtotal + order.tax + order.delivery_fee
-            
-            print(f"Subtotal (from items): {order.subtotal}")
-            print(f"Tax (8%): {order.tax}")
-            print(f"Delivery Fee: {order.delivery_fee}")
-            print(f"FINAL TOTAL: {order.total}")
-            print(f"{'='*50}\n")
-            
-            order.save()
-
-            # Update user stats
-            if sooicy_user_instance:
-                sooicy_user_instance.total_orders += 1
-                sooicy_user_instance.total_spent += order.total
-                sooicy_user_instance.last_order_date = timezone.now()
-                sooicy_user_instance.save()
-                print(f"Updated user stats: {sooicy_user_instance.name}")
-
-            # Set estimated delivery time
-            if order.delivery_type == 'pickup':
-                order.estimated_time = '15-20 minutes'
-            else:
-                base_time = 25
-                location_adjustment = getattr(order.selected_location, 'delivery_time_minutes', 10) if order.selected_location else 10
-                total_time = base_time + location_adjustment
-                order.estimated_time = f'{total_time}-{total_time + 10} minutes'
-            order.save()
-
-            # Create tracking entry
-            OrderTracking.objects.create(
-                order=order,
-                status='pending',
-                notes=f"Order #{order.id} created successfully",
-                updated_by='System'
-            )
-
-            print(f"\n✅ ORDER CREATED SUCCESSFULLY: #{order.id}")
-            print(f"Total with addons: {order.total}")
-            print("=" * 80 + "\n")
-
-            order_serializer = OrderSerializer(order)
-            return Response({
-                **order_serializer.data,
-                'message': 'Order created successfully',
-                'estimated_time': order.estimated_time
-            }, status=status.HTTP_201_CREATED)
+        validated_data = dict(serializer.validated_data)
+        validated_data.pop('items_data', None)
+        validated_data.pop('sooicy_user', None)
 
+        try:
+            order = create_order(validated_data, items_data, sooicy_user=sooicy_user_instance)
         except Exception as e:
-            print(f"\n❌ ERROR CREATING ORDER: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            
-            if 'order' in locals():
-                order.delete()
-                print("Rolled back order creation")
-            
+            logger.exception('Order creation failed')
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+        logger.info('Order #%s created (total %s)', order.id, order.total)
+
+        order = Order.objects.select_related('rider', 'selected_location').prefetch_related(
+            'items__addons', 'tracking'
+        ).get(pk=order.pk)
+        # create_order() has just loaded these products.
+        identity.resolve(order.items.all(), 'product')
+        order_serializer = OrderSerializer(order)
+        return Response({
+            **order_serializer.data,
+            'message': 'Order created successfully',
+            'estimated_time': order.estimated_time
+        }, status=status.HTTP_201_CREATED)
+
 class OrderStatusUpdateView(APIView):
     def patch(self, request, pk):
         order = get_object_or_404(Order, pk=pk)
@@ -574,17 +560,7 @@ class OrderStatusUpdateView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        old_status = order.status
-        order.status = new_status
-        order.save()
-        
-        # Create tracking entry
-        OrderTracking.objects.create(
-            order=order,
-            status=new_status,
-            notes=f"Status changed from {old_status} to {new_status}",
-            updated_by=request.data.get('updated_by', 'System')
-        )
+        update_order_status(order, new_status, updated_by=request.data.get('updated_by', 'System'))
         
         serializer = OrderSerializer(order)
         return Response(serializer.data, status=status.HTTP_200_OK)
@@ -608,30 +584,40 @@ class OrderAssignRiderView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Update order
-        order.rider = rider
-        if order.status == 'pending':
-            order.status = 'preparing'
-        order.save()
-        
-        # Update rider
-        rider.current_orders += 1
-        if rider.current_orders >= 3:  # Max concurrent orders
-            rider.status = 'busy'
-        rider.save()
-        
-        # Create tracking entry
-        OrderTracking.objects.create(
-            order=order,
-            status='assigned',
-            notes=f"Order assigned to rider {rider.name}",
-            updated_by=request.data.get('updated_by', 'System')
-        )
+        try:
+            assign_rider(order, rider, updated_by=request.data.get('updated_by', 'System'))
+        except AssignmentError as e:
+            return Response(
+                {"error": str(e)}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
         serializer = OrderSerializer(order)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
+class OrderDispatchView(APIView):
+    """Auto-assign pending delivery orders to the nearest suitable riders."""
+    def post(self, request):
+        try:
+            limit = min(max(int(request.data.get('limit', DEFAULT_BATCH_SIZE)), 1), MAX_DISPATCH_BATCH)
+        except (TypeError, ValueError):
+            return Response(
+                {"error": "limit must be an integer"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        dry_run = str(request.data.get('dry_run', '')).lower() in ('1', 'true')
+
+        assignments, unassigned = dispatch_pending_orders(
+            limit=limit, dry_run=dry_run, updated_by=request.data.get('updated_by', 'Dispatch')
+        )
+        return Response({
+            'assigned': [assignment.as_dict() for assignment in assignments],
+            'unassigned': [order.id for order in unassigned],
+            'dry_run': dry_run,
+        }, status=status.HTTP_200_OK)
+
+
 # ============User Orders ============
 class UserCreateOrGetView(APIView):
     def post(self, request):
@@ -699,92 +685,53 @@ class UserOrdersView(APIView):
             )
 
         # Get orders for this user
-        orders = Order.objects.filter(
-            sooicy_user=user
-        ).select_related('rider', 'selected_location').prefetch_related('items__product')
+        expand, fields = OrderListSerializer.options(request)
+        orders = OrderListSerializer.setup_queryset(Order.objects.filter(sooicy_user=user), expand)
         
         # Apply filters like in your existing OrderListView
         status_filter = request.query_params.get('status')
         if status_filter:
             orders = orders.filter(status=status_filter)
             
-        date_from = request.query_params.get('date_from')
-        date_to = request.query_params.get('date_to')
-        if date_from:
-            orders = orders.filter(created_at__date__gte=date_from)
-        if date_to:
-            orders = orders.filter(created_at__date__lte=date_to)
+        try:
+            orders = filter_created_between(
+                orders, request.query_params.get('date_from'), request.query_params.get('date_to')
+            )
+        except ValueError:
+            return Response(
+                {"error": "date_from/date_to must be YYYY-MM-DD"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
             
         search = request.query_params.get('search')
         if search:
-            orders = orders.filter(
-                Q(id__icontains=search) |
-                Q(customer_name__icontains=search) |
-                Q(customer_phone__icontains=search)
-            )
+            orders = search_orders(orders, search)
             
-        serializer = OrderSerializer(orders, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(orders, request, view=self)
+        serializer = OrderListSerializer(page, many=True, expand=expand, fields=fields)
+        return paginator.get_paginated_response(serializer.data)
 
 
 
 # ============ DASHBOARD VIEWS ============
 
 class DashboardStatsView(APIView):
+    @use_replica()
     def get(self, request):
-        # Calculate date ranges
-        today = timezone.now().date()
-        
-        # Order statistics
-        total_orders = Order.objects.count()
-        pending_orders = Order.objects.filter(status='pending').count()
-        delivering_orders = Order.objects.filter(status='delivering').count()
-        completed_orders = Order.objects.filter(status='delivered').count()
-        cancelled_orders = Order.objects.filter(status='cancelled').count()
-        orders_today = Order.objects.filter(created_at__date=today).count()
-        
-        # Revenue statistics
-        total_revenue = Order.objects.filter(status='delivered').aggregate(
-            total=Sum('total')
-        )['total'] or 0
-        
-        revenue_today = Order.objects.filter(
-            created_at__date=today, 
-            status='delivered'
-        ).aggregate(total=Sum('total'))['total'] or 0
-        
-        # Rider statistics
-        total_riders = Rider.objects.filter(is_active=True).count()
-        available_riders = Rider.objects.filter(status='available', is_active=True).count()
-        
-        # Product and location statistics
-        total_products = Product.objects.count()
-        total_locations = Location.objects.count()
-        
-        stats_data = {
-            'total_orders': total_orders,
-            'pending_orders': pending_orders,
-            'delivering_orders': delivering_orders,
-            'completed_orders': completed_orders,
-            'cancelled_orders': cancelled_orders,
-            'orders_today': orders_today,
-            'total_revenue': total_revenue,
-            'revenue_today': revenue_today,
-            'total_riders': total_riders,
-            'available_riders': available_riders,
-            'total_products': total_products,
-            'total_locations': total_locations,
-            }
-        
-        serializer = DashboardStatsSerializer(stats_data)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        stats_data = coalesce('dashboard-stats', request, lambda: analytics.get_dashboard_stats(
+            lambda stats: dict(DashboardStatsSerializer(stats).data)
+        ))
+        return Response(stats_data, status=status.HTTP_200_OK)
 
 class RecentOrdersView(APIView):
     def get(self, request):
-        limit = int(request.query_params.get('limit', 10))
-        orders = Order.objects.select_related('rider', 'selected_location').prefetch_related('items__product')[:limit]
-        serializer = OrderSerializer(orders, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        expand, fields = OrderListSerializer.options(request)
+        orders = OrderListSerializer.setup_queryset(Order.objects.all(), expand)
+        paginator = RecentOrdersPagination()
+        page = paginator.paginate_queryset(orders, request, view=self)
+        serializer = OrderListSerializer(page, many=True, expand=expand, fields=fields)
+        return paginator.get_paginated_response(serializer.data)
 
 class OrderTrackingView(APIView):
     def get(self, request, order_id):
@@ -793,71 +740,118 @@ class OrderTrackingView(APIView):
         serializer = OrderTrackingSerializer(tracking, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+
+class OrderTrackingStreamView(View):
+    """
+    Server-Sent Events feed of an order's tracking rows.
+
+    A plain async Django view (DRF views are sync-only) so an idle client
+    holds no thread. Only served under ASGI: a WSGI worker would be tied up
+    for the whole stream, so there clients should keep polling
+    OrderTrackingView.
+    """
+
+    async def get(self, request, order_id):
+        if not isinstance(request, ASGIRequest):
+            return JsonResponse(
+                {"error": "Tracking stream requires the ASGI server, poll the tracking endpoint instead"},
+                status=status.HTTP_501_NOT_IMPLEMENTED
+            )
+        order = await Order.objects.filter(pk=order_id).values('status').afirst()
+        if order is None:
+            return JsonResponse({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            last_event_id = int(request.headers.get('Last-Event-ID') or request.GET.get('last_event_id') or 0)
+        except ValueError:
+            return JsonResponse(
+                {"error": "Last-Event-ID must be an integer"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        response = StreamingHttpResponse(
+            tracking_stream(order_id, last_event_id, closed=order['status'] in Order.TERMINAL_STATUSES),
+            content_type='text/event-stream',
+        )
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
 # ============ ANALYTICS VIEWS ============
 
 class SalesAnalyticsView(APIView):
+    @use_replica()
     def get(self, request):
-        # Get date range from query params
-        days = int(request.query_params.get('days', 30))
+        # Get date range, branch and top-N from query params
+        try:
+            days = int(request.query_params.get('days', 30))
+            limit = min(max(int(request.query_params.get('limit', 5)), 1), MAX_TOP_PRODUCTS)
+            location = request.query_params.get('location')
+            location = int(location) if location else None
+            date_from = request.query_params.get('date_from')
+            date_from = date.fromisoformat(date_from) if date_from else None
+            date_to = request.query_params.get('date_to')
+            date_to = date.fromisoformat(date_to) if date_to else None
+        except ValueError:
+            return Response(
+                {"error": "days, limit and location must be integers, date_from/date_to YYYY-MM-DD"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if days < 0 or days > MAX_ANALYTICS_DAYS:
+            return Response(
+                {"error": f"days must be between 0 and {MAX_ANALYTICS_DAYS}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        # The date is part of the key: the payload's range ends today.
+        payload, age, state = sales_analytics_cache.get(
+            f"{timezone.localdate()}:{request_key('sales-analytics', request)}",
+            lambda: self.build_payload(days, limit, location, date_from, date_to)
+        )
+        response = Response(payload, status=status.HTTP_200_OK)
+        patch_cache_control(response, **sales_analytics_cache.cache_control(age))
+        response['Age'] = str(int(age))
+        response['X-Cache'] = state
+        return response
+
+    # Also runs on the background refresh thread, outside the request's scope.
+    @use_replica()
+    def build_payload(self, days, limit, location, date_from, date_to):
         end_date = timezone.now().date()
         start_date = end_date - timedelta(days=days)
         
-        # Daily sales data
-        daily_sales = []
-        current_date = start_date
-        while current_date <= end_date:
-            day_orders = Order.objects.filter(
-                created_at__date=current_date,
-                status='delivered'
-            )
-            daily_revenue = day_orders.aggregate(total=Sum('total'))['total'] or 0
-            daily_sales.append({
-                'date': current_date.strftime('%Y-%m-%d'),
-                'revenue': float(daily_revenue),
-                'orders': day_orders.count()
-            })
-            current_date += timedelta(days=1)
-        
-        # Top products
-        top_products = Product.objects.annotate(
-            order_count=Count('orderitem__order', filter=Q(orderitem__order__status='delivered'))
-        ).order_by('-order_count')[:5]
-        
-        top_products_data = [{
-            'id': product.id,
-            'name': product.name,
-            'orders': product.order_count,
-            'revenue': float(OrderItem.objects.filter(
-                product=product,
-                order__status='delivered'
-            ).aggregate(total=Sum('total_price'))['total'] or 0)
-        } for product in top_products]
-        
-        # Category performance
-        category_stats = {}
-        for choice in Product.CATEGORY_CHOICES:
-            category = choice[0]
-            revenue = OrderItem.objects.filter(
-                product__category=category,
-                order__status='delivered'
-            ).aggregate(total=Sum('total_price'))['total'] or 0
-            
-            category_stats[choice[1]] = float(revenue)
+        # Daily sales data, read from the rollup table in one range scan
+        daily_sales = analytics.daily_sales(start_date, end_date, location=location)
         
-        return Response({
+        # Top products and category performance, one grouped query each
+        items = analytics.delivered_items(location=location, start_date=date_from, end_date=date_to)
+        top_products_data = analytics.top_products(items, limit=limit)
+        category_breakdown = analytics.category_breakdown(items)
+        category_stats = {row['label']: row['revenue'] for row in category_breakdown}
+        
+        return {
             'daily_sales': daily_sales,
             'top_products': top_products_data,
             'category_performance': category_stats,
+            'category_breakdown': category_breakdown,
             'date_range': {
                 'start': start_date.strftime('%Y-%m-%d'),
                 'end': end_date.strftime('%Y-%m-%d')
             }
-        }, status=status.HTTP_200_OK)
+        }
+
+class SalesAnalyticsFreshnessView(APIView):
+    """Per-key hits, refreshes and age of this worker's cached analytics responses."""
+    def get(self, request):
+        return Response(sales_analytics_cache.stats(), status=status.HTTP_200_OK)
 
 # ============ UTILITY VIEWS ============
 
 class CategoryListView(APIView):
     def get(self, request):
+        return conditional_catalog_response(
+            request, [], lambda: self.build_response(request), static=repr(Product.CATEGORY_CHOICES)
+        )
+
+    def build_response(self, request):
         categories = [{'value': choice[0], 'label': choice[1]} for choice in Product.CATEGORY_CHOICES]
         return Response(categories, status=status.HTTP_200_OK)
 
@@ -881,6 +875,60 @@ class StatusChoicesView(APIView):
         
         return Response(choices, status=status.HTTP_200_OK)
 
+class MenuView(APIView):
+    """
+    Products, addons, categories, locations and status choices in one round trip.
+
+    Served from the precompiled snapshot in back.menu, in the best encoding
+    the client accepts.
+    """
+    def get(self, request):
+        encoding, body, etag = get_menu_snapshot().negotiate(request.headers.get('Accept-Encoding'))
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = HttpResponse(body, content_type='application/json')
+            if encoding:
+                response['Content-Encoding'] = encoding
+        response['ETag'] = etag
+        patch_vary_headers(response, ['Accept-Encoding'])
+        patch_cache_control(response, no_cache=True)
+        return response
+
+class DatabaseHealthView(APIView):
+    """Round-trips every configured database and reports connection settings and pool stats."""
+    def get(self, request):
+        databases = {}
+        healthy = True
+        for alias in connections:
+            conn = connections[alias]
+            pool = getattr(conn, 'pool', None)
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute('SELECT 1')
+                ok = True
+            except DatabaseError:
+                ok = False
+            healthy = healthy and ok
+            databases[alias] = {
+                'ok': ok,
+                'vendor': conn.vendor,
+                'conn_max_age': conn.settings_dict['CONN_MAX_AGE'],
+                'health_checks': conn.settings_dict['CONN_HEALTH_CHECKS'],
+                'pool': pool.stats() if pool is not None else None,
+            }
+        return Response(
+            {'ok': healthy, 'databases': databases},
+            status=status.HTTP_200_OK if healthy else status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+
+class CacheStatsView(APIView):
+    """Counters of this worker's two-tier cache (back.caching), request coalescing and identity maps."""
+    def get(self, request):
+        return Response(
+            {**get_cache().stats(), 'singleflight': get_flight().stats(), 'identity_map': identity.totals()},
+            status=status.HTTP_200_OK
+        )
+
 # ============ BULK OPERATIONS ============
 
 class BulkRiderStatusUpdateView(APIView):
@@ -904,6 +952,7 @@ class BulkRiderStatusUpdateView(APIView):
             id__in=rider_ids, 
             is_active=True
         ).update(status=new_status)
+        analytics.invalidate_dashboard_stats()
         
         return Response({
             "message": f"Updated {updated_count} riders to {new_status} status"
@@ -930,6 +979,10 @@ class BulkProductUpdateView(APIView):
             )
         
         updated_count = Product.objects.filter(id__in=product_ids).update(**updates)
+        analytics.invalidate_dashboard_stats()
+        bump_catalog_version('product')
+        if 'category' in updates:
+            product_search.index_products(Product.objects.filter(id__in=product_ids))
         
         return Response({
             "message": f"Updated {updated_count} products"
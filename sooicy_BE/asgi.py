@@ -2,6 +2,8 @@
 ASGI config for sooicy_BE project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+The order-tracking stream needs it, e.g.
+``gunicorn sooicy_BE.asgi:application -k uvicorn.workers.UvicornWorker``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
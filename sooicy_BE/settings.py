@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 
+from decouple import config
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -72,6 +74,7 @@ MIDDLEWARE = [
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "back.identity.IdentityMapMiddleware",
 ]
 
 ROOT_URLCONF = "sooicy_BE.urls"
@@ -96,13 +99,79 @@ WSGI_APPLICATION = "sooicy_BE.wsgi.application"
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+#
+# Read from the environment (or a .env file). DB_ENGINE=postgresql uses
+# DB_NAME/DB_USER/DB_PASSWORD/DB_HOST/DB_PORT; anything else falls back to
+# the SQLite file. DB_CONN_MAX_AGE (seconds, default 0) keeps connections
+# open between requests, health-checked before reuse. Only raise it under
+# WSGI: served through asgi.py every request runs its sync code in a fresh
+# thread, so persistent connections are never reused and leak. DB_POOL=true
+# shares a bounded pool of PostgreSQL connections between a worker's
+# threads instead and works under both (back.backends.postgresql); its stats
+# are served at /api/health/db/.
+
+DB_ENGINE = config("DB_ENGINE", default="sqlite3")
+DB_CONN_MAX_AGE = config("DB_CONN_MAX_AGE", default=0, cast=int)
+DB_CONN_HEALTH_CHECKS = config("DB_CONN_HEALTH_CHECKS", default=True, cast=bool)
+DB_POOL = DB_ENGINE == "postgresql" and config("DB_POOL", default=False, cast=bool)
+
+if DB_ENGINE == "postgresql":
+    DATABASES = {
+        "default": {
+            "ENGINE": "back.backends.postgresql" if DB_POOL else "django.db.backends.postgresql",
+            "NAME": config("DB_NAME", default="sooicy"),
+            "USER": config("DB_USER", default="postgres"),
+            "PASSWORD": config("DB_PASSWORD", default=""),
+            "HOST": config("DB_HOST", default="localhost"),
+            "PORT": config("DB_PORT", default="5432"),
+            # Pooled connections go back to the pool at the end of each request.
+            "CONN_MAX_AGE": 0 if DB_POOL else DB_CONN_MAX_AGE,
+            "CONN_HEALTH_CHECKS": DB_CONN_HEALTH_CHECKS,
+            "OPTIONS": {"connect_timeout": config("DB_CONNECT_TIMEOUT", default=5, cast=int)},
+        }
+    }
+    if DB_POOL:
+        DATABASES["default"]["POOL"] = {
+            "max_size": config("DB_POOL_MAX_SIZE", default=10, cast=int),
+            "timeout": config("DB_POOL_TIMEOUT", default=5.0, cast=float),
+            "max_idle": config("DB_POOL_MAX_IDLE", default=300.0, cast=float),
+        }
+else:
+    # DB_SQLITE_CONCURRENT=true: WAL, busy timeout and BEGIN IMMEDIATE so
+    # concurrent order writes queue instead of failing (back.backends.sqlite3).
+    # DB_SQLITE_TIMEOUT is how many seconds a connection waits for a lock
+    # (Python's sqlite3 default is 5); the concurrent mode's busy_timeout
+    # pragma replaces it.
+    DB_SQLITE_CONCURRENT = config("DB_SQLITE_CONCURRENT", default=False, cast=bool)
+    DATABASES = {
+        "default": {
+            "ENGINE": "back.backends.sqlite3" if DB_SQLITE_CONCURRENT else "django.db.backends.sqlite3",
+            "NAME": config("DB_NAME", default=str(BASE_DIR / "db.sqlite3")),
+            "CONN_MAX_AGE": DB_CONN_MAX_AGE,
+            "CONN_HEALTH_CHECKS": DB_CONN_HEALTH_CHECKS,
+            "OPTIONS": {"timeout": config("DB_SQLITE_TIMEOUT", default=5.0, cast=float)},
+        }
+    }
 
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+# Read replica for dashboard, analytics, export and admin list reads
+# (back.routers). Set DB_REPLICA_HOST (PostgreSQL) or DB_REPLICA_NAME
+# (SQLite file); without one those reads stay on the primary. Snapshots
+# built from it are cached briefly (back.analytics), which bounds how far
+# replica lag can show. Test runs mirror it onto the primary.
+DB_REPLICA_HOST = config("DB_REPLICA_HOST", default="")
+DB_REPLICA_NAME = config("DB_REPLICA_NAME", default="")
+
+if DB_REPLICA_HOST or DB_REPLICA_NAME:
+    DATABASES["replica"] = {
+        **DATABASES["default"],
+        "NAME": DB_REPLICA_NAME or DATABASES["default"]["NAME"],
+        "TEST": {"MIRROR": "default"},
     }
-}
+    if DB_REPLICA_HOST:
+        DATABASES["replica"]["HOST"] = DB_REPLICA_HOST
+        DATABASES["replica"]["PORT"] = config("DB_REPLICA_PORT", default=DATABASES["default"]["PORT"])
+
+DATABASE_ROUTERS = ["back.routers.ReplicaRouter"]
 
 
 # Password validation
@@ -145,3 +214,38 @@ STATIC_URL = "static/"
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+
+# Order-tracking push (back.pubsub). With REDIS_URL set, tracking rows fan
+# out to subscribers on every worker; otherwise only within one process.
+REDIS_URL = config("REDIS_URL", default="")
+TRACKING_PUBSUB_BACKEND = (
+    "back.pubsub.RedisBroker" if REDIS_URL else "back.pubsub.InProcessBroker"
+)
+
+# Two-tier cache (back.caching): per-worker LRU in front of Redis at
+# REDIS_URL, kept coherent across workers by pub/sub invalidation.
+CACHE_L1_MAX_ENTRIES = config("CACHE_L1_MAX_ENTRIES", default=1024, cast=int)
+CACHE_L1_TIMEOUT = config("CACHE_L1_TIMEOUT", default=30, cast=int)
+
+# Request coalescing (back.singleflight). With Redis, concurrent identical
+# analytics requests on different workers also share one computation; a
+# waiting worker gives up and computes itself after this many seconds.
+SINGLEFLIGHT_LEASE = config("SINGLEFLIGHT_LEASE", default=10, cast=float)
+
+# Sales analytics responses (back.response_cache): served as they are for
+# the soft TTL, served stale while a background refresh runs until the hard
+# TTL, recomputed in the request after that. Seconds.
+ANALYTICS_SOFT_TTL = config("ANALYTICS_SOFT_TTL", default=120, cast=int)
+ANALYTICS_HARD_TTL = config("ANALYTICS_HARD_TTL", default=900, cast=int)
+
+# Celery (back.tasks). Tasks run inline unless CELERY_BROKER_URL is set,
+# so development and the test suite need no worker. REDIS_URL alone (for
+# the cache or pub/sub) does not switch to a broker: with no worker running,
+# queued tasks would never execute. Tasks are idempotent, so they are
+# acknowledged only after they finish and redelivered if a worker dies.
+CELERY_BROKER_URL = config("CELERY_BROKER_URL", default="")
+CELERY_TASK_ALWAYS_EAGER = config("CELERY_TASK_ALWAYS_EAGER", default=not CELERY_BROKER_URL, cast=bool)
+CELERY_TASK_ACKS_LATE = True
+CELERY_TASK_REJECT_ON_WORKER_LOST = True
+CELERY_TASK_IGNORE_RESULT = True